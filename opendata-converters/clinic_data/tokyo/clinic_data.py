@@ -9,12 +9,15 @@ from dateutil import parser
 from absl import flags, app
 import pandas as pd
 
+from instrumentation import Instrumentation, define_flags
+
 FLAGS = flags.FLAGS
 flags.DEFINE_string("config_path", None, "Config file path")
 
 flags.DEFINE_string("tmp_path", "/tmp", "Temporary path")
 flags.DEFINE_string("output_csv_path", "./test/latest.csv", "Output csv file path")
 flags.DEFINE_string("output_json_path", "./test/latest.json", "Output json file path")
+define_flags()
 
 # https://www.fukushihoken.metro.tokyo.lg.jp/iryo/kansen/corona_portal/soudan/hatsunetsugairai.files/040216shinryoukensa00.xlsx
 
@@ -416,15 +419,29 @@ def main(argv):
     os.makedirs(os.path.dirname(FLAGS.output_csv_path), exist_ok=True)
     os.makedirs(os.path.dirname(FLAGS.output_json_path), exist_ok=True)
 
-    last_modified, file_path = _download_opendata(url)
+    instrumentation = Instrumentation.from_flags("clinic_data_tokyo")
+
+    with instrumentation.stage("fetch"):
+        last_modified, file_path = _download_opendata(url)
+    instrumentation.add_bytes("fetch", os.path.getsize(file_path))
 
     try:
-        clinic_infos = _parse(file_path)
-        _save_as_csv(clinic_infos, FLAGS.output_csv_path)
-        _save_as_json(clinic_infos, FLAGS.output_json_path, last_modified)
+        with instrumentation.stage("parse"):
+            clinic_infos = _parse(file_path)
+        instrumentation.count("clinics", len(clinic_infos))
+
+        with instrumentation.stage("write_csv"):
+            _save_as_csv(clinic_infos, FLAGS.output_csv_path)
+        instrumentation.add_bytes("write_csv", os.path.getsize(FLAGS.output_csv_path))
+
+        with instrumentation.stage("write_json"):
+            _save_as_json(clinic_infos, FLAGS.output_json_path, last_modified)
+        instrumentation.add_bytes("write_json", os.path.getsize(FLAGS.output_json_path))
     finally:
         pass
 
+    instrumentation.close(FLAGS.run_report_path)
+
 
 if __name__ == '__main__':
     app.run(main)
@@ -7,11 +7,14 @@ from dateutil import parser
 
 from absl import flags, app
 
+from instrumentation import Instrumentation, define_flags
+
 FLAGS = flags.FLAGS
 flags.DEFINE_string("config_path", None, "Config file path")
 
 flags.DEFINE_string("tmp_path", "/tmp", "Temporary path")
 flags.DEFINE_string("output_path", "./test/latest.csv", "Output file path")
+define_flags()
 
 
 def _download_opendata(url):
@@ -61,15 +64,24 @@ def main(argv):
 
     os.makedirs(os.path.dirname(FLAGS.output_path), exist_ok=True)
 
-    last_modified, file_path = _download_opendata(url)
+    instrumentation = Instrumentation.from_flags("clinic_data_tokyo")
+
+    with instrumentation.stage("fetch"):
+        last_modified, file_path = _download_opendata(url)
+    instrumentation.add_bytes("fetch", os.path.getsize(file_path))
 
-    assert _validate(file_path, required_headers), "Header validation failed."
+    with instrumentation.stage("validate"):
+        assert _validate(file_path, required_headers), "Header validation failed."
 
     try:
-        shutil.move(file_path, FLAGS.output_path)
+        with instrumentation.stage("write"):
+            shutil.move(file_path, FLAGS.output_path)
+        instrumentation.add_bytes("write", os.path.getsize(FLAGS.output_path))
     finally:
         pass
 
+    instrumentation.close(FLAGS.run_report_path)
+
 
 if __name__ == '__main__':
     app.run(main)
@@ -0,0 +1,197 @@
+import functools
+import http.server
+import json
+import os
+import platform
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from absl import flags, app
+
+# The converter is imported for its merge of statistics, its CSV output and its download flags.
+import cocoa_diagnosis_keys as converter
+from download_cache import DownloadCache
+from downloader import Downloader
+from export_generator import ExportProfile, generate_exports, load_generated_rows, write_list_json, \
+    DEFAULT_KEYS_PER_FILE, FILENAME_LIST
+from export_reader import read_export_payload, iter_keys
+from key_table import KeyTable
+from numpy_statistics import statistics_key_table, hashed_groups
+from parsed_cache import ParsedExportCache
+from python_statistics import aggregate_keys
+
+FLAGS = flags.FLAGS
+flags.DEFINE_list("key_counts", ["1000", "10000", "100000", "1000000", "10000000"], "Total numbers of keys")
+flags.DEFINE_integer("keys_per_file", DEFAULT_KEYS_PER_FILE, "Number of keys of every generated ZIP")
+flags.DEFINE_float("v2_ratio", ExportProfile().v2_ratio, "Ratio of v2 keys (with report_type)")
+flags.DEFINE_integer("seed", 0, "Seed of the generated keys")
+flags.DEFINE_list("engines", ["python", "numpy"], "Statistics engines to benchmark")
+flags.DEFINE_string("benchmark_path", "/tmp/cocoa_diagnosis_keys_benchmark",
+                    "Directory of the generated exports, reused while the generator arguments are the same")
+flags.DEFINE_string("report_path", None, "Path of the JSON report")
+
+STAGES = [
+    "download",
+    "decode",
+    "key_table",
+    "parsed_cache_load",
+    "aggregate_python",
+    "aggregate_numpy",
+    "write_csv",
+]
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Stopwatch:
+    """Accumulates the seconds spent in every stage."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    def __call__(self, stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - start
+        return result
+
+
+def _aggregate_python(created, keys, table):
+    statistics_dict = {}
+    aggregate_keys(statistics_dict, created, keys, table)
+    return list(statistics_dict.values())
+
+
+def _aggregate_numpy(created, table):
+    group_ids, group_count = hashed_groups(table.rolling_start_interval_number)
+    return statistics_key_table(created, table, group_ids, group_count)
+
+
+def _write_csv(partial_statistics_lists, file_path):
+    converter._write_csv(converter._merge_statistics(partial_statistics_lists), file_path)
+
+
+def _download(base_url, rows, work_path):
+    downloader = Downloader(retries=FLAGS.download_retries, backoff=FLAGS.download_backoff)
+    cache = DownloadCache(os.path.join(work_path, "cache"), downloader)
+    try:
+        with ThreadPoolExecutor(max_workers=max(FLAGS.download_workers, 1)) as executor:
+            results = list(executor.map(lambda row: cache.fetch(base_url + row["file_name"]), rows))
+    finally:
+        downloader.close()
+    return results
+
+
+def _benchmark(key_count, profile, exports_path, base_url):
+    result = {"key_count": key_count}
+
+    generate_start = time.perf_counter()
+    rows = load_generated_rows(exports_path, key_count, FLAGS.keys_per_file, profile, FLAGS.seed)
+    result["generated"] = rows is None
+    if rows is None:
+        shutil.rmtree(exports_path, ignore_errors=True)
+        rows = generate_exports(exports_path, key_count, FLAGS.keys_per_file, profile, FLAGS.seed)
+    result["generate_seconds"] = time.perf_counter() - generate_start
+    write_list_json(os.path.join(exports_path, FILENAME_LIST), rows, base_url)
+
+    result["file_count"] = len(rows)
+    result["bytes"] = sum(os.path.getsize(os.path.join(exports_path, row["file_name"])) for row in rows)
+
+    stopwatch = _Stopwatch()
+    partial_statistics_lists = {engine: [] for engine in FLAGS.engines}
+    with tempfile.TemporaryDirectory() as work_path:
+        results = stopwatch("download", _download, base_url, rows, work_path)
+
+        parsed_cache = ParsedExportCache(os.path.join(work_path, "parsed"))
+        for row, (file_path, sha256) in zip(rows, results):
+            keys = stopwatch("decode", lambda: list(iter_keys(read_export_payload(file_path))))
+            table = stopwatch("key_table", KeyTable.from_keys, keys)
+
+            parsed_cache.store(sha256, table)
+            stopwatch("parsed_cache_load", parsed_cache.load, sha256)
+
+            if "python" in partial_statistics_lists:
+                partial_statistics_lists["python"].append(
+                    stopwatch("aggregate_python", _aggregate_python, row["created"], keys, table))
+            if "numpy" in partial_statistics_lists:
+                partial_statistics_lists["numpy"].append(
+                    stopwatch("aggregate_numpy", _aggregate_numpy, row["created"], table))
+            del keys, table
+
+        csv_contents = set()
+        for engine, partial_statistics_list in partial_statistics_lists.items():
+            csv_path = os.path.join(work_path, "statistics_%s.csv" % engine)
+            if engine == FLAGS.engines[0]:
+                stopwatch("write_csv", _write_csv, partial_statistics_list, csv_path)
+            else:
+                _write_csv(partial_statistics_list, csv_path)
+            with open(csv_path) as fp:
+                csv_contents.add(fp.read())
+        assert len(csv_contents) == 1, "Engines %s disagree." % ", ".join(FLAGS.engines)
+
+    result["seconds"] = {stage: stopwatch.seconds[stage] for stage in STAGES if stage in stopwatch.seconds}
+    return result
+
+
+def _print_result(result):
+    print("%d keys in %d files (%.1f MB, %s in %.1f s):" % (
+        result["key_count"], result["file_count"], result["bytes"] / 1000 / 1000,
+        "generated" if result["generated"] else "reused", result["generate_seconds"]))
+    for stage, seconds in result["seconds"].items():
+        keys_per_second = result["key_count"] / seconds if seconds > 0 else float("inf")
+        print("  %-18s %10.3f s %14.0f keys/s" % (stage, seconds, keys_per_second))
+
+
+def main(argv):
+    del argv  # Unused.
+
+    for engine in FLAGS.engines:
+        if engine not in ("python", "numpy"):
+            raise app.UsageError("Unknown engine %s." % engine)
+
+    profile = ExportProfile(v2_ratio=FLAGS.v2_ratio)
+    os.makedirs(FLAGS.benchmark_path, exist_ok=True)
+
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(_QuietHandler, directory=FLAGS.benchmark_path))
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+
+    results = []
+    try:
+        for key_count in [int(key_count) for key_count in FLAGS.key_counts]:
+            name = "exports_%d" % key_count
+            base_url = "http://127.0.0.1:%d/%s/" % (server.server_address[1], name)
+            result = _benchmark(key_count, profile, os.path.join(FLAGS.benchmark_path, name), base_url)
+            _print_result(result)
+            results.append(result)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if FLAGS.report_path is not None:
+        report = {
+            "python_version": platform.python_version(),
+            "numpy_version": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "download_workers": FLAGS.download_workers,
+            "keys_per_file": FLAGS.keys_per_file,
+            "profile": profile.to_dict(),
+            "results": results,
+        }
+        with open(FLAGS.report_path, mode='w') as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -1,29 +1,82 @@
 import base64
 import csv
 import datetime
-import itertools
 import json
 import os
-import tempfile
+import sys
 import zipfile
-from functools import cmp_to_key
-from itertools import groupby
-from urllib import request
+from functools import cmp_to_key, partial
 
+import numpy as np
 from absl import flags, app
 
-import protobuf.temporary_exposure_key_export_pb2 as tek_export
+from download_cache import DownloadCache
+from downloader import Downloader
+from export_reader import read_export_payload, read_export_header, iter_keys, iter_revised_keys
+from instrumentation import Instrumentation, define_flags
+from json_stream import iter_json_array
+from key_archive import KeyArchive
+from key_dump import KeyDumpWriter
+from key_filter import KeyFilter, DEFAULT_FALSE_POSITIVE_RATE
+from key_index import KeyIndex, batch_hash, find_duplicates
+from key_query import query_range
+from key_sketch import KeySketches, write_distinct_key_counts
+from key_table import KeyTable
+from numpy_statistics import statistics_key_table, hashed_groups
+from parsed_cache import ParsedExportCache, DIRNAME_PARSED
+from pipeline import run_pipeline, DEFAULT_DEPTH
+from python_statistics import aggregate_keys
+from reconciliation import reconcile
+from rollups import Rollups
+from state_store import StateStore, BatchState
 from statistics import StatisticsData, EN_INTERVAL_WINDOW
+from streaming_csv_writer import StreamingCsvWriter
 
 FLAGS = flags.FLAGS
 flags.DEFINE_string("diagnosis_keys_list_url", None, "URL of the server that is providing the diagnosis-keys list.")
-flags.DEFINE_string("tmp_path", "/tmp/cocoa_diagnosis_keys", "Temporary Path")
+flags.DEFINE_string("tmp_path", "/tmp/cocoa_diagnosis_keys", "Temporary Path (also used as the download cache)")
 flags.DEFINE_string("output_path", "./v1/cocoa_diagnosis_keys/latest.csv", "Output-file path")
+flags.DEFINE_string("output_parquet_path", None, "Output-file path of Parquet (requires pyarrow)")
 flags.DEFINE_boolean("verbose", False, "Output verbose")
-
-FILENAME_EXPORT_BIN = "export.bin"
-BIN_HEADER = "EK Export v1    "
-BIN_HEADER_BYTES_LENGTH = len(BIN_HEADER.encode(encoding='utf-8'))
+flags.DEFINE_integer("download_workers", 8, "Number of concurrent downloads")
+flags.DEFINE_integer("download_retries", 3, "Number of retries per file")
+flags.DEFINE_float("download_backoff", 1.0, "Initial retry backoff in seconds (doubled on every retry)")
+flags.DEFINE_integer("cache_max_bytes", 2 * 1024 * 1024 * 1024, "Maximum size of the download cache in bytes")
+flags.DEFINE_float("cache_max_age_days", 30, "Cached files unused for this number of days are evicted")
+flags.DEFINE_integer("workers", 0, "Number of processes parsing and aggregating batches (0: in the main process)")
+flags.DEFINE_integer("pipeline_depth", DEFAULT_DEPTH,
+                     "Maximum number of batches being downloaded, parsed or aggregated at the same time")
+flags.DEFINE_enum("engine", "python", ["python", "numpy"], "Statistics engine: per-key Python or columnar NumPy")
+flags.DEFINE_string("state_path", None, "Path of the persisted run state. If set, only new batches are processed")
+flags.DEFINE_string("key_index_path", None,
+                    "Path of the persisted index of every key seen (default: key_index.npz next to --state_path)")
+flags.DEFINE_string("key_sketch_path", None,
+                    "Path of the persisted distinct-key sketches per day (default: key_sketches.npz next to "
+                    "--state_path)")
+flags.DEFINE_string("archive_path", None, "Directory of the archive every parsed key is appended to")
+flags.DEFINE_string("key_filter_path", None,
+                    "Path of a Bloom filter of every key_data ever published (see lookup_keys.py)")
+flags.DEFINE_float("key_filter_false_positive_rate", DEFAULT_FALSE_POSITIVE_RATE,
+                   "False positive rate the Bloom filter is sized for")
+flags.DEFINE_string("rollup_path", None,
+                    "Directory of the statistics rolled up per created, per day and ISO week of the rolling start "
+                    "and overall")
+flags.DEFINE_string("effective_output_path", None,
+                    "Output-file path of the statistics with revised_keys applied (requires --archive_path)")
+flags.DEFINE_boolean("parsed_cache", False, "Cache the decoded keys of every ZIP in <tmp_path>/parsed")
+flags.DEFINE_boolean("streaming", False,
+                     "Process one batch at a time and write CSV rows as soon as every batch of a created is done")
+flags.DEFINE_string("dump_path", None, "Path of a JSON Lines dump of the export headers and keys of processed batches")
+flags.DEFINE_list("dump_batches", None, "Only dump these batches (URLs or file names)")
+flags.DEFINE_integer("dump_from_created", None, "Only dump batches created at or after this time (ms)")
+flags.DEFINE_integer("dump_to_created", None, "Only dump batches created at or before this time (ms)")
+flags.DEFINE_integer("dump_from_rolling_start_interval_number", None,
+                     "Only dump keys with a rolling_start_interval_number of at least this")
+flags.DEFINE_integer("dump_to_rolling_start_interval_number", None,
+                     "Only dump keys with a rolling_start_interval_number of at most this")
+define_flags()
+
+ENGINE_NUMPY = "numpy"
 
 JST = datetime.timezone(datetime.timedelta(hours=9), 'Asia/Tokyo')
 
@@ -32,59 +85,36 @@ class Entry:
     url = None
     created = -1
     zip_file_path = None
-    diagnosis_keys = None
+    sha256 = None
 
-    def __init__(self, url, created, zip_file_path):
+    def __init__(self, url, created, zip_file_path, sha256=None):
         self.url = url
         self.created = created
         self.zip_file_path = zip_file_path
+        self.sha256 = sha256
 
 
-def _download_diagnosis_keys_list(diagnosis_keys_list_url):
-    fd, tmpfile = tempfile.mkstemp(dir=FLAGS.tmp_path, suffix='.json', text=True)
-    req = request.Request(diagnosis_keys_list_url)
-    with request.urlopen(req) as res:
-        os.write(fd, res.read())
-    os.close(fd)
-    return tmpfile
+def _download_diagnosis_keys_list(cache, instrumentation, diagnosis_keys_list_url):
+    with instrumentation.stage("list_fetch"):
+        file_path, _ = cache.fetch(diagnosis_keys_list_url)
+    instrumentation.add_bytes("list_fetch", os.path.getsize(file_path))
+    return file_path
 
 
-def _download_diagnosis_keys(row):
+def _download_diagnosis_keys(cache, instrumentation, row):
     url = row["url"]
     created = row["created"]
-    filename = url.split("/")[-1]
-    file_path = os.path.join(FLAGS.tmp_path, filename)
-    entry = Entry(url, created, file_path)
-    if os.path.exists(file_path):
-        print("%s already exist." % file_path)
-        return entry
-
-    with open(file_path, 'wb') as fp:
-        req = request.Request(url)
-        with request.urlopen(req) as res:
-            fp.write(res.read())
-    return entry
+    with instrumentation.stage("zip_fetch"):
+        file_path, sha256 = cache.fetch(url)
+    instrumentation.add_bytes("zip_fetch", os.path.getsize(file_path))
+    return Entry(url, created, file_path, sha256)
 
 
-def _get_diagnosis_keys_file(entry):
+def _get_diagnosis_keys_payload(entry):
     zip_file_path = entry.zip_file_path
     assert zipfile.is_zipfile(zip_file_path), "%s doesn't seem valid ZIP file." % zip_file_path
 
-    with zipfile.ZipFile(zip_file_path, "r") as zip:
-        zip.extract(FILENAME_EXPORT_BIN, FLAGS.tmp_path)
-
-    return os.path.join(FLAGS.tmp_path, FILENAME_EXPORT_BIN)
-
-
-def _get_diagnosis_keys(bin_file_path):
-    with open(bin_file_path, 'rb') as fp:
-        # strip header
-        fp.seek(BIN_HEADER_BYTES_LENGTH)
-
-        diagnosis_keys = tek_export.TemporaryExposureKeyExport()
-        diagnosis_keys.ParseFromString(fp.read())
-
-        return diagnosis_keys
+    return read_export_payload(zip_file_path)
 
 
 def _rolling_period_to_timedelta(rolling_period):
@@ -92,109 +122,221 @@ def _rolling_period_to_timedelta(rolling_period):
     return datetime.timedelta(seconds=epoch)
 
 
-def _is_valid_transmission_risk_level_key(key):
-    # https://developer.apple.com/documentation/exposurenotification/enexposureinfo/3583716-transmissionrisklevel
-    if key.transmission_risk_level >= 0 or key.transmission_risk_level <= 7:
-        return True, ""
+def _statistics_diagnosis_keys_file(entry, engine, parsed_cache=None, instrumentation=None):
+    # Runs in a worker process, so it only depends on its arguments and not on FLAGS.
+    # Returns the partial statistics, the KeyTables of keys and revised_keys of the batch and the stages recorded
+    # in a worker process:
+    # stages are recorded to `instrumentation` when it is given (in the main process) and returned otherwise.
+    recorder = instrumentation if instrumentation is not None else Instrumentation()
+
+    tables = None
+    if parsed_cache is not None:
+        with recorder.stage("parsed_cache_load"):
+            tables = parsed_cache.load_tables(entry.sha256)
+    is_cached = tables is not None
+    table, revised_table = tables if is_cached else (None, None)
+
+    keys = None
+    if table is None:
+        with recorder.stage("extract"):
+            payload = _get_diagnosis_keys_payload(entry)
+        recorder.add_bytes("extract", len(payload))
+
+        # The NumPy engine builds the table straight from the decoder, without keeping every key.
+        with recorder.stage("decode"):
+            if engine == ENGINE_NUMPY:
+                table = KeyTable.from_keys(iter_keys(payload))
+            else:
+                keys = list(iter_keys(payload))
+                table = KeyTable.from_keys(keys)
+            revised_table = KeyTable.from_keys(iter_revised_keys(payload))
+        del payload
+    elif engine != ENGINE_NUMPY:
+        with recorder.stage("decode"):
+            keys = list(table.iter_keys())
+
+    with recorder.stage("aggregate"):
+        if engine == ENGINE_NUMPY:
+            group_ids, group_count = hashed_groups(table.rolling_start_interval_number)
+            partial_statistics_list = statistics_key_table(entry.created, table, group_ids, group_count)
+        else:
+            statistics_dict = {}
+            aggregate_keys(statistics_dict, entry.created, keys, table)
+            partial_statistics_list = list(statistics_dict.values())
 
-    return False, "value transmission_risk_level %d" % key.report_type
+    if parsed_cache is not None and not is_cached:
+        with recorder.stage("parsed_cache_store"):
+            parsed_cache.store(entry.sha256, table, revised_table)
 
+    return partial_statistics_list, table, revised_table, recorder.stages if instrumentation is None else None
 
-def _is_valid_report_type_key(key):
-    # https://developer.apple.com/documentation/exposurenotification/endiagnosisreporttype
-    if key.report_type >= 0 or key.report_type <= 5:
-        return True, ""
 
-    return False, "value report_type %d is invalid." % key.report_type
+def _count_duplicate_keys(key_index, url, created, partial_statistics_list, table):
+    is_duplicate, first_seen_created = find_duplicates(key_index, created, batch_hash(url), table.key_data)
 
+    groups, group_ids = np.unique(table.rolling_start_interval_number, return_inverse=True)
+    group_ids = group_ids.reshape(-1)
+    duplicate_key_counts = np.bincount(group_ids[is_duplicate], minlength=len(groups))
+    group_first_seen_created = np.full(len(groups), created, dtype=np.int64)
+    np.minimum.at(group_first_seen_created, group_ids, first_seen_created)
 
-def _is_valid_days_since_onset_of_symptoms_key(key):
-    # https://developers.google.com/android/exposure-notifications/meaningful-exposures
-    if key.days_since_onset_of_symptoms >= -14 or key.days_since_onset_of_symptoms <= 14:
-        return True, ""
+    group_indices = {rolling_start_interval_number: group
+                     for group, rolling_start_interval_number in enumerate(groups.tolist())}
+    for statistics_data in partial_statistics_list:
+        group = group_indices[statistics_data.rolling_start_interval_number]
+        statistics_data.duplicate_key_count = int(duplicate_key_counts[group])
+        statistics_data.first_seen_created = int(group_first_seen_created[group])
 
-    return False, "value days_since_onset_of_symptoms %d is invalid." % key.days_since_onset_of_symptoms
 
+def _process_diagnosis_keys(cache, rows, engine, workers, depth, key_index, key_sketches, key_archive, parsed_cache,
+                            key_dump, instrumentation):
+    # Yields (entry, partial statistics) of every row. Batches are processed from the oldest `created`,
+    # so a key republished later is a duplicate.
+    rows = sorted(rows, key=lambda row: row["created"])
+    batches = run_pipeline(rows, partial(_download_diagnosis_keys, cache, instrumentation),
+                           partial(_statistics_diagnosis_keys_file, engine=engine, parsed_cache=parsed_cache,
+                                   instrumentation=instrumentation if workers == 0 else None),
+                           FLAGS.download_workers, workers, depth)
 
-def _is_valid_temporary_exposure_key_key(key):
-    # Temporary Exposure Key
-    # The use of 16-byte keys limits the server and device requirements for transferring and storing
-    # Diagnosis Keys while preserving low false-positive probabilities.
-    # https://blog.google/documents/69/Exposure_Notification_-_Cryptography_Specification_v1.2.1.pdf/
-    if len(key.key_data) == 16:
-        return True, ""
+    for entry, (partial_statistics_list, table, revised_table, stages) in batches:
+        if stages is not None:
+            instrumentation.merge_stages(stages)
 
-    return False, "key_data %s length %d is invalid." % (base64.b64encode(key.key_data), len(key.key_data))
+        if FLAGS.verbose:
+            _print(entry)
 
+        if key_dump is not None and key_dump.accepts(entry.url, entry.created):
+            with instrumentation.stage("dump"):
+                _dump(key_dump, entry, table)
 
-def _statistics_keys(created, rolling_start_interval_number, keys):
-    statistics_data = StatisticsData()
-    statistics_data.created = created
-    statistics_data.rolling_start_interval_number = rolling_start_interval_number
+        if key_archive is not None:
+            with instrumentation.stage("archive"):
+                key_archive.append(entry.url, entry.created, entry.sha256, table, revised_table)
 
-    for key in keys:
-        statistics_data.key_count += 1
+        with instrumentation.stage("duplicates"):
+            _count_duplicate_keys(key_index, entry.url, entry.created, partial_statistics_list, table)
 
-        is_valid_key = True
+        with instrumentation.stage("sketch"):
+            key_sketches.add(table.rolling_start_interval_number, table.key_data)
 
-        messages = []
+        instrumentation.count("batches_processed")
+        instrumentation.count("keys", len(table))
+        instrumentation.count("revised_keys", len(revised_table))
+        instrumentation.count("duplicate_keys", sum(
+            statistics_data.duplicate_key_count for statistics_data in partial_statistics_list))
 
-        is_valid, message = _is_valid_transmission_risk_level_key(key)
-        if not is_valid:
-            statistics_data.invalid_transmission_risk_level_key_count += 1
-            is_valid_key = False
-            messages.append(message)
+        yield entry, partial_statistics_list
 
-        is_valid, message = _is_valid_report_type_key(key)
-        if not is_valid:
-            statistics_data.invalid_transmission_risk_level_key_count += 1
-            is_valid_key = False
-            messages.append(message)
 
-        is_valid, message = _is_valid_days_since_onset_of_symptoms_key(key)
-        if not is_valid:
-            statistics_data.invalid_transmission_risk_level_key_count += 1
-            is_valid_key = False
-            messages.append(message)
+def _merge_partial_statistics(statistics_dict, partial_statistics_list):
+    for partial_statistics_data in partial_statistics_list:
+        group = (partial_statistics_data.created, partial_statistics_data.rolling_start_interval_number)
+        statistics_data = statistics_dict.get(group)
+        if statistics_data is None:
+            statistics_data = StatisticsData()
+            statistics_data.created = partial_statistics_data.created
+            statistics_data.rolling_start_interval_number = partial_statistics_data.rolling_start_interval_number
+            statistics_dict[group] = statistics_data
+        statistics_data.merge(partial_statistics_data)
 
-        is_valid, message = _is_valid_temporary_exposure_key_key(key)
-        if not is_valid:
-            statistics_data.invalid_key_data_count += 1
-            is_valid_key = False
-            messages.append(message)
 
-        statistics_data.comment = "|".join(messages)
+def _merge_statistics(partial_statistics_lists):
+    statistics_dict = {}
 
-        if is_valid_key:
-            statistics_data.valid_key_count += 1
+    # Partials must be given in the order of the entries, so merging keeps the order of keys.
+    for partial_statistics_list in partial_statistics_lists:
+        _merge_partial_statistics(statistics_dict, partial_statistics_list)
 
-        statistics_data.transmission_risk_level_distribution[key.transmission_risk_level] += 1
+    return list(statistics_dict.values())
 
-        if key.HasField("report_type"):
-            statistics_data.report_type_distribution[key.report_type] += 1
-        else:
-            statistics_data.has_not_report_type_count += 1
 
-        if key.HasField("days_since_onset_of_symptoms"):
-            statistics_data.days_since_onset_of_symptoms_distribution[key.days_since_onset_of_symptoms] += 1
-        else:
-            statistics_data.has_not_days_since_onset_of_symptoms_count += 1
+def _write_csv(statistics_list, output_path):
+    statistics_list = sorted(statistics_list, key=cmp_to_key(StatisticsData.compare))
 
-    return statistics_data
+    with open(output_path, mode='w') as fp:
+        writer = csv.writer(fp)
+        StatisticsData.write_header_to_csv(writer)
+        for statistics_data in statistics_list:
+            statistics_data.write_to_csv(writer)
 
+    return statistics_list
 
-def _statistics(diagnosis_keys_entries):
-    statistics_list = []
 
-    for created, entries in groupby(diagnosis_keys_entries, key=lambda entry: entry.created):
-        # Extract keys
-        keys = list(itertools.chain.from_iterable((map(lambda entry: entry.diagnosis_keys.keys, entries))))
+def _statistics_effective(key_archive, list_file_path, instrumentation, output_path):
+    # Statistics of every archived batch of the list with revised_keys applied to the keys they revise.
+    # Duplicates are counted again over the same batches, so the rows match the ones of the raw statistics.
+    with open(list_file_path) as fp:
+        urls = [row["url"] for row in iter_json_array(fp)]
+    batch_ids = key_archive.latest_batch_ids(urls)
+    print("%d of %d batches are archived." % (len(batch_ids), len(urls)))
+
+    with instrumentation.stage("reconcile"):
+        reconciliation = reconcile(key_archive, batch_ids)
+    print("%d revised keys: applied to %d keys, %d unmatched." % (
+        reconciliation.revised_key_count, reconciliation.applied_key_count, reconciliation.unmatched_key_count))
+    instrumentation.count("applied_revised_keys", reconciliation.applied_key_count)
+    instrumentation.count("unmatched_revised_keys", reconciliation.unmatched_key_count)
+
+    with instrumentation.stage("effective_aggregate"):
+        key_index = KeyIndex()
+        statistics_dict = {}
+        for created, url, table in reconciliation.batches:
+            group_ids, group_count = hashed_groups(table.rolling_start_interval_number)
+            partial_statistics_list = statistics_key_table(created, table, group_ids, group_count)
+            _count_duplicate_keys(key_index, url, created, partial_statistics_list, table)
+            _merge_partial_statistics(statistics_dict, partial_statistics_list)
+
+    with instrumentation.stage("write_effective"):
+        _write_csv(statistics_dict.values(), output_path)
+    instrumentation.add_bytes("write_effective", os.path.getsize(output_path))
+
+    return len(statistics_dict)
+
+
+def _statistics_streaming(cache, list_file_path, state_store, key_index, key_sketches, key_archive, parsed_cache,
+                          key_dump, rollups, instrumentation, output_path):
+    # Rows are reduced to url and created, and sorted so that every `created` is complete before the next one.
+    with open(list_file_path) as fp:
+        rows = [{"url": row["url"], "created": row["created"]} for row in iter_json_array(fp)]
+    rows.sort(key=lambda row: row["created"])
+
+    new_rows = rows
+    if state_store is not None:
+        new_rows = [row for row in rows if state_store.get(row["url"], row["created"]) is None]
+        print("%d of %d batches are new." % (len(new_rows), len(rows)))
+
+    # One batch at a time, in the same order as rows.
+    instrumentation.count("batches", len(rows))
+    new_batches = _process_diagnosis_keys(cache, new_rows, FLAGS.engine, FLAGS.workers, 1, key_index, key_sketches,
+                                          key_archive, parsed_cache, key_dump, instrumentation)
+
+    writer = StreamingCsvWriter(output_path)
+    for row in rows:
+        batch_state = None
+        if state_store is not None:
+            batch_state = state_store.get(row["url"], row["created"])
+
+        if batch_state is not None:
+            partial_statistics_list = batch_state.statistics_list
+        else:
+            entry, partial_statistics_list = next(new_batches)
+            assert entry.url == row["url"], "%s != %s" % (entry.url, row["url"])
+            if state_store is not None:
+                state_store.put(BatchState(entry.url, entry.created, partial_statistics_list))
 
-        for rolling_start_interval_number, keys in groupby(keys, key=lambda key: key.rolling_start_interval_number):
-            statistics_data = _statistics_keys(created, rolling_start_interval_number, keys)
-            statistics_list.append(statistics_data)
+        with instrumentation.stage("write"):
+            writer.add(partial_statistics_list)
+        if rollups is not None:
+            with instrumentation.stage("rollup"):
+                rollups.add(partial_statistics_list)
+    with instrumentation.stage("write"):
+        writer.close()
+    instrumentation.add_bytes("write", os.path.getsize(output_path))
 
-    return statistics_list
+    if state_store is not None:
+        state_store.retain([row["url"] for row in rows])
+
+    return writer.row_count
 
 
 DICT_TRANSMISSION_RISK_LEVEL = {
@@ -219,54 +361,69 @@ DICT_REPORT_TYPE = {
 }
 
 
-def _print_key(key, index):
+def _append_key_lines(lines, key, index):
     key_data = base64.b64encode(key.key_data).decode('utf-8')
 
     type = "v1"
-    if key.HasField("report_type") and key.HasField("days_since_onset_of_symptoms"):
+    if key.report_type is not None and key.days_since_onset_of_symptoms is not None:
         type = "v2"
 
-    print("     * Index %d" % index)
-    print("       * type: %s" % type)
-    print("       * key_data: %s" % key_data)
-    print("       * transmission_risk_level: %s" % DICT_TRANSMISSION_RISK_LEVEL[key.transmission_risk_level])
-    print("       * rolling_start_interval_number: %s" % key.rolling_start_interval_number)
-    print("       * rolling_period: %s" % key.rolling_period)
+    lines.append("     * Index %d" % index)
+    lines.append("       * type: %s" % type)
+    lines.append("       * key_data: %s" % key_data)
+    lines.append("       * transmission_risk_level: %s" % DICT_TRANSMISSION_RISK_LEVEL[key.transmission_risk_level])
+    lines.append("       * rolling_start_interval_number: %s" % key.rolling_start_interval_number)
+    lines.append("       * rolling_period: %s" % key.rolling_period)
 
-    if not key.HasField("report_type"):
-        print("       * report_type: N/A")
+    if key.report_type is None:
+        lines.append("       * report_type: N/A")
     else:
-        print("       * report_type: %s" % DICT_REPORT_TYPE[key.report_type])
+        lines.append("       * report_type: %s" % DICT_REPORT_TYPE[key.report_type])
 
-    if not key.HasField("days_since_onset_of_symptoms"):
-        print("       * days_since_onset_of_symptoms: N/A")
+    if key.days_since_onset_of_symptoms is None:
+        lines.append("       * days_since_onset_of_symptoms: N/A")
     else:
-        print("       * days_since_onset_of_symptoms: %d" % key.days_since_onset_of_symptoms)
+        lines.append("       * days_since_onset_of_symptoms: %d" % key.days_since_onset_of_symptoms)
 
 
 def _print(entry):
-    file_name = os.path.basename(entry.zip_file_path)
-    diagnosis_keys = entry.diagnosis_keys
+    # Lines of the batch are written at once: a print() per line dominates the run on large exports.
+    # --dump_path writes the same as JSON lines, faster.
+    # zip_file_path is an object of the download cache named by its SHA-256, so the name comes from the URL.
+    file_name = entry.url.split("/")[-1]
+    payload = _get_diagnosis_keys_payload(entry)
+    diagnosis_keys = read_export_header(payload)
 
     created_datetime = datetime.datetime.fromtimestamp(entry.created / 1000).astimezone(JST)
     start_datetime = datetime.datetime.fromtimestamp(diagnosis_keys.start_timestamp).astimezone(JST)
     end_datetime = datetime.datetime.fromtimestamp(diagnosis_keys.end_timestamp).astimezone(JST)
 
-    print(" * %s" % file_name)
-    print("   * created: %s (%d)" % (created_datetime, entry.created))
-    print("   * start_timestamp: %s (%d)" % (start_datetime, diagnosis_keys.start_timestamp))
-    print("   * end_timestamp: %s (%d)" % (end_datetime, diagnosis_keys.end_timestamp))
-    print("   * region: %s" % diagnosis_keys.region)
-    print("   * batch_num: %d" % diagnosis_keys.batch_num)
-    print("   * batch_size: %d" % diagnosis_keys.batch_size)
+    lines = [
+        " * %s" % file_name,
+        "   * created: %s (%d)" % (created_datetime, entry.created),
+        "   * start_timestamp: %s (%d)" % (start_datetime, diagnosis_keys.start_timestamp),
+        "   * end_timestamp: %s (%d)" % (end_datetime, diagnosis_keys.end_timestamp),
+        "   * region: %s" % diagnosis_keys.region,
+        "   * batch_num: %d" % diagnosis_keys.batch_num,
+        "   * batch_size: %d" % diagnosis_keys.batch_size,
+    ]
+
+    lines.append("   * %d keys:" % diagnosis_keys.key_count)
+    for index, key in enumerate(iter_keys(payload)):
+        _append_key_lines(lines, key, index)
+
+    lines.append("   * %d revised_keys:" % diagnosis_keys.revised_key_count)
+    for index, key in enumerate(iter_revised_keys(payload)):
+        _append_key_lines(lines, key, index)
 
-    print("   * %d keys:" % (len(diagnosis_keys.keys)))
-    for index, key in enumerate(diagnosis_keys.keys):
-        _print_key(key, index)
+    lines.append("")
+    sys.stdout.write("\n".join(lines))
 
-    print("   * %d revised_keys:" % (len(diagnosis_keys.revised_keys)))
-    for index, key in enumerate(diagnosis_keys.revised_keys):
-        _print_key(key, index)
+
+def _dump(key_dump, entry, table):
+    # Keys are written from the table. Only the header and revised_keys are read from the payload again.
+    payload = _get_diagnosis_keys_payload(entry)
+    key_dump.write(entry.url, entry.created, read_export_header(payload), table, iter_revised_keys(payload))
 
 
 def main(argv):
@@ -278,42 +435,176 @@ def main(argv):
     else:
         diagnosis_keys_list_url = os.environ['COCOA_DIAGNOSIS_KEYS_LIST_URL']
 
+    if FLAGS.streaming and FLAGS.output_parquet_path is not None:
+        raise app.UsageError("--output_parquet_path is not supported with --streaming.")
+    if FLAGS.effective_output_path is not None and FLAGS.archive_path is None:
+        raise app.UsageError("--effective_output_path requires --archive_path.")
+
     dir = os.path.dirname(FLAGS.output_path)
     os.makedirs(dir, exist_ok=True)
 
     os.makedirs(FLAGS.tmp_path, exist_ok=True)
 
     print("Start")
-
-    list_file_path = _download_diagnosis_keys_list(diagnosis_keys_list_url)
-
-    diagnosis_keys_entries = []
-    with open(list_file_path) as fp:
-        json_obj = json.load(fp)
-        for row in json_obj:
-            diagnosis_keys_entries.append(_download_diagnosis_keys(row))
-
-    for entry in diagnosis_keys_entries:
-        diagnosis_keys_file_path = _get_diagnosis_keys_file(entry)
-        entry.diagnosis_keys = _get_diagnosis_keys(diagnosis_keys_file_path)
-        os.remove(diagnosis_keys_file_path)
-
-    if FLAGS.verbose:
-        for entry in diagnosis_keys_entries:
-            _print(entry)
-
-    # Statistics
-    statistics_list = _statistics(diagnosis_keys_entries)
-    sorted(statistics_list, key=cmp_to_key(StatisticsData.compare))
-
-    with open(FLAGS.output_path, mode='w') as fp:
-        writer = csv.writer(fp)
-        StatisticsData.write_header_to_csv(writer)
-        for statistics_data in statistics_list:
-            statistics_data.write_to_csv(writer)
+    instrumentation = Instrumentation.from_flags("cocoa_diagnosis_keys")
+
+    state_store = None
+    if FLAGS.state_path is not None:
+        state_store = StateStore.load(FLAGS.state_path)
+
+    key_index_path = FLAGS.key_index_path
+    if key_index_path is None and FLAGS.state_path is not None:
+        key_index_path = os.path.join(os.path.dirname(FLAGS.state_path), "key_index.npz")
+
+    key_index = KeyIndex()
+    if key_index_path is not None:
+        key_index = KeyIndex.load(key_index_path)
+
+    key_sketch_path = FLAGS.key_sketch_path
+    if key_sketch_path is None and FLAGS.state_path is not None:
+        key_sketch_path = os.path.join(os.path.dirname(FLAGS.state_path), "key_sketches.npz")
+
+    key_sketches = KeySketches()
+    if key_sketch_path is not None:
+        key_sketches = KeySketches.load(key_sketch_path)
+
+    key_archive = None
+    if FLAGS.archive_path is not None:
+        key_archive = KeyArchive.load(FLAGS.archive_path)
+
+    parsed_cache = None
+    if FLAGS.parsed_cache:
+        parsed_cache = ParsedExportCache(os.path.join(FLAGS.tmp_path, DIRNAME_PARSED))
+
+    key_dump = None
+    if FLAGS.dump_path is not None:
+        os.makedirs(os.path.dirname(FLAGS.dump_path) or ".", exist_ok=True)
+        key_dump = KeyDumpWriter(
+            FLAGS.dump_path, FLAGS.dump_batches, query_range(FLAGS.dump_from_created, FLAGS.dump_to_created),
+            query_range(FLAGS.dump_from_rolling_start_interval_number, FLAGS.dump_to_rolling_start_interval_number),
+            # With a state, a run processes only new batches, so the dump of earlier runs is kept.
+            append=FLAGS.state_path is not None)
+
+    rollups = Rollups() if FLAGS.rollup_path is not None else None
+
+    downloader = Downloader(retries=FLAGS.download_retries, backoff=FLAGS.download_backoff)
+    cache = DownloadCache(FLAGS.tmp_path, downloader)
+    try:
+        list_file_path = _download_diagnosis_keys_list(cache, instrumentation, diagnosis_keys_list_url)
+
+        if FLAGS.streaming:
+            row_count = _statistics_streaming(cache, list_file_path, state_store, key_index, key_sketches,
+                                              key_archive, parsed_cache, key_dump, rollups, instrumentation,
+                                              FLAGS.output_path)
+        else:
+            with instrumentation.stage("list_parse"):
+                with open(list_file_path) as fp:
+                    json_obj = json.load(fp)
+            instrumentation.count("batches", len(json_obj))
+
+            rows = json_obj
+            if state_store is not None:
+                rows = [row for row in json_obj if state_store.get(row["url"], row["created"]) is None]
+                print("%d of %d batches are new." % (len(rows), len(json_obj)))
+
+            # Statistics
+            statistics_dict = {}
+            for entry, partial_statistics_list in _process_diagnosis_keys(cache, rows, FLAGS.engine, FLAGS.workers,
+                                                                          FLAGS.pipeline_depth, key_index,
+                                                                          key_sketches, key_archive, parsed_cache,
+                                                                          key_dump, instrumentation):
+                if state_store is not None:
+                    state_store.put(BatchState(entry.url, entry.created, partial_statistics_list))
+                else:
+                    _merge_partial_statistics(statistics_dict, partial_statistics_list)
+    finally:
+        downloader.close()
+        if key_dump is not None:
+            key_dump.close()
+
+    if key_dump is not None:
+        print("%d lines are dumped to %s." % (key_dump.line_count, FLAGS.dump_path))
+        instrumentation.count("dumped_lines", key_dump.line_count)
+
+    if FLAGS.streaming:
+        print("%d keys are indexed." % len(key_index))
+        print("%d rows are written." % row_count)
+    else:
+        if state_store is not None:
+            state_store.retain([row["url"] for row in json_obj])
+            statistics_list = _merge_statistics(
+                state_store.get(row["url"], row["created"]).statistics_list for row in json_obj)
+        else:
+            statistics_list = list(statistics_dict.values())
+        print("%d keys are indexed." % len(key_index))
+        row_count = len(statistics_list)
+
+        if rollups is not None:
+            with instrumentation.stage("rollup"):
+                rollups.add(statistics_list)
+
+        with instrumentation.stage("write"):
+            statistics_list = _write_csv(statistics_list, FLAGS.output_path)
+        instrumentation.add_bytes("write", os.path.getsize(FLAGS.output_path))
+
+        if FLAGS.output_parquet_path is not None:
+            # Imported here so that pyarrow is needed only for Parquet output.
+            from parquet_writer import write_to_parquet
+
+            os.makedirs(os.path.dirname(FLAGS.output_parquet_path) or ".", exist_ok=True)
+            with instrumentation.stage("write_parquet"):
+                write_to_parquet(statistics_list, FLAGS.output_parquet_path)
+            instrumentation.add_bytes("write_parquet", os.path.getsize(FLAGS.output_parquet_path))
+    instrumentation.count("rows", row_count)
+
+    if rollups is not None:
+        with instrumentation.stage("write_rollups"):
+            rollup_file_paths = rollups.write(FLAGS.rollup_path)
+            rollup_file_paths += write_distinct_key_counts(key_sketches, FLAGS.rollup_path)
+        instrumentation.add_bytes("write_rollups", sum(os.path.getsize(path) for path in rollup_file_paths))
+        print("Rollups are written to %s." % FLAGS.rollup_path)
+
+    if FLAGS.key_filter_path is not None:
+        with instrumentation.stage("key_filter"):
+            key_filter = KeyFilter.build(key_index.key_data(), FLAGS.key_filter_false_positive_rate)
+            key_filter.save(FLAGS.key_filter_path)
+        instrumentation.add_bytes("key_filter", os.path.getsize(FLAGS.key_filter_path))
+        print("A filter of %d keys (false positive rate %.1e) is written to %s." % (
+            key_filter.key_count, key_filter.false_positive_rate, FLAGS.key_filter_path))
+
+    if FLAGS.effective_output_path is not None:
+        os.makedirs(os.path.dirname(FLAGS.effective_output_path) or ".", exist_ok=True)
+        effective_row_count = _statistics_effective(key_archive, list_file_path, instrumentation,
+                                                    FLAGS.effective_output_path)
+        print("%d effective rows are written." % effective_row_count)
+
+    # The archive and the index are saved before the state: adding a batch to them again changes nothing.
+    with instrumentation.stage("save"):
+        if key_archive is not None:
+            key_archive.save()
+            print("%d keys of %d batches are archived." % (len(key_archive), len(key_archive.batches)))
+
+        if key_index_path is not None:
+            key_index.save(key_index_path)
+
+        if key_sketch_path is not None:
+            key_sketches.save(key_sketch_path)
+
+        if state_store is not None:
+            state_store.save()
 
     print("Clean...")
-    os.remove(list_file_path)
+    cache.evict(FLAGS.cache_max_bytes, FLAGS.cache_max_age_days * 24 * 60 * 60)
+    cache.save()
+    if parsed_cache is not None:
+        parsed_cache.retain(cache.sha256s())
+    print(cache.summary())
+
+    instrumentation.count("cache_hits", cache.hit_count)
+    instrumentation.count("cache_misses", cache.miss_count)
+    instrumentation.count("cache_corrupted", cache.corrupted_count)
+    instrumentation.count("indexed_keys", len(key_index))
+    instrumentation.close(FLAGS.run_report_path)
 
     print("Done.")
 
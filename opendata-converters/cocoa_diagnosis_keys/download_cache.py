@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from downloader import DownloadError
+
+MANIFEST_VERSION = 1
+FILENAME_MANIFEST = "cache.json"
+DIRNAME_OBJECTS = "objects"
+
+
+def sha256_file(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class DownloadCache:
+    """Content-addressed cache of downloaded files with HTTP revalidation.
+
+    Files are stored as `objects/<sha256>` under `cache_path`, and `cache.json` maps every URL to
+    its object, validators (ETag, Last-Modified), size and last use. A cached file is used only
+    after its size and SHA-256 have been verified and the server answered 304 Not Modified.
+    """
+
+    def __init__(self, cache_path, downloader):
+        self.cache_path = cache_path
+        self.downloader = downloader
+        self.objects_path = os.path.join(cache_path, DIRNAME_OBJECTS)
+        self.manifest_path = os.path.join(cache_path, FILENAME_MANIFEST)
+
+        self.hit_count = 0
+        self.miss_count = 0
+        self.corrupted_count = 0
+        self.evicted_count = 0
+
+        self._lock = threading.Lock()
+        self._entries = {}
+
+        os.makedirs(self.objects_path, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+
+        with open(self.manifest_path, mode='r') as fp:
+            json_obj = json.load(fp)
+
+        if json_obj.get("version") == MANIFEST_VERSION:
+            self._entries = json_obj["entries"]
+
+    def save(self):
+        with self._lock:
+            json_obj = {
+                "version": MANIFEST_VERSION,
+                "entries": self._entries,
+            }
+
+        tmp_path = "%s.tmp" % self.manifest_path
+        with open(tmp_path, mode='w') as fp:
+            json.dump(json_obj, fp)
+        os.replace(tmp_path, self.manifest_path)
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_path, sha256)
+
+    def _is_intact(self, entry):
+        file_path = self.object_path(entry["sha256"])
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != entry["size"]:
+            return False
+        return sha256_file(file_path) == entry["sha256"]
+
+    def _store(self, part_file_path):
+        sha256 = sha256_file(part_file_path)
+        file_path = self.object_path(sha256)
+        if os.path.exists(file_path) and sha256_file(file_path) == sha256:
+            os.remove(part_file_path)
+        else:
+            os.replace(part_file_path, file_path)
+        return sha256
+
+    def fetch(self, url):
+        """Returns (file_path, sha256) of the current content of `url`."""
+        with self._lock:
+            entry = self._entries.get(url)
+
+        headers = {}
+        if entry is not None:
+            if self._is_intact(entry):
+                if entry.get("etag") is not None:
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified") is not None:
+                    headers["If-Modified-Since"] = entry["last_modified"]
+            else:
+                with self._lock:
+                    self.corrupted_count += 1
+                entry = None
+
+        # Bodies are streamed to a temporary name, so that an interrupted download is never mistaken for
+        # a complete object.
+        part_file_path = os.path.join(self.objects_path, "%d.part" % threading.get_ident())
+        try:
+            with open(part_file_path, 'w+b') as fp:
+                response = self.downloader.fetch(url, headers, fp)
+                size = fp.tell()
+        except BaseException:
+            os.remove(part_file_path)
+            raise
+        now = time.time()
+
+        if response.status == 304:
+            os.remove(part_file_path)
+            if entry is None:
+                raise DownloadError(url, response.status, "Not Modified without a cached file")
+            with self._lock:
+                entry["used_at"] = now
+                self.hit_count += 1
+            return self.object_path(entry["sha256"]), entry["sha256"]
+
+        sha256 = self._store(part_file_path)
+        entry = {
+            "sha256": sha256,
+            "size": size,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": now,
+            "used_at": now,
+        }
+        with self._lock:
+            self._entries[url] = entry
+            self.miss_count += 1
+        return self.object_path(sha256), sha256
+
+    def evict(self, max_bytes, max_age_seconds, now=None):
+        """Drops entries unused for `max_age_seconds`, then the least recently used ones above `max_bytes`."""
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            entries = sorted(self._entries.items(), key=lambda item: item[1]["used_at"], reverse=True)
+
+            retained = {}
+            total_bytes = 0
+            for url, entry in entries:
+                if now - entry["used_at"] > max_age_seconds:
+                    continue
+                if total_bytes + entry["size"] > max_bytes:
+                    continue
+                retained[url] = entry
+                total_bytes += entry["size"]
+
+            self.evicted_count += len(self._entries) - len(retained)
+            self._entries = retained
+
+            referenced = set(entry["sha256"] for entry in retained.values())
+
+        for name in os.listdir(self.objects_path):
+            if name not in referenced:
+                os.remove(os.path.join(self.objects_path, name))
+
+    def sha256s(self):
+        """Returns the SHA-256 of every cached file."""
+        with self._lock:
+            return set(entry["sha256"] for entry in self._entries.values())
+
+    def summary(self):
+        return "Cache: %d hits, %d misses, %d corrupted, %d evicted." % (
+            self.hit_count, self.miss_count, self.corrupted_count, self.evicted_count)
+
@@ -0,0 +1,190 @@
+import base64
+import http.client
+import threading
+import time
+import urllib.request
+from urllib import parse
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+DEFAULT_TIMEOUT = 60
+
+# Bodies written to a file are read in chunks of this size.
+CHUNK_SIZE = 1024 * 1024
+
+MAX_REDIRECTS = 5
+
+# The User-Agent urllib sent before the downloader used http.client directly.
+USER_AGENT = "Python-urllib/%s" % urllib.request.__version__
+
+# Status codes that are worth retrying.
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+REDIRECT_STATUS = {301, 302, 303, 307, 308}
+
+
+class DownloadError(Exception):
+    def __init__(self, url, status, reason):
+        super().__init__("%s: %d %s" % (url, status, reason))
+        self.url = url
+        self.status = status
+        self.reason = reason
+
+
+class Response:
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class Downloader:
+    """HTTP client that keeps one keep-alive connection per host and thread.
+
+    Safe to share between the threads of a ThreadPoolExecutor: every thread
+    gets its own connections, so requests to the same host reuse the TLS session
+    instead of opening a new socket for each file.
+
+    Proxies are taken from the environment (`http_proxy`, `https_proxy`, `no_proxy`) like urllib,
+    unless `proxies` ({scheme: proxy URL}) is given: HTTPS is tunneled with CONNECT, and HTTP requests
+    are sent to the proxy with the absolute URL.
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT, proxies=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.proxies = urllib.request.getproxies() if proxies is None else proxies
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all_connections = []
+
+    def _proxy(self, scheme, netloc):
+        # Returns the URL parts of the proxy of `netloc`, or None.
+        proxy = self.proxies.get(scheme)
+        if proxy is None or urllib.request.proxy_bypass(parse.urlsplit("//" + netloc).hostname or netloc):
+            return None
+        return parse.urlsplit(proxy if "://" in proxy else "http://" + proxy)
+
+    def _new_connection(self, scheme, netloc):
+        # Returns (connection, headers of every request, whether the absolute URL is requested).
+        proxy = self._proxy(scheme, netloc)
+        if proxy is None:
+            if scheme == "https":
+                return http.client.HTTPSConnection(netloc, timeout=self.timeout), {}, False
+            return http.client.HTTPConnection(netloc, timeout=self.timeout), {}, False
+
+        proxy_headers = {}
+        if proxy.username is not None:
+            credentials = "%s:%s" % (parse.unquote(proxy.username), parse.unquote(proxy.password or ""))
+            proxy_headers["Proxy-Authorization"] = "Basic " + base64.b64encode(credentials.encode()).decode("ascii")
+        proxy_netloc = "%s:%d" % (proxy.hostname, proxy.port or 80)
+        if scheme == "https":
+            connection = http.client.HTTPSConnection(proxy_netloc, timeout=self.timeout)
+            connection.set_tunnel(netloc, headers=proxy_headers)
+            return connection, {}, False
+        return http.client.HTTPConnection(proxy_netloc, timeout=self.timeout), proxy_headers, True
+
+    def _connection(self, scheme, netloc):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = {}
+            self._local.connections = connections
+
+        key = (scheme, netloc)
+        connection = connections.get(key)
+        if connection is None:
+            connection = self._new_connection(scheme, netloc)
+            connections[key] = connection
+            with self._lock:
+                self._all_connections.append(connection[0])
+        return connection
+
+    def _drop_connection(self, scheme, netloc):
+        connection = self._local.connections.pop((scheme, netloc), None)
+        if connection is not None:
+            connection[0].close()
+
+    @staticmethod
+    def _read_body(res, fp):
+        if fp is None:
+            body = res.read()
+            return body, len(body)
+
+        fp.seek(0)
+        fp.truncate()
+        length = 0
+        while True:
+            chunk = res.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            fp.write(chunk)
+            length += len(chunk)
+        return None, length
+
+    def _request(self, url, headers, fp):
+        for _ in range(MAX_REDIRECTS + 1):
+            url_parts = parse.urlsplit(url)
+            path = url_parts.path or "/"
+            if url_parts.query:
+                path += "?" + url_parts.query
+
+            connection, connection_headers, absolute = self._connection(url_parts.scheme, url_parts.netloc)
+            if absolute:
+                path = parse.urlunsplit(url_parts._replace(fragment=""))
+            try:
+                connection.request("GET", path, headers={"User-Agent": USER_AGENT, **headers, **connection_headers})
+                res = connection.getresponse()
+                body, length = self._read_body(res, fp)
+            except (OSError, http.client.HTTPException):
+                # The server may have closed an idle keep-alive connection.
+                self._drop_connection(url_parts.scheme, url_parts.netloc)
+                raise
+
+            if res.status in REDIRECT_STATUS and res.getheader("Location"):
+                url = parse.urljoin(url, res.getheader("Location"))
+                continue
+
+            if res.status not in (200, 304):
+                raise DownloadError(url, res.status, res.reason)
+
+            content_length = res.getheader("Content-Length")
+            if res.status == 200 and content_length is not None and int(content_length) != length:
+                # Retried like any other broken transfer.
+                raise http.client.IncompleteRead(body or b"", int(content_length) - length)
+
+            return Response(res.status, res.headers, body)
+
+        raise DownloadError(url, 310, "Too many redirects")
+
+    def fetch(self, url, headers=None, fp=None):
+        """Returns the Response of GET `url`. The status is 200, or 304 for a conditional request.
+
+        If `fp` is given, the body is written to it chunk by chunk instead of being kept in memory,
+        and Response.body is None.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._request(url, headers or {}, fp)
+            except DownloadError as e:
+                if e.status not in RETRYABLE_STATUS or attempt >= self.retries:
+                    raise
+            except (OSError, http.client.HTTPException):
+                if attempt >= self.retries:
+                    raise
+
+            wait = self.backoff * (2 ** attempt)
+            attempt += 1
+            print("Retry %s (%d/%d) in %.1f sec." % (url, attempt, self.retries, wait))
+            time.sleep(wait)
+
+    def get(self, url):
+        return self.fetch(url).body
+
+    def close(self):
+        with self._lock:
+            for connection in self._all_connections:
+                connection.close()
+            self._all_connections = []
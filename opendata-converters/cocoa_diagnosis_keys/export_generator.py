@@ -0,0 +1,324 @@
+import json
+import os
+import zipfile
+
+import numpy as np
+
+import protobuf.temporary_exposure_key_export_pb2 as tek_export
+from export_reader import TemporaryExposureKey, BIN_HEADER_BYTES, FILENAME_EXPORT_BIN, DEFAULT_ROLLING_PERIOD, \
+    FIELD_KEYS, FIELD_REVISED_KEYS, FIELD_KEY_DATA, FIELD_TRANSMISSION_RISK_LEVEL, \
+    FIELD_ROLLING_START_INTERVAL_NUMBER, FIELD_ROLLING_PERIOD, FIELD_REPORT_TYPE, \
+    FIELD_DAYS_SINCE_ONSET_OF_SYMPTOMS, WIRE_TYPE_VARINT, WIRE_TYPE_LENGTH_DELIMITED
+from key_table import KEY_DATA_LENGTH
+from statistics import EN_INTERVAL_WINDOW
+
+FILENAME_EXPORT_SIG = "export.sig"
+FILENAME_LIST = "list.json"
+FILENAME_GENERATOR = "generator.json"
+
+DEFAULT_KEYS_PER_FILE = 100000
+DEFAULT_START_CREATED = 1650000000000
+REGION = "440"
+
+INTERVALS_PER_DAY = 24 * 60 * 60 // EN_INTERVAL_WINDOW
+
+
+class ExportProfile:
+    """Distributions of the generated keys.
+
+    v1 keys have only transmission_risk_level. v2 keys also have report_type and days_since_onset_of_symptoms
+    and, as the apps do, a constant transmission_risk_level. Weights are relative.
+    """
+    __slots__ = (
+        "v2_ratio",
+        "transmission_risk_level_weights",
+        "v2_transmission_risk_level",
+        "report_type_weights",
+        "days_since_onset_of_symptoms_range",
+        "days",
+        "partial_rolling_period_ratio",
+        "invalid_key_data_ratio",
+        "republished_ratio",
+        "revised_key_ratio",
+        "batches_per_created",
+        "created_interval",
+    )
+
+    def __init__(self, v2_ratio=0.9, transmission_risk_level_weights=(0, 5, 10, 20, 30, 20, 10, 5),
+                 v2_transmission_risk_level=4, report_type_weights=(0, 80, 15, 5, 0, 0),
+                 days_since_onset_of_symptoms_range=(-14, 14), days=14, partial_rolling_period_ratio=0.05,
+                 invalid_key_data_ratio=0.001, republished_ratio=0.01, revised_key_ratio=0.0,
+                 batches_per_created=4, created_interval=6 * 60 * 60 * 1000):
+        self.v2_ratio = v2_ratio
+        self.transmission_risk_level_weights = transmission_risk_level_weights
+        self.v2_transmission_risk_level = v2_transmission_risk_level
+        self.report_type_weights = report_type_weights
+        self.days_since_onset_of_symptoms_range = days_since_onset_of_symptoms_range
+        self.days = days
+        self.partial_rolling_period_ratio = partial_rolling_period_ratio
+        self.invalid_key_data_ratio = invalid_key_data_ratio
+        self.republished_ratio = republished_ratio
+        self.revised_key_ratio = revised_key_ratio
+        self.batches_per_created = batches_per_created
+        self.created_interval = created_interval
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in ExportProfile.__slots__}
+
+
+def _tag(field_number, wire_type):
+    return _varint((field_number << 3) | wire_type)
+
+
+def _varint(value):
+    # int32 fields are encoded as 64-bit two's complement.
+    value &= 0xFFFFFFFFFFFFFFFF
+    data = bytearray()
+    while value >= 0x80:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 31)
+
+
+class _VarintField:
+    # Encodes a varint field, caching the bytes of every value since the values repeat a lot.
+    __slots__ = ("tag", "cache", "encode")
+
+    def __init__(self, field_number, encode=_varint):
+        self.tag = _tag(field_number, WIRE_TYPE_VARINT)
+        self.cache = {}
+        self.encode = encode
+
+    def __call__(self, value):
+        data = self.cache.get(value)
+        if data is None:
+            data = self.tag + self.encode(value)
+            self.cache[value] = data
+        return data
+
+
+class _KeyEncoder:
+    def __init__(self):
+        self.transmission_risk_level = _VarintField(FIELD_TRANSMISSION_RISK_LEVEL)
+        self.rolling_start_interval_number = _VarintField(FIELD_ROLLING_START_INTERVAL_NUMBER)
+        self.rolling_period = _VarintField(FIELD_ROLLING_PERIOD)
+        self.report_type = _VarintField(FIELD_REPORT_TYPE)
+        self.days_since_onset_of_symptoms = _VarintField(
+            FIELD_DAYS_SINCE_ONSET_OF_SYMPTOMS, lambda value: _varint(_zigzag(value)))
+        self.key_data_tag = _tag(FIELD_KEY_DATA, WIRE_TYPE_LENGTH_DELIMITED)
+
+    def encode(self, field_tag, keys):
+        """Encodes `keys` (TemporaryExposureKey) as the repeated field with `field_tag`."""
+        chunks = []
+        for key in keys:
+            message = b"".join((
+                self.key_data_tag, _varint(len(key.key_data)), key.key_data,
+                self.transmission_risk_level(key.transmission_risk_level),
+                self.rolling_start_interval_number(key.rolling_start_interval_number),
+                self.rolling_period(key.rolling_period),
+                b"" if key.report_type is None else self.report_type(key.report_type),
+                b"" if key.days_since_onset_of_symptoms is None else
+                self.days_since_onset_of_symptoms(key.days_since_onset_of_symptoms),
+            ))
+            chunks.append(field_tag)
+            chunks.append(_varint(len(message)))
+            chunks.append(message)
+        return b"".join(chunks)
+
+
+def encode_export(start_timestamp, end_timestamp, batch_num, batch_size, keys, revised_keys=()):
+    """Returns the serialized TemporaryExposureKeyExport, the same bytes as the generated classes write.
+
+    The scalar fields and the signature info are serialized by the generated classes and the keys, which
+    are most of the payload, by hand: fields are written in the order of their numbers in both cases.
+    """
+    export = tek_export.TemporaryExposureKeyExport()
+    export.start_timestamp = start_timestamp
+    export.end_timestamp = end_timestamp
+    export.region = REGION
+    export.batch_num = batch_num
+    export.batch_size = batch_size
+    signature_info = export.signature_infos.add()
+    signature_info.verification_key_version = "v1"
+    signature_info.verification_key_id = REGION
+    signature_info.signature_algorithm = "1.2.840.10045.4.3.2"
+
+    encoder = _KeyEncoder()
+    return b"".join((
+        export.SerializeToString(),
+        encoder.encode(_tag(FIELD_KEYS, WIRE_TYPE_LENGTH_DELIMITED), keys),
+        encoder.encode(_tag(FIELD_REVISED_KEYS, WIRE_TYPE_LENGTH_DELIMITED), revised_keys),
+    ))
+
+
+def _encode_signature(batch_num, batch_size):
+    signature_list = tek_export.TEKSignatureList()
+    signature = signature_list.signatures.add()
+    signature.signature_info.verification_key_version = "v1"
+    signature.signature_info.verification_key_id = REGION
+    signature.signature_info.signature_algorithm = "1.2.840.10045.4.3.2"
+    signature.batch_num = batch_num
+    signature.batch_size = batch_size
+    # Not a valid signature: nothing in this repository verifies it.
+    signature.signature = bytes(71)
+    return signature_list.SerializeToString()
+
+
+def write_export_zip(file_path, payload, signature):
+    with zipfile.ZipFile(file_path, mode='w', compression=zipfile.ZIP_DEFLATED) as zip:
+        zip.writestr(FILENAME_EXPORT_BIN, BIN_HEADER_BYTES + payload)
+        zip.writestr(FILENAME_EXPORT_SIG, signature)
+
+
+def _choice(rng, weights, count):
+    weights = np.asarray(weights, dtype=np.float64)
+    return rng.choice(len(weights), size=count, p=weights / weights.sum())
+
+
+def generate_keys(rng, count, created, profile, republished_pool=None):
+    """Returns `count` random TemporaryExposureKeys of a batch created at `created` (UNIX time in ms).
+
+    With `republished_pool`, about `profile.republished_ratio` of the keys are taken from it.
+    """
+    is_v2 = rng.random(count) < profile.v2_ratio
+    transmission_risk_level = _choice(rng, profile.transmission_risk_level_weights, count)
+    report_type = _choice(rng, profile.report_type_weights, count)
+    low, high = profile.days_since_onset_of_symptoms_range
+    days_since_onset_of_symptoms = np.clip(np.rint(rng.normal(2, 4, count)), low, high).astype(np.int64)
+
+    day = created // 1000 // (EN_INTERVAL_WINDOW * INTERVALS_PER_DAY)
+    rolling_start_interval_number = (day - rng.integers(1, profile.days + 1, count)) * INTERVALS_PER_DAY
+    is_partial = rng.random(count) < profile.partial_rolling_period_ratio
+    rolling_period = np.where(is_partial, rng.integers(1, DEFAULT_ROLLING_PERIOD, count), DEFAULT_ROLLING_PERIOD)
+
+    key_data = rng.bytes(count * KEY_DATA_LENGTH)
+    is_invalid = rng.random(count) < profile.invalid_key_data_ratio
+    invalid_lengths = rng.choice([0, KEY_DATA_LENGTH - 1, KEY_DATA_LENGTH + 1], size=count)
+
+    is_republished = np.zeros(count, dtype=bool)
+    if republished_pool:
+        is_republished = rng.random(count) < profile.republished_ratio
+    republished_indices = rng.integers(0, max(len(republished_pool or ()), 1), count)
+
+    keys = []
+    columns = zip(is_v2.tolist(), transmission_risk_level.tolist(), report_type.tolist(),
+                  days_since_onset_of_symptoms.tolist(), rolling_start_interval_number.tolist(),
+                  rolling_period.tolist(), is_invalid.tolist(), invalid_lengths.tolist(), is_republished.tolist(),
+                  republished_indices.tolist())
+    for index, (v2, level, report, days_since_onset, start, period, invalid, invalid_length, republished,
+                republished_index) in enumerate(columns):
+        if republished:
+            keys.append(republished_pool[republished_index])
+            continue
+
+        key = TemporaryExposureKey()
+        key.key_data = key_data[index * KEY_DATA_LENGTH:(index + 1) * KEY_DATA_LENGTH]
+        if invalid:
+            key.key_data = (key.key_data * 2)[:invalid_length]
+        key.rolling_start_interval_number = start
+        key.rolling_period = period
+        if v2:
+            key.transmission_risk_level = profile.v2_transmission_risk_level
+            key.report_type = report
+            key.days_since_onset_of_symptoms = days_since_onset
+        else:
+            key.transmission_risk_level = level
+        keys.append(key)
+    return keys
+
+
+def _revoked(key):
+    revised_key = TemporaryExposureKey()
+    for name in TemporaryExposureKey.__slots__:
+        setattr(revised_key, name, getattr(key, name))
+    revised_key.report_type = tek_export.TemporaryExposureKey.REVOKED
+    return revised_key
+
+
+def generate_exports(output_path, key_count, keys_per_file=DEFAULT_KEYS_PER_FILE, profile=None, seed=0,
+                     start_created=DEFAULT_START_CREATED):
+    """Writes export ZIPs with `key_count` keys in total to `output_path`.
+
+    Returns the rows of the list as dicts of `file_name` and `created`; see write_list_json().
+    Every `profile.batches_per_created` files share a `created`. The same seed writes the same files.
+    """
+    if profile is None:
+        profile = ExportProfile()
+    os.makedirs(output_path, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    file_count = max((key_count + keys_per_file - 1) // keys_per_file, 1)
+    batch_size = profile.batches_per_created
+    rows = []
+    republished_pool = []
+    for file_index in range(file_count):
+        count = min(keys_per_file, key_count - file_index * keys_per_file)
+        created = start_created + (file_index // batch_size) * profile.created_interval
+        batch_num = file_index % batch_size + 1
+
+        keys = generate_keys(rng, count, created, profile, republished_pool)
+        revised_count = int(rng.binomial(count, profile.revised_key_ratio)) if count > 0 else 0
+        revised_keys = [_revoked(keys[index]) for index in rng.integers(0, count, revised_count)]
+
+        start_timestamp = created // 1000 - profile.created_interval // 1000
+        payload = encode_export(start_timestamp, created // 1000, batch_num, batch_size, keys, revised_keys)
+        file_name = "%d-%08d.zip" % (created, file_index)
+        write_export_zip(os.path.join(output_path, file_name), payload,
+                         _encode_signature(batch_num, batch_size))
+        rows.append({"file_name": file_name, "created": created})
+
+        # Keep a bounded sample of earlier keys to republish.
+        republished_pool = (republished_pool + keys[:1000])[-10000:]
+
+    with open(os.path.join(output_path, FILENAME_GENERATOR), mode='w') as fp:
+        json.dump({
+            "key_count": key_count,
+            "keys_per_file": keys_per_file,
+            "seed": seed,
+            "start_created": start_created,
+            "profile": profile.to_dict(),
+            "rows": rows,
+        }, fp)
+
+    return rows
+
+
+def load_generated_rows(output_path, key_count, keys_per_file=DEFAULT_KEYS_PER_FILE, profile=None, seed=0,
+                        start_created=DEFAULT_START_CREATED):
+    """Returns the rows of files generate_exports() already wrote with the same arguments, or None."""
+    if profile is None:
+        profile = ExportProfile()
+
+    file_path = os.path.join(output_path, FILENAME_GENERATOR)
+    if not os.path.exists(file_path):
+        return None
+
+    with open(file_path) as fp:
+        json_obj = json.load(fp)
+
+    # Through JSON, so that tuples and lists compare equal.
+    expected = json.loads(json.dumps({
+        "key_count": key_count,
+        "keys_per_file": keys_per_file,
+        "seed": seed,
+        "start_created": start_created,
+        "profile": profile.to_dict(),
+    }))
+    rows = json_obj.pop("rows")
+    if json_obj != expected:
+        return None
+    if not all(os.path.exists(os.path.join(output_path, row["file_name"])) for row in rows):
+        return None
+    return rows
+
+
+def write_list_json(file_path, rows, base_url):
+    """Writes the diagnosis keys list of `rows` whose files are served under `base_url`."""
+    with open(file_path, mode='w') as fp:
+        json.dump([{"region": int(REGION), "url": base_url + row["file_name"], "created": row["created"]}
+                   for row in rows], fp)
@@ -0,0 +1,240 @@
+import zipfile
+
+FILENAME_EXPORT_BIN = "export.bin"
+BIN_HEADER = "EK Export v1    "
+BIN_HEADER_BYTES = BIN_HEADER.encode(encoding='utf-8')
+BIN_HEADER_BYTES_LENGTH = len(BIN_HEADER_BYTES)
+
+
+def read_export_payload(zip_file):
+    """Returns the TemporaryExposureKeyExport payload of an export ZIP as a memoryview.
+
+    `zip_file` is a path or a binary file object. The member is read into memory
+    and the `EK Export v1` header is validated and stripped without copying, so no
+    temporary file is involved and concurrent callers can not collide.
+    """
+    with zipfile.ZipFile(zip_file, "r") as zip:
+        data = zip.read(FILENAME_EXPORT_BIN)
+
+    if data[:BIN_HEADER_BYTES_LENGTH] != BIN_HEADER_BYTES:
+        raise ValueError("%s doesn't start with header '%s'." % (FILENAME_EXPORT_BIN, BIN_HEADER))
+
+    return memoryview(data)[BIN_HEADER_BYTES_LENGTH:]
+
+
+# Protocol Buffers wire types
+# https://developers.google.com/protocol-buffers/docs/encoding#structure
+WIRE_TYPE_VARINT = 0
+WIRE_TYPE_FIXED64 = 1
+WIRE_TYPE_LENGTH_DELIMITED = 2
+WIRE_TYPE_FIXED32 = 5
+
+# Field numbers of TemporaryExposureKeyExport (see protobuf/temporary_exposure_key_export.proto)
+FIELD_START_TIMESTAMP = 1
+FIELD_END_TIMESTAMP = 2
+FIELD_REGION = 3
+FIELD_BATCH_NUM = 4
+FIELD_BATCH_SIZE = 5
+FIELD_KEYS = 7
+FIELD_REVISED_KEYS = 8
+
+# Field numbers of TemporaryExposureKey
+FIELD_KEY_DATA = 1
+FIELD_TRANSMISSION_RISK_LEVEL = 2
+FIELD_ROLLING_START_INTERVAL_NUMBER = 3
+FIELD_ROLLING_PERIOD = 4
+FIELD_REPORT_TYPE = 5
+FIELD_DAYS_SINCE_ONSET_OF_SYMPTOMS = 6
+
+DEFAULT_ROLLING_PERIOD = 144
+
+# Values of TemporaryExposureKey.ReportType.
+# report_type is a proto2 (closed) enum, so an unknown value is treated as not set, as the generated classes do.
+REPORT_TYPE_VALUES = frozenset(range(0, 5 + 1))
+
+
+class TemporaryExposureKey:
+    """Plain record of the TemporaryExposureKey fields.
+
+    Optional fields without a default (`report_type`, `days_since_onset_of_symptoms`) are None when absent.
+    """
+    __slots__ = (
+        "key_data",
+        "transmission_risk_level",
+        "rolling_start_interval_number",
+        "rolling_period",
+        "report_type",
+        "days_since_onset_of_symptoms",
+    )
+
+    def __init__(self):
+        self.key_data = b""
+        self.transmission_risk_level = 0
+        self.rolling_start_interval_number = 0
+        self.rolling_period = DEFAULT_ROLLING_PERIOD
+        self.report_type = None
+        self.days_since_onset_of_symptoms = None
+
+
+class ExportHeader:
+    """Scalar fields of TemporaryExposureKeyExport and the number of (revised) keys it contains."""
+    __slots__ = (
+        "start_timestamp",
+        "end_timestamp",
+        "region",
+        "batch_num",
+        "batch_size",
+        "key_count",
+        "revised_key_count",
+    )
+
+    def __init__(self):
+        self.start_timestamp = 0
+        self.end_timestamp = 0
+        self.region = ""
+        self.batch_num = 0
+        self.batch_size = 0
+        self.key_count = 0
+        self.revised_key_count = 0
+
+
+def _read_varint(buffer, pos):
+    # Indexing past the end is the only way to run out of bytes, so the bounds are checked only on failure.
+    try:
+        b = buffer[pos]
+        if b < 0x80:
+            return b, pos + 1
+
+        result = b & 0x7F
+        shift = 7
+        while True:
+            pos += 1
+            b = buffer[pos]
+            result |= (b & 0x7F) << shift
+            if b < 0x80:
+                return result, pos + 1
+            shift += 7
+            if shift >= 64:
+                raise ValueError("Too many bytes when decoding varint.")
+    except IndexError:
+        raise ValueError("Truncated varint.") from None
+
+
+def _to_int32(value):
+    value &= 0xFFFFFFFF
+    if value >= 0x80000000:
+        value -= 0x100000000
+    return value
+
+
+def _to_sint32(value):
+    # ZigZag decoding
+    value &= 0xFFFFFFFF
+    return (value >> 1) ^ -(value & 1)
+
+
+def _skip_field(buffer, pos, wire_type):
+    if wire_type == WIRE_TYPE_VARINT:
+        _, pos = _read_varint(buffer, pos)
+    elif wire_type == WIRE_TYPE_FIXED64:
+        pos += 8
+    elif wire_type == WIRE_TYPE_LENGTH_DELIMITED:
+        length, pos = _read_varint(buffer, pos)
+        pos += length
+    elif wire_type == WIRE_TYPE_FIXED32:
+        pos += 4
+    else:
+        raise ValueError("Unsupported wire type %d." % wire_type)
+    return pos
+
+
+def _iter_fields(buffer, pos, end):
+    """Yields (field_number, wire_type, value_pos) and skips over every value."""
+    while pos < end:
+        tag, pos = _read_varint(buffer, pos)
+        field_number = tag >> 3
+        wire_type = tag & 0x07
+        next_pos = _skip_field(buffer, pos, wire_type)
+        if next_pos > end:
+            raise ValueError("Truncated message.")
+        yield field_number, wire_type, pos
+        pos = next_pos
+
+
+def _decode_key(buffer, pos, end):
+    key = TemporaryExposureKey()
+
+    while pos < end:
+        tag, pos = _read_varint(buffer, pos)
+        field_number = tag >> 3
+        wire_type = tag & 0x07
+
+        if wire_type == WIRE_TYPE_VARINT:
+            value, pos = _read_varint(buffer, pos)
+            if field_number == FIELD_TRANSMISSION_RISK_LEVEL:
+                key.transmission_risk_level = _to_int32(value)
+            elif field_number == FIELD_ROLLING_START_INTERVAL_NUMBER:
+                key.rolling_start_interval_number = _to_int32(value)
+            elif field_number == FIELD_ROLLING_PERIOD:
+                key.rolling_period = _to_int32(value)
+            elif field_number == FIELD_REPORT_TYPE:
+                value = _to_int32(value)
+                if value in REPORT_TYPE_VALUES:
+                    key.report_type = value
+            elif field_number == FIELD_DAYS_SINCE_ONSET_OF_SYMPTOMS:
+                key.days_since_onset_of_symptoms = _to_sint32(value)
+        elif wire_type == WIRE_TYPE_LENGTH_DELIMITED and field_number == FIELD_KEY_DATA:
+            length, pos = _read_varint(buffer, pos)
+            key.key_data = bytes(buffer[pos:pos + length])
+            pos += length
+        else:
+            pos = _skip_field(buffer, pos, wire_type)
+
+    if pos != end:
+        raise ValueError("Truncated TemporaryExposureKey.")
+
+    return key
+
+
+def _iter_key_messages(payload, field_number):
+    for number, wire_type, pos in _iter_fields(payload, 0, len(payload)):
+        if number != field_number or wire_type != WIRE_TYPE_LENGTH_DELIMITED:
+            continue
+        length, pos = _read_varint(payload, pos)
+        yield _decode_key(payload, pos, pos + length)
+
+
+def iter_keys(payload):
+    """Yields the TemporaryExposureKeys in `keys` of an export payload one at a time."""
+    return _iter_key_messages(payload, FIELD_KEYS)
+
+
+def iter_revised_keys(payload):
+    """Yields the TemporaryExposureKeys in `revised_keys` of an export payload one at a time."""
+    return _iter_key_messages(payload, FIELD_REVISED_KEYS)
+
+
+def read_export_header(payload):
+    """Decodes the scalar fields of an export payload without decoding any key."""
+    header = ExportHeader()
+
+    for field_number, wire_type, pos in _iter_fields(payload, 0, len(payload)):
+        if field_number in (FIELD_START_TIMESTAMP, FIELD_END_TIMESTAMP) and wire_type == WIRE_TYPE_FIXED64:
+            value = int.from_bytes(payload[pos:pos + 8], byteorder='little')
+            if field_number == FIELD_START_TIMESTAMP:
+                header.start_timestamp = value
+            else:
+                header.end_timestamp = value
+        elif field_number == FIELD_REGION and wire_type == WIRE_TYPE_LENGTH_DELIMITED:
+            length, pos = _read_varint(payload, pos)
+            header.region = bytes(payload[pos:pos + length]).decode('utf-8')
+        elif field_number == FIELD_BATCH_NUM and wire_type == WIRE_TYPE_VARINT:
+            header.batch_num = _to_int32(_read_varint(payload, pos)[0])
+        elif field_number == FIELD_BATCH_SIZE and wire_type == WIRE_TYPE_VARINT:
+            header.batch_size = _to_int32(_read_varint(payload, pos)[0])
+        elif field_number == FIELD_KEYS:
+            header.key_count += 1
+        elif field_number == FIELD_REVISED_KEYS:
+            header.revised_key_count += 1
+
+    return header
@@ -0,0 +1,192 @@
+import hmac
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from key_index import key_prefix, search_keys
+from key_table import KEY_DATA_LENGTH, KEY_DATA_DTYPE
+
+# https://blog.google/documents/69/Exposure_Notification_-_Cryptography_Specification_v1.2.1.pdf/
+EK_ROLLING_PERIOD = 144
+RPIK_INFO = b"EN-RPIK"
+RPI_PADDED_DATA_HEADER = b"EN-RPI" + bytes(6)
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def _import_cryptography():
+    try:
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    except ImportError as e:
+        raise ImportError("Exposure matching requires cryptography. Run `pip install cryptography`.") from e
+    return Cipher, algorithms, modes
+
+
+def derive_rolling_proximity_identifier_key(temporary_exposure_key):
+    """RPIK_i = HKDF(tek_i, NULL, UTF8("EN-RPIK"), 16) with SHA-256."""
+    # HKDF-Extract with an empty salt, then a single HKDF-Expand block.
+    pseudo_random_key = hmac.digest(bytes(32), temporary_exposure_key, 'sha256')
+    return hmac.digest(pseudo_random_key, RPIK_INFO + b"\x01", 'sha256')[:16]
+
+
+def _padded_data(rolling_start_interval_number):
+    # PaddedData_j = UTF8("EN-RPI") || 0x000000000000 || ENIN_j for the 144 intervals of a key.
+    return b"".join(RPI_PADDED_DATA_HEADER + struct.pack("<I", (rolling_start_interval_number + j) & 0xFFFFFFFF)
+                    for j in range(EK_ROLLING_PERIOD))
+
+
+def derive_rolling_proximity_identifiers(key_data, rolling_start_interval_number):
+    """Returns the 144 RPIs of every key as (len(key_data) * 144) S16 values, key by key.
+
+    RPI_i,j = AES-128(RPIK_i, PaddedData_j). The 144 PaddedData of a key are encrypted in one ECB call.
+    """
+    Cipher, algorithms, modes = _import_cryptography()
+
+    rpis = bytearray(len(key_data) * EK_ROLLING_PERIOD * KEY_DATA_LENGTH)
+    padded_data_cache = {}
+    offset = 0
+    for temporary_exposure_key, start in zip(key_data.tolist(), rolling_start_interval_number.tolist()):
+        padded_data = padded_data_cache.get(start)
+        if padded_data is None:
+            padded_data = _padded_data(start)
+            padded_data_cache[start] = padded_data
+
+        # S16 strips trailing zero bytes.
+        temporary_exposure_key = temporary_exposure_key.ljust(KEY_DATA_LENGTH, b"\x00")
+        rpik = derive_rolling_proximity_identifier_key(temporary_exposure_key)
+        encryptor = Cipher(algorithms.AES(rpik), modes.ECB()).encryptor()
+        rpis[offset:offset + len(padded_data)] = encryptor.update(padded_data)
+        offset += len(padded_data)
+
+    return np.frombuffer(bytes(rpis), dtype=KEY_DATA_DTYPE)
+
+
+class ObservedIndex:
+    """Sorted distinct observed RPIs with the number of times each was observed."""
+    __slots__ = ("rpis", "prefix", "counts")
+
+    def __init__(self, observed_rpis):
+        self.rpis, self.counts = np.unique(np.asarray(observed_rpis, dtype=KEY_DATA_DTYPE), return_counts=True)
+        self.prefix = key_prefix(self.rpis)
+
+    def __len__(self):
+        return len(self.rpis)
+
+    def lookup(self, rpis):
+        """Returns the observation count of every RPI (0 if it was not observed)."""
+        positions, found = search_keys(self.rpis, self.prefix, rpis, key_prefix(rpis))
+        counts = np.zeros(len(rpis), dtype=np.int64)
+        counts[found] = self.counts[positions[found]]
+        return counts
+
+
+class Matches:
+    """RPIs of diagnosis keys that were observed: the index of the key, the interval number and the count."""
+    __slots__ = ("key_indices", "interval_numbers", "observed_counts")
+
+    def __init__(self, key_indices, interval_numbers, observed_counts):
+        self.key_indices = key_indices
+        self.interval_numbers = interval_numbers
+        self.observed_counts = observed_counts
+
+    def __len__(self):
+        return len(self.key_indices)
+
+    @staticmethod
+    def concatenate(matches_list):
+        return Matches(
+            np.concatenate([np.zeros(0, dtype=np.int64)] + [matches.key_indices for matches in matches_list]),
+            np.concatenate([np.zeros(0, dtype=np.int64)] + [matches.interval_numbers for matches in matches_list]),
+            np.concatenate([np.zeros(0, dtype=np.int64)] + [matches.observed_counts for matches in matches_list]),
+        )
+
+
+def _match_chunk(observed_index, key_data, rolling_start_interval_number, rolling_period):
+    # Key indices of the matches are relative to the chunk.
+    rpis = derive_rolling_proximity_identifiers(key_data, rolling_start_interval_number)
+    observed_counts = observed_index.lookup(rpis)
+
+    # Only the intervals within rolling_period of each key are valid.
+    intervals = np.tile(np.arange(EK_ROLLING_PERIOD), len(key_data))
+    rolling_periods = np.repeat(np.minimum(rolling_period, EK_ROLLING_PERIOD), EK_ROLLING_PERIOD)
+    matched = np.flatnonzero((observed_counts > 0) & (intervals < rolling_periods))
+
+    key_indices = matched // EK_ROLLING_PERIOD
+    return Matches(
+        key_indices,
+        rolling_start_interval_number[key_indices].astype(np.int64) + intervals[matched],
+        observed_counts[matched],
+    )
+
+
+_worker_observed_index = None
+
+
+def _init_worker(observed_index):
+    global _worker_observed_index
+    _worker_observed_index = observed_index
+
+
+def _match_chunk_in_worker(key_data, rolling_start_interval_number, rolling_period):
+    return _match_chunk(_worker_observed_index, key_data, rolling_start_interval_number, rolling_period)
+
+
+def _column(table, name):
+    if isinstance(table, np.ndarray):
+        return table[name]
+    return getattr(table, name)
+
+
+def _chunks(table, chunk_size):
+    # Yields (key indices, key_data, rolling_start_interval_number, rolling_period) of the valid keys of every
+    # `chunk_size` keys, copying only that chunk of the columns.
+    key_count = len(_column(table, "key_data_length"))
+    for start in range(0, key_count, chunk_size):
+        valid = _column(table, "key_data_length")[start:start + chunk_size] == KEY_DATA_LENGTH
+        indices = start + np.flatnonzero(valid)
+        if len(indices) == 0:
+            continue
+        yield (indices,) + tuple(np.asarray(_column(table, name)[start:start + chunk_size][valid])
+                                 for name in ("key_data", "rolling_start_interval_number", "rolling_period"))
+
+
+def _result(item):
+    indices, future = item
+    return indices, future.result()
+
+
+def match_keys(table, observed_rpis, workers=0, chunk_size=DEFAULT_CHUNK_SIZE, depth=None):
+    """Derives the RPIs of every key of `table` (a KeyTable or archive records) and matches them with
+    `observed_rpis`, a sequence of 16-byte RPIs. Returns Matches indexing the keys of `table`.
+
+    Keys are processed in chunks of `chunk_size`, in `workers` processes (0: in this process). Chunks are
+    copied from `table` only when submitted, and at most `depth` (default: twice the workers) are in flight,
+    so memory depends on the chunk size and not on the number of keys. Keys whose key_data is not 16 bytes
+    are skipped.
+    """
+    observed_index = ObservedIndex(observed_rpis)
+    matches_list = []
+
+    def add(indices, matches):
+        matches.key_indices = indices[matches.key_indices]
+        matches_list.append(matches)
+
+    if workers <= 0:
+        for indices, *columns in _chunks(table, chunk_size):
+            add(indices, _match_chunk(observed_index, *columns))
+        return Matches.concatenate(matches_list)
+
+    depth = max(depth or 2 * workers, 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(observed_index,)) as executor:
+        window = deque()
+        for indices, *columns in _chunks(table, chunk_size):
+            if len(window) >= depth:
+                add(*_result(window.popleft()))
+            window.append((indices, executor.submit(_match_chunk_in_worker, *columns)))
+        while window:
+            add(*_result(window.popleft()))
+
+    return Matches.concatenate(matches_list)
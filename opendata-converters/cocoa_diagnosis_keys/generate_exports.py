@@ -0,0 +1,36 @@
+import os
+
+from absl import flags, app
+
+from export_generator import ExportProfile, generate_exports, write_list_json, DEFAULT_KEYS_PER_FILE, \
+    FILENAME_LIST
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("output_path", None, "Directory the export ZIPs and list.json are written to")
+flags.DEFINE_string("base_url", "http://127.0.0.1:8000/", "URL the directory is served at, used in list.json")
+flags.DEFINE_integer("key_count", 100000, "Total number of keys")
+flags.DEFINE_integer("keys_per_file", DEFAULT_KEYS_PER_FILE, "Number of keys of every ZIP")
+flags.DEFINE_float("v2_ratio", ExportProfile().v2_ratio, "Ratio of v2 keys (with report_type)")
+flags.DEFINE_float("republished_ratio", ExportProfile().republished_ratio,
+                   "Ratio of keys republished from an earlier file")
+flags.DEFINE_float("revised_key_ratio", ExportProfile().revised_key_ratio, "Ratio of keys also in revised_keys")
+flags.DEFINE_float("invalid_key_data_ratio", ExportProfile().invalid_key_data_ratio,
+                   "Ratio of keys whose key_data is not 16 bytes")
+flags.DEFINE_integer("seed", 0, "Seed of the generated keys")
+
+
+def main(argv):
+    del argv  # Unused.
+
+    profile = ExportProfile(v2_ratio=FLAGS.v2_ratio, republished_ratio=FLAGS.republished_ratio,
+                            revised_key_ratio=FLAGS.revised_key_ratio,
+                            invalid_key_data_ratio=FLAGS.invalid_key_data_ratio)
+    rows = generate_exports(FLAGS.output_path, FLAGS.key_count, FLAGS.keys_per_file, profile, FLAGS.seed)
+    write_list_json(os.path.join(FLAGS.output_path, FILENAME_LIST), rows, FLAGS.base_url)
+
+    print("%d keys in %d files are written to %s." % (FLAGS.key_count, len(rows), FLAGS.output_path))
+
+
+if __name__ == '__main__':
+    flags.mark_flag_as_required("output_path")
+    app.run(main)
@@ -0,0 +1,66 @@
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_json_array(fp, chunk_size=CHUNK_SIZE):
+    """Yields the elements of the JSON array in the text file `fp` one at a time.
+
+    Only the element being decoded and a chunk of the file are kept in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def read():
+        nonlocal buffer, position, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def skip_whitespace():
+        # Returns the next character, or "" at the end of the file.
+        nonlocal position
+        while True:
+            position = _WHITESPACE.match(buffer, position).end()
+            if position < len(buffer):
+                return buffer[position]
+            if eof:
+                return ""
+            read()
+
+    if skip_whitespace() != "[":
+        raise json.JSONDecodeError("Expecting '['", buffer, position)
+    position += 1
+
+    if skip_whitespace() == "]":
+        return
+
+    while True:
+        skip_whitespace()
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            read()
+            continue
+
+        # An element is complete only when its delimiter has been read: "12" may be the head of "123".
+        delimiter = _WHITESPACE.match(buffer, end).end()
+        if delimiter == len(buffer) or buffer[delimiter] not in ",]":
+            if eof:
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, delimiter)
+            read()
+            continue
+
+        yield element
+        position = delimiter + 1
+        if buffer[delimiter] == "]":
+            return
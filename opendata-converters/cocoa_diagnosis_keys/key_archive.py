@@ -0,0 +1,206 @@
+import json
+import os
+
+import numpy as np
+
+from key_table import KeyTable, KEY_DATA_DTYPE
+
+# Version 2 added revised.bin. Archives of version 1 are read as batches without revised keys.
+ARCHIVE_VERSION = 2
+FILENAME_KEYS = "keys.bin"
+FILENAME_REVISED_KEYS = "revised.bin"
+FILENAME_BATCHES = "batches.json"
+
+# One fixed-width record per key. The columns are the ones of KeyTable, plus the batch the key came from.
+RECORD_DTYPE = np.dtype([
+    ("key_data", KEY_DATA_DTYPE),
+    ("key_data_length", "<i4"),
+    ("transmission_risk_level", "<i4"),
+    ("rolling_start_interval_number", "<i4"),
+    ("rolling_period", "<i4"),
+    ("report_type", "<i4"),
+    ("has_report_type", "?"),
+    ("days_since_onset_of_symptoms", "<i4"),
+    ("has_days_since_onset_of_symptoms", "?"),
+    ("batch_id", "<u4"),
+])
+
+TABLE_COLUMNS = [name for name in RECORD_DTYPE.names if name != "batch_id"]
+
+
+class BatchRecord:
+    batch_id = -1
+    url = None
+    created = -1
+    sha256 = None
+    offset = 0
+    key_count = 0
+    revised_offset = 0
+    revised_key_count = 0
+
+    def __init__(self, batch_id, url, created, sha256, offset, key_count, revised_offset=0, revised_key_count=0):
+        self.batch_id = batch_id
+        self.url = url
+        self.created = created
+        self.sha256 = sha256
+        self.offset = offset
+        self.key_count = key_count
+        self.revised_offset = revised_offset
+        self.revised_key_count = revised_key_count
+
+    def to_dict(self):
+        return {
+            "batch_id": self.batch_id,
+            "url": self.url,
+            "created": self.created,
+            "sha256": self.sha256,
+            "offset": self.offset,
+            "key_count": self.key_count,
+            "revised_offset": self.revised_offset,
+            "revised_key_count": self.revised_key_count,
+        }
+
+    @staticmethod
+    def from_dict(dict_obj):
+        return BatchRecord(dict_obj["batch_id"], dict_obj["url"], dict_obj["created"], dict_obj["sha256"],
+                           dict_obj["offset"], dict_obj["key_count"],
+                           dict_obj.get("revised_offset", 0), dict_obj.get("revised_key_count", 0))
+
+
+def table_from_records(records):
+    """Returns a KeyTable of archived records. key_data whose length is not 16 is zero padded or truncated."""
+    columns = {name: np.ascontiguousarray(records[name]) for name in TABLE_COLUMNS}
+    return KeyTable(irregular_key_data={}, **columns)
+
+
+class KeyArchive:
+    """Append-only archive of every parsed key, as fixed-width records in `keys.bin`.
+
+    `batches.json` lists the archived batches and the range of records of each one; records past
+    the end of the last batch are left over from an interrupted run and are overwritten. `keys()`
+    maps `keys.bin` as a NumPy structured array of RECORD_DTYPE, so reading the history does not
+    decode any protobuf. The `revised_keys` of every batch are kept the same way in `revised.bin`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.keys_path = os.path.join(path, FILENAME_KEYS)
+        self.revised_keys_path = os.path.join(path, FILENAME_REVISED_KEYS)
+        self.batches_path = os.path.join(path, FILENAME_BATCHES)
+        self.batches = []
+        self._batch_ids = {}
+
+    @staticmethod
+    def load(path):
+        key_archive = KeyArchive(path)
+        if not os.path.exists(key_archive.batches_path):
+            return key_archive
+
+        with open(key_archive.batches_path, mode='r') as fp:
+            json_obj = json.load(fp)
+
+        assert json_obj["version"] <= ARCHIVE_VERSION, \
+            "Archive %s has version %s." % (path, json_obj["version"])
+        assert json_obj["record_size"] == RECORD_DTYPE.itemsize, \
+            "Archive %s has record size %d." % (path, json_obj["record_size"])
+
+        for batch_obj in json_obj["batches"]:
+            key_archive._add_batch(BatchRecord.from_dict(batch_obj))
+        return key_archive
+
+    def _add_batch(self, batch_record):
+        self.batches.append(batch_record)
+        self._batch_ids[(batch_record.url, batch_record.sha256)] = batch_record.batch_id
+
+    def __len__(self):
+        if len(self.batches) == 0:
+            return 0
+        last_batch = self.batches[-1]
+        return last_batch.offset + last_batch.key_count
+
+    def revised_key_count(self):
+        if len(self.batches) == 0:
+            return 0
+        last_batch = self.batches[-1]
+        return last_batch.revised_offset + last_batch.revised_key_count
+
+    def get_batch_id(self, url, sha256):
+        return self._batch_ids.get((url, sha256))
+
+    def latest_batch_ids(self, urls):
+        """Returns the id of the last archived batch of every URL in `urls` that is archived."""
+        batch_ids = {}
+        for batch_record in self.batches:
+            batch_ids[batch_record.url] = batch_record.batch_id
+        return [batch_ids[url] for url in urls if url in batch_ids]
+
+    @staticmethod
+    def _write_records(path, offset, table, batch_id):
+        records = np.zeros(len(table), dtype=RECORD_DTYPE)
+        for name in TABLE_COLUMNS:
+            records[name] = getattr(table, name)
+        records["batch_id"] = batch_id
+
+        mode = 'r+b' if os.path.exists(path) else 'wb'
+        with open(path, mode=mode) as fp:
+            fp.truncate(offset * RECORD_DTYPE.itemsize)
+            fp.seek(offset * RECORD_DTYPE.itemsize)
+            fp.write(records.tobytes())
+
+    def append(self, url, created, sha256, table, revised_table=None):
+        """Appends the keys and revised keys of a batch unless the same content is archived.
+
+        Returns the batch id.
+        """
+        batch_id = self.get_batch_id(url, sha256)
+        if batch_id is not None:
+            return batch_id
+
+        batch_id = len(self.batches)
+        offset = len(self)
+        revised_offset = self.revised_key_count()
+        revised_key_count = len(revised_table) if revised_table is not None else 0
+
+        os.makedirs(self.path, exist_ok=True)
+        self._write_records(self.keys_path, offset, table, batch_id)
+        if revised_key_count > 0:
+            self._write_records(self.revised_keys_path, revised_offset, revised_table, batch_id)
+
+        self._add_batch(BatchRecord(batch_id, url, created, sha256, offset, len(table),
+                                    revised_offset, revised_key_count))
+        return batch_id
+
+    def save(self):
+        json_obj = {
+            "version": ARCHIVE_VERSION,
+            "record_size": RECORD_DTYPE.itemsize,
+            "batches": [batch_record.to_dict() for batch_record in self.batches],
+        }
+
+        tmp_path = "%s.tmp" % self.batches_path
+        with open(tmp_path, mode='w') as fp:
+            json.dump(json_obj, fp)
+        os.replace(tmp_path, self.batches_path)
+
+    def keys(self):
+        """Returns every archived key as a read-only memory-mapped array of RECORD_DTYPE."""
+        length = len(self)
+        if length == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.keys_path, dtype=RECORD_DTYPE, mode='r', shape=(length,))
+
+    def batch_keys(self, batch_id):
+        batch_record = self.batches[batch_id]
+        return self.keys()[batch_record.offset:batch_record.offset + batch_record.key_count]
+
+    def revised_keys(self):
+        """Returns every archived revised key as a read-only memory-mapped array of RECORD_DTYPE."""
+        length = self.revised_key_count()
+        if length == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.revised_keys_path, dtype=RECORD_DTYPE, mode='r', shape=(length,))
+
+    def batch_revised_keys(self, batch_id):
+        batch_record = self.batches[batch_id]
+        return self.revised_keys()[batch_record.revised_offset:
+                                   batch_record.revised_offset + batch_record.revised_key_count]
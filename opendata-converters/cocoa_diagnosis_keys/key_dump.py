@@ -0,0 +1,95 @@
+import binascii
+import json
+
+import numpy as np
+
+BUFFER_SIZE = 1024 * 1024
+
+_EXPORT_LINE = (
+    '{"record":"export","url":%s,"created":%d,"start_timestamp":%d,"end_timestamp":%d,"region":%s,'
+    '"batch_num":%d,"batch_size":%d,"key_count":%d,"revised_key_count":%d}\n')
+_KEY_LINE = (
+    '{"record":"key","url":%s,"created":%d,"revised":%s,"index":%d,"key_data":"%s",'
+    '"transmission_risk_level":%d,"rolling_start_interval_number":%d,"rolling_period":%d,'
+    '"report_type":%s,"days_since_onset_of_symptoms":%s}\n')
+
+
+def _in_range(value, value_range):
+    return value_range is None or value_range[0] <= value <= value_range[1]
+
+
+def _optional(value):
+    return "null" if value is None else "%d" % value
+
+
+class KeyDumpWriter:
+    """Writes export headers and keys as JSON lines.
+
+    Every batch is a line of `"record":"export"` followed by a line of `"record":"key"` per key and per
+    revised key (`"revised":true`). Lines are formatted without json.dumps() and written to a buffered file
+    a batch at a time. Batches can be filtered by URL or file name (`batches`) and `created`, and keys by
+    `rolling_start_interval_number`. Ranges are inclusive (min, max) tuples. With `append`, lines are added
+    to an existing file instead of replacing it.
+    """
+
+    def __init__(self, path, batches=None, created_range=None, rolling_start_interval_number_range=None,
+                 append=False):
+        self.path = path
+        self.batches = None if batches is None else set(batches)
+        self.created_range = created_range
+        self.rolling_start_interval_number_range = rolling_start_interval_number_range
+        self.line_count = 0
+        self._fp = open(path, mode='a' if append else 'w', encoding='utf-8', buffering=BUFFER_SIZE)
+
+    def accepts(self, url, created):
+        """Returns whether the batch of `url` is dumped, so that nothing is decoded for other batches."""
+        if self.batches is not None and url not in self.batches and url.rsplit("/", 1)[-1] not in self.batches:
+            return False
+        return _in_range(created, self.created_range)
+
+    def write(self, url, created, header, table, revised_keys):
+        """Writes the ExportHeader, the KeyTable of `keys` and the `revised_keys` (TemporaryExposureKeys)."""
+        url_json = json.dumps(url)
+        lines = [_EXPORT_LINE % (
+            url_json, created, header.start_timestamp, header.end_timestamp, json.dumps(header.region),
+            header.batch_num, header.batch_size, header.key_count, header.revised_key_count)]
+
+        indices = np.arange(len(table))
+        if self.rolling_start_interval_number_range is not None:
+            start, end = self.rolling_start_interval_number_range
+            indices = indices[(table.rolling_start_interval_number >= start) &
+                              (table.rolling_start_interval_number <= end)]
+
+        columns = zip(
+            indices.tolist(),
+            table.transmission_risk_level[indices].tolist(),
+            table.rolling_start_interval_number[indices].tolist(),
+            table.rolling_period[indices].tolist(),
+            table.report_type[indices].tolist(),
+            table.has_report_type[indices].tolist(),
+            table.days_since_onset_of_symptoms[indices].tolist(),
+            table.has_days_since_onset_of_symptoms[indices].tolist(),
+        )
+        for index, transmission_risk_level, rolling_start_interval_number, rolling_period, report_type, \
+                has_report_type, days_since_onset_of_symptoms, has_days_since_onset_of_symptoms in columns:
+            lines.append(_KEY_LINE % (
+                url_json, created, "false", index,
+                binascii.b2a_base64(table.raw_key_data(index), newline=False).decode('ascii'),
+                transmission_risk_level, rolling_start_interval_number, rolling_period,
+                report_type if has_report_type else "null",
+                days_since_onset_of_symptoms if has_days_since_onset_of_symptoms else "null"))
+
+        for index, key in enumerate(revised_keys):
+            if not _in_range(key.rolling_start_interval_number, self.rolling_start_interval_number_range):
+                continue
+            lines.append(_KEY_LINE % (
+                url_json, created, "true", index,
+                binascii.b2a_base64(key.key_data, newline=False).decode('ascii'),
+                key.transmission_risk_level, key.rolling_start_interval_number, key.rolling_period,
+                _optional(key.report_type), _optional(key.days_since_onset_of_symptoms)))
+
+        self._fp.write("".join(lines))
+        self.line_count += len(lines)
+
+    def close(self):
+        self._fp.close()
@@ -0,0 +1,121 @@
+import math
+import os
+
+import numpy as np
+
+from key_sketch import hash_key_data
+
+FILTER_MAGIC = b"CDKBLOOM"
+# The version changes with the layout or the hashes, so a filter is never read with other hashes than it was built.
+FILTER_VERSION = 1
+
+# A false positive rate of one in a million takes 28.8 bits (3.6 bytes) per key and 20 hashes.
+DEFAULT_FALSE_POSITIVE_RATE = 1e-6
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("hash_count", "<u4"),
+    ("bit_count", "<u8"),
+    ("key_count", "<u8"),
+])
+WORD_DTYPE = np.dtype("<u8")
+WORD_BITS = 64
+
+# Seeds of the two hashes every position of a key is derived from.
+_SEED_1 = 0
+_SEED_2 = 0x9e3779b97f4a7c15
+
+# Keys hashed at a time while building, which bounds the hashes and positions held in memory.
+BUILD_CHUNK_KEYS = 1 << 20
+
+
+def filter_parameters(key_count, false_positive_rate):
+    """Returns (bit_count, hash_count) of the smallest filter of `key_count` keys with `false_positive_rate`."""
+    if key_count == 0:
+        return WORD_BITS, 1
+    bit_count = math.ceil(-key_count * math.log(false_positive_rate) / (math.log(2) ** 2))
+    bit_count = max(WORD_BITS, -(-bit_count // WORD_BITS) * WORD_BITS)
+    hash_count = max(1, round(bit_count / key_count * math.log(2)))
+    return bit_count, hash_count
+
+
+class KeyFilter:
+    """Bloom filter of key_data: whether a key was published, with false positives but no false negatives.
+
+    Every key sets `hash_count` of `bit_count` bits, at positions h1 + i * h2 (mod bit_count) of two 64-bit
+    hashes of the key, and a key is reported as published if all its bits are set. A lookup reads
+    `hash_count` bits whatever the number of keys, so a memory-mapped filter answers without reading the
+    rest of the file. The file is a HEADER_DTYPE header followed by the bits as little-endian 64-bit words.
+    """
+    __slots__ = ("hash_count", "bit_count", "key_count", "words")
+
+    def __init__(self, hash_count, bit_count, key_count, words):
+        self.hash_count = hash_count
+        self.bit_count = bit_count
+        self.key_count = key_count
+        self.words = words
+
+    @staticmethod
+    def build(key_data, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+        """Returns the filter of distinct `key_data` sized for `false_positive_rate`."""
+        bit_count, hash_count = filter_parameters(len(key_data), false_positive_rate)
+        key_filter = KeyFilter(hash_count, bit_count, len(key_data), None)
+
+        # Bits are set in the packed bytes, so building takes no more memory than the filter itself.
+        # Byte i >> 3 bit i & 7 is bit i of the little-endian words.
+        packed = np.zeros(bit_count // 8, dtype=np.uint8)
+        for start in range(0, len(key_data), BUILD_CHUNK_KEYS):
+            for positions in key_filter._positions(key_data[start:start + BUILD_CHUNK_KEYS]):
+                masks = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+                np.bitwise_or.at(packed, positions >> np.uint64(3), masks)
+        key_filter.words = packed.view(WORD_DTYPE)
+        return key_filter
+
+    @property
+    def false_positive_rate(self):
+        """Expected rate of keys that were not added but are reported as published."""
+        return (1 - math.exp(-self.hash_count * self.key_count / self.bit_count)) ** self.hash_count
+
+    def _positions(self, key_data):
+        h1 = hash_key_data(key_data, _SEED_1)
+        h2 = hash_key_data(key_data, _SEED_2) | np.uint64(1)
+        bit_count = np.uint64(self.bit_count)
+        # uint64 arithmetic wraps around.
+        for i in range(self.hash_count):
+            yield (h1 + np.uint64(i) * h2) % bit_count
+
+    def contains(self, key_data):
+        """Returns True for every key that may have been added and False for the ones that were not."""
+        contained = np.ones(len(key_data), dtype=bool)
+        for positions in self._positions(key_data):
+            words = self.words[positions >> np.uint64(6)]
+            contained &= ((words >> (positions & np.uint64(WORD_BITS - 1))) & np.uint64(1)) != 0
+        return contained
+
+    def save(self, path):
+        header = np.array([(FILTER_MAGIC, FILTER_VERSION, self.hash_count, self.bit_count, self.key_count)],
+                          dtype=HEADER_DTYPE)
+
+        dir = os.path.dirname(path)
+        if dir:
+            os.makedirs(dir, exist_ok=True)
+
+        tmp_path = "%s.tmp" % path
+        with open(tmp_path, mode='wb') as fp:
+            fp.write(header.tobytes())
+            self.words.astype(WORD_DTYPE, copy=False).tofile(fp)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def open(path):
+        """Memory-maps a filter written by save()."""
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        assert len(header) == 1 and header["magic"][0] == FILTER_MAGIC, "%s is not a key filter." % path
+        assert int(header["version"][0]) == FILTER_VERSION, \
+            "Key filter %s has version %d." % (path, header["version"][0])
+
+        bit_count = int(header["bit_count"][0])
+        words = np.memmap(path, dtype=WORD_DTYPE, mode='r', offset=HEADER_DTYPE.itemsize,
+                          shape=(bit_count // WORD_BITS,))
+        return KeyFilter(int(header["hash_count"][0]), bit_count, int(header["key_count"][0]), words)
@@ -0,0 +1,183 @@
+import hashlib
+import os
+
+import numpy as np
+
+from key_table import KEY_DATA_DTYPE
+
+CREATED_DTYPE = np.dtype("<i8")
+PREFIX_DTYPE = np.dtype("<u8")
+BATCH_DTYPE = np.dtype("<i8")
+
+NOT_FOUND = -1
+# Batch of keys indexed before batches were recorded, or added without one.
+UNKNOWN_BATCH = -1
+
+
+def batch_hash(url):
+    """Returns a stable non-negative 63-bit hash identifying the batch at `url`."""
+    return int.from_bytes(hashlib.sha256(url.encode('utf-8')).digest()[:8], byteorder='little') >> 1
+
+
+def key_prefix(key_data):
+    """Returns the first 8 bytes of 16-byte keys as integers, in the same order as the keys."""
+    return np.ascontiguousarray(key_data, dtype=KEY_DATA_DTYPE).view(">u8")[::2].astype(PREFIX_DTYPE)
+
+
+def search_keys(sorted_key_data, sorted_prefix, key_data, prefix):
+    """Binary-searches `key_data` in sorted 16-byte keys and returns (positions, found).
+
+    The search runs on the prefixes, which is much faster than comparing 16-byte strings. Keys sharing
+    their prefix with the next key are searched again by the whole key.
+    """
+    length = len(sorted_key_data)
+
+    positions = np.searchsorted(sorted_prefix, prefix)
+    found = positions < length
+    found[found] = sorted_key_data[positions[found]] == key_data[found]
+
+    next_positions = np.minimum(positions + 1, length - 1)
+    ambiguous = ~found & (positions + 1 < length)
+    ambiguous[ambiguous] = sorted_prefix[next_positions[ambiguous]] == prefix[ambiguous]
+    if ambiguous.any():
+        ambiguous_positions = np.searchsorted(sorted_key_data, key_data[ambiguous])
+        positions[ambiguous] = np.minimum(ambiguous_positions, length - 1)
+        found[ambiguous] = sorted_key_data[positions[ambiguous]] == key_data[ambiguous]
+
+    return positions, found
+
+
+class KeyIndex:
+    """Set of every key_data ever seen, with the `created` and the id of the batch each key was first seen in.
+
+    Keys are kept as fixed 16-byte values (see KeyTable) in sorted runs. New keys form a new run and
+    runs of similar size are merged, so adding a batch costs about the size of the batch instead of
+    the size of the index. Lookups are binary searches over every run (see search_keys()).
+    """
+    __slots__ = ("_runs",)
+
+    def __init__(self):
+        # [(key_data, prefix, first_seen_created, first_seen_batch)], sorted by key_data and from the largest run.
+        self._runs = []
+
+    def __len__(self):
+        return sum(len(run[0]) for run in self._runs)
+
+    @staticmethod
+    def _run(key_data, first_seen_created, first_seen_batch):
+        return key_data, key_prefix(key_data), first_seen_created, first_seen_batch
+
+    @staticmethod
+    def _find(run, key_data, prefix):
+        run_key_data, run_prefix = run[:2]
+        return search_keys(run_key_data, run_prefix, key_data, prefix)
+
+    def key_data(self):
+        """Returns every key_data of the index, in no particular order."""
+        return np.concatenate([np.zeros(0, dtype=KEY_DATA_DTYPE)] + [run[0] for run in self._runs])
+
+    def lookup(self, key_data):
+        """Returns the `created` each key was first seen in, or NOT_FOUND."""
+        key_data = np.asarray(key_data, dtype=KEY_DATA_DTYPE)
+        prefix = key_prefix(key_data)
+        first_seen_created = np.full(len(key_data), NOT_FOUND, dtype=CREATED_DTYPE)
+        for run in self._runs:
+            positions, found = self._find(run, key_data, prefix)
+            first_seen_created[found] = run[2][positions[found]]
+        return first_seen_created
+
+    def add(self, key_data, created, batch=UNKNOWN_BATCH):
+        """Adds the keys of a batch and returns the `created` each key was first seen in.
+
+        A key already in the index keeps the earliest `created` and the first batch added with it, so
+        adding the same batch again does not change the index.
+        """
+        return self._add(key_data, created, batch)[0]
+
+    def _add(self, key_data, created, batch):
+        # Returns (first_seen_created, first_seen_batch) of every key.
+        key_data, inverse = np.unique(np.asarray(key_data, dtype=KEY_DATA_DTYPE), return_inverse=True)
+        prefix = key_prefix(key_data)
+        first_seen_created = np.full(len(key_data), created, dtype=CREATED_DTYPE)
+        first_seen_batch = np.full(len(key_data), batch, dtype=BATCH_DTYPE)
+        is_new = np.ones(len(key_data), dtype=bool)
+
+        for run in self._runs:
+            _, _, run_first_seen_created, run_first_seen_batch = run
+            positions, found = self._find(run, key_data, prefix)
+            positions = positions[found]
+            # A key of an earlier `created` moves to this batch, and so does a key of the same `created`
+            # whose batch is unknown.
+            updated = (created < run_first_seen_created[positions]) | (
+                (created == run_first_seen_created[positions]) & (run_first_seen_batch[positions] == UNKNOWN_BATCH))
+            run_first_seen_created[positions[updated]] = created
+            run_first_seen_batch[positions[updated]] = batch
+            first_seen_created[found] = run_first_seen_created[positions]
+            first_seen_batch[found] = run_first_seen_batch[positions]
+            is_new &= ~found
+
+        if is_new.any():
+            self._runs.append(self._run(key_data[is_new], first_seen_created[is_new], first_seen_batch[is_new]))
+            self._compact()
+
+        inverse = inverse.reshape(-1)
+        return first_seen_created[inverse], first_seen_batch[inverse]
+
+    def _compact(self, force=False):
+        while len(self._runs) > 1 and (force or len(self._runs[-2][0]) <= 2 * len(self._runs[-1][0])):
+            key_data_r, _, first_seen_created_r, first_seen_batch_r = self._runs.pop()
+            key_data_l, _, first_seen_created_l, first_seen_batch_l = self._runs.pop()
+            key_data = np.concatenate([key_data_l, key_data_r])
+            order = np.argsort(key_data, kind="stable")
+            self._runs.append(self._run(
+                key_data[order], np.concatenate([first_seen_created_l, first_seen_created_r])[order],
+                np.concatenate([first_seen_batch_l, first_seen_batch_r])[order]))
+
+    def save(self, path):
+        self._compact(force=True)
+        key_data, _, first_seen_created, first_seen_batch = self._runs[0] if self._runs else (
+            np.zeros(0, dtype=KEY_DATA_DTYPE), None, np.zeros(0, dtype=CREATED_DTYPE), np.zeros(0, dtype=BATCH_DTYPE))
+
+        dir = os.path.dirname(path)
+        if dir:
+            os.makedirs(dir, exist_ok=True)
+
+        tmp_path = "%s.tmp" % path
+        with open(tmp_path, mode='wb') as fp:
+            np.savez(fp, key_data=key_data, first_seen_created=first_seen_created, first_seen_batch=first_seen_batch)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        key_index = KeyIndex()
+        if not os.path.exists(path):
+            return key_index
+
+        with np.load(path) as npz:
+            key_data = npz["key_data"].astype(KEY_DATA_DTYPE, copy=False)
+            first_seen_created = npz["first_seen_created"].astype(CREATED_DTYPE, copy=False)
+            # Indexes saved before batches were recorded have none.
+            if "first_seen_batch" in npz.files:
+                first_seen_batch = npz["first_seen_batch"].astype(BATCH_DTYPE, copy=False)
+            else:
+                first_seen_batch = np.full(len(key_data), UNKNOWN_BATCH, dtype=BATCH_DTYPE)
+        if len(key_data) > 0:
+            key_index._runs.append(KeyIndex._run(key_data, first_seen_created, first_seen_batch))
+        return key_index
+
+
+def find_duplicates(key_index, created, batch, key_data):
+    """Adds the keys of a batch to `key_index` and returns (is_duplicate, first_seen_created) per key.
+
+    `batch` identifies the batch (see batch_hash()). A key is a duplicate if it was first seen in another
+    batch, even one with the same `created`, or appears again within the batch.
+    """
+    key_data = np.asarray(key_data, dtype=KEY_DATA_DTYPE)
+    first_seen_created, first_seen_batch = key_index._add(key_data, created, batch)
+
+    is_duplicate = first_seen_batch != batch
+    _, first_indices = np.unique(key_data, return_index=True)
+    repeated = np.ones(len(key_data), dtype=bool)
+    repeated[first_indices] = False
+
+    return is_duplicate | repeated, first_seen_created
@@ -0,0 +1,217 @@
+import os
+
+import numpy as np
+
+from key_archive import KeyArchive
+
+FILENAME_BLOCKS = "blocks.npz"
+# Version 2 added the order of records by rolling_start_interval_number.
+BLOCK_INDEX_VERSION = 2
+BLOCK_SIZE = 4096
+
+ORDER_DTYPE = np.dtype("<i8")
+ROLLING_START_INTERVAL_NUMBER_DTYPE = np.dtype("<i4")
+
+# Columns whose value is missing when the presence column is False. Missing values are counted as None.
+PRESENCE_COLUMNS = {
+    "report_type": "has_report_type",
+    "days_since_onset_of_symptoms": "has_days_since_onset_of_symptoms",
+}
+
+
+class BlockIndex:
+    """Archived records in the order of rolling_start_interval_number, with the minimum and maximum
+    rolling_start_interval_number and created of every BLOCK_SIZE records in that order.
+
+    Records are archived in the order of batches, and every batch has keys of the last couple of weeks,
+    so blocks of the archive itself would all span the same range. `order` is the position of every
+    record sorted by rolling_start_interval_number (then by position), so blocks cover disjoint ranges
+    of it and a query of a few days reads a few blocks. Kept in `blocks.npz` of the archive; appended
+    records are merged into the order.
+    """
+    __slots__ = ("record_count", "order", "rolling_start_interval_numbers",
+                 "rolling_start_interval_number_min", "rolling_start_interval_number_max", "created_min", "created_max")
+
+    def __init__(self):
+        self.record_count = 0
+        self.order = np.zeros(0, dtype=ORDER_DTYPE)
+        # rolling_start_interval_number of the records of `order`, sorted.
+        self.rolling_start_interval_numbers = np.zeros(0, dtype=ROLLING_START_INTERVAL_NUMBER_DTYPE)
+        self.rolling_start_interval_number_min = np.zeros(0, dtype=np.int64)
+        self.rolling_start_interval_number_max = np.zeros(0, dtype=np.int64)
+        self.created_min = np.zeros(0, dtype=np.int64)
+        self.created_max = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.created_min)
+
+    @staticmethod
+    def load(path):
+        block_index = BlockIndex()
+        if not os.path.exists(path):
+            return block_index
+
+        with np.load(path) as npz:
+            if "version" not in npz.files or int(npz["version"]) != BLOCK_INDEX_VERSION \
+                    or int(npz["block_size"]) != BLOCK_SIZE:
+                return block_index
+            block_index.record_count = int(npz["record_count"])
+            for name in BlockIndex.__slots__[1:]:
+                setattr(block_index, name, npz[name])
+        return block_index
+
+    def save(self, path):
+        tmp_path = "%s.tmp" % path
+        with open(tmp_path, mode='wb') as fp:
+            np.savez(fp, version=BLOCK_INDEX_VERSION, block_size=BLOCK_SIZE, record_count=self.record_count,
+                     **{name: getattr(self, name) for name in BlockIndex.__slots__[1:]})
+        os.replace(tmp_path, path)
+
+    def update(self, keys, created_by_batch, batch_offsets):
+        """Indexes the records of `keys` past `record_count`. Returns True if anything changed.
+
+        `batch_offsets` is the offset of the first record of every batch, so the created of a record
+        is known from its position without reading the archive.
+        """
+        if self.record_count == len(keys):
+            return False
+        if self.record_count > len(keys):
+            # The archive is not the one this index was built from.
+            self.__init__()
+
+        # Only the appended records are read, then merged into the order. Equal values keep the order of
+        # positions, as appended records come after the others.
+        values = np.asarray(keys["rolling_start_interval_number"][self.record_count:],
+                            dtype=ROLLING_START_INTERVAL_NUMBER_DTYPE)
+        new_order = np.argsort(values, kind="stable")
+        values = values[new_order]
+        insert_positions = np.searchsorted(self.rolling_start_interval_numbers, values, side="right")
+        self.order = np.insert(self.order, insert_positions, new_order.astype(ORDER_DTYPE) + self.record_count)
+        self.rolling_start_interval_numbers = np.insert(self.rolling_start_interval_numbers, insert_positions, values)
+        self.record_count = len(keys)
+
+        starts = np.arange(0, self.record_count, BLOCK_SIZE)
+        ends = np.minimum(starts + BLOCK_SIZE, self.record_count)
+        self.rolling_start_interval_number_min = self.rolling_start_interval_numbers[starts].astype(np.int64)
+        self.rolling_start_interval_number_max = self.rolling_start_interval_numbers[ends - 1].astype(np.int64)
+        created = created_by_batch[np.searchsorted(batch_offsets, self.order, side="right") - 1]
+        self.created_min = np.minimum.reduceat(created, starts)
+        self.created_max = np.maximum.reduceat(created, starts)
+        return True
+
+    def positions(self, blocks):
+        """Returns the positions of the records of `blocks` in the order of the archive."""
+        if len(blocks) == 0:
+            return np.zeros(0, dtype=ORDER_DTYPE)
+        # Contiguous blocks are one slice of the order.
+        breaks = np.flatnonzero(np.diff(blocks) != 1) + 1
+        return np.sort(np.concatenate([
+            self.order[int(run[0]) * BLOCK_SIZE:(int(run[-1]) + 1) * BLOCK_SIZE] for run in np.split(blocks, breaks)]))
+
+
+def query_range(start, end):
+    """Returns the inclusive range of optional `start` and `end`, or None (no condition) if both are None."""
+    if start is None and end is None:
+        return None
+    return (start if start is not None else np.iinfo(np.int64).min,
+            end if end is not None else np.iinfo(np.int64).max)
+
+
+def _overlaps(minimums, maximums, value_range):
+    if value_range is None:
+        return np.ones(len(minimums), dtype=bool)
+    start, end = value_range
+    return (maximums >= start) & (minimums <= end)
+
+
+def _in_range(values, value_range):
+    start, end = value_range
+    return (values >= start) & (values <= end)
+
+
+class KeyQuery:
+    """Queries over the keys of a KeyArchive.
+
+    Ranges are (start, end) tuples, both inclusive. Only blocks whose minimum and maximum overlap the
+    ranges are read, and a batch is read directly from its range of records.
+    """
+
+    def __init__(self, key_archive):
+        self.key_archive = key_archive
+        self.keys = key_archive.keys()
+        self.created_by_batch = np.array([batch.created for batch in key_archive.batches], dtype=np.int64)
+
+        self.blocks_path = os.path.join(key_archive.path, FILENAME_BLOCKS)
+        self.block_index = BlockIndex.load(self.blocks_path)
+        batch_offsets = np.array([batch.offset for batch in key_archive.batches], dtype=np.int64)
+        if self.block_index.update(self.keys, self.created_by_batch, batch_offsets):
+            self.block_index.save(self.blocks_path)
+
+    @staticmethod
+    def open(archive_path):
+        return KeyQuery(KeyArchive.load(archive_path))
+
+    def candidate_blocks(self, rolling_start_interval_number_range=None, created_range=None):
+        block_index = self.block_index
+        return np.flatnonzero(
+            _overlaps(block_index.rolling_start_interval_number_min, block_index.rolling_start_interval_number_max,
+                      rolling_start_interval_number_range)
+            & _overlaps(block_index.created_min, block_index.created_max, created_range))
+
+    def _record_chunks(self, rolling_start_interval_number_range, created_range, batch_id):
+        # Yields the records to filter, in the order of the archive.
+        if batch_id is not None:
+            batch = self.key_archive.batches[batch_id]
+            yield self.keys[batch.offset:batch.offset + batch.key_count]
+            return
+
+        if rolling_start_interval_number_range is None and created_range is None:
+            yield self.keys
+            return
+
+        # Records of the candidate blocks are read BLOCK_SIZE at a time; sorted positions read the
+        # memory-mapped archive forward.
+        positions = self.block_index.positions(
+            self.candidate_blocks(rolling_start_interval_number_range, created_range))
+        for start in range(0, len(positions), BLOCK_SIZE):
+            yield self.keys[positions[start:start + BLOCK_SIZE]]
+
+    def _chunks(self, rolling_start_interval_number_range, created_range, batch_id):
+        for records in self._record_chunks(rolling_start_interval_number_range, created_range, batch_id):
+            mask = np.ones(len(records), dtype=bool)
+            if rolling_start_interval_number_range is not None:
+                mask &= _in_range(records["rolling_start_interval_number"], rolling_start_interval_number_range)
+            if created_range is not None:
+                mask &= _in_range(self.created_by_batch[records["batch_id"]], created_range)
+
+            yield records, mask
+
+    def select(self, rolling_start_interval_number_range=None, created_range=None, batch_id=None):
+        """Returns the matching records as an array of RECORD_DTYPE, in the order of the archive."""
+        chunks = [np.asarray(records[mask]) for records, mask in
+                  self._chunks(rolling_start_interval_number_range, created_range, batch_id)]
+        if len(chunks) == 0:
+            return self.keys[0:0]
+        return np.concatenate(chunks)
+
+    def count_by(self, column, rolling_start_interval_number_range=None, created_range=None, batch_id=None):
+        """Returns {value: key count} of `column` over the matching keys."""
+        counts = {}
+        for records, mask in self._chunks(rolling_start_interval_number_range, created_range, batch_id):
+            if column == "created":
+                values = self.created_by_batch[records["batch_id"]]
+            else:
+                values = records[column]
+
+            presence_column = PRESENCE_COLUMNS.get(column)
+            if presence_column is not None:
+                missing_count = int(np.count_nonzero(mask & ~records[presence_column]))
+                if missing_count > 0:
+                    counts[None] = counts.get(None, 0) + missing_count
+                mask = mask & records[presence_column]
+
+            for value, count in zip(*np.unique(values[mask], return_counts=True)):
+                value = value.item()
+                counts[value] = counts.get(value, 0) + int(count)
+        return counts
+
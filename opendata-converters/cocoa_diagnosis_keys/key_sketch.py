@@ -0,0 +1,203 @@
+import csv
+import datetime
+import math
+import os
+
+import numpy as np
+
+from key_table import KEY_DATA_DTYPE
+from statistics import EN_INTERVAL_WINDOW, JST
+
+# 2 ** PRECISION one-byte registers: 4 KB per sketch and a standard error of about 1.04 / sqrt(4096) = 1.6%.
+PRECISION = 12
+REGISTER_DTYPE = np.dtype("u1")
+
+# Version 1 kept a sketch per JST day of `created`.
+SKETCH_VERSION = 2
+
+# File name, key column and key of every period of distinct keys written by write_distinct_key_counts(),
+# the same periods of the rolling start as the rollups.
+DISTINCT_KEY_PERIODS = [
+    ("distinct_keys_by_rolling_start_date.csv", "rolling_start_date", lambda date: date.isoformat()),
+    ("distinct_keys_by_rolling_start_iso_week.csv", "rolling_start_iso_week",
+     lambda date: "%04d-W%02d" % date.isocalendar()[:2]),
+    ("distinct_keys_overall.csv", None, lambda date: None),
+]
+
+
+def _mix64(values):
+    # Finalizer of SplitMix64. uint64 arithmetic wraps around.
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xbf58476d1ce4e5b9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+
+def hash_key_data(key_data, seed=0):
+    """Returns a 64-bit hash of every 16-byte key_data. Invalid keys are zero padded, so every byte is hashed.
+
+    Hashes of different `seed`s are independent.
+    """
+    words = np.ascontiguousarray(key_data, dtype=KEY_DATA_DTYPE).view("<u8")
+    return _mix64(words[::2] ^ _mix64(words[1::2] ^ np.uint64(seed)))
+
+
+class HyperLogLog:
+    """HyperLogLog sketch of a set of 64-bit hashes.
+
+    The first `precision` bits of a hash select a register, which keeps the maximum rank (the position of the
+    first 1 bit) of the remaining bits. Sketches of the same precision merge by the maximum of registers,
+    so the sketch of a union is the merge of the sketches of its parts.
+    """
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision=PRECISION, registers=None):
+        # Ranks are computed through float64, which holds the 64 - precision remaining bits exactly.
+        assert 11 <= precision <= 16, "precision %d is not supported." % precision
+        self.precision = precision
+        if registers is None:
+            registers = np.zeros(1 << precision, dtype=REGISTER_DTYPE)
+        self.registers = registers
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        remaining_bits = 64 - self.precision
+        indices = (hashes >> np.uint64(remaining_bits)).astype(np.intp)
+        remaining = hashes & np.uint64((1 << remaining_bits) - 1)
+        # frexp() returns the bit length of an integer as its exponent.
+        _, bit_lengths = np.frexp(remaining.astype(np.float64))
+        ranks = (remaining_bits + 1 - bit_lengths).astype(REGISTER_DTYPE)
+        np.maximum.at(self.registers, indices, ranks)
+        return self
+
+    def add(self, key_data):
+        return self.add_hashes(hash_key_data(key_data))
+
+    def merge(self, other):
+        assert self.precision == other.precision, "precision %d != %d" % (self.precision, other.precision)
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def copy(self):
+        return HyperLogLog(self.precision, self.registers.copy())
+
+    def estimate(self):
+        """Returns the estimated number of distinct hashes."""
+        register_count = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / register_count)
+        raw_estimate = alpha * register_count * register_count / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+
+        zero_count = int(np.count_nonzero(self.registers == 0))
+        if raw_estimate <= 2.5 * register_count and zero_count > 0:
+            # Linear counting for small sets.
+            return register_count * math.log(register_count / zero_count)
+        return float(raw_estimate)
+
+
+def rolling_start_date(rolling_start_interval_number):
+    """Returns the JST date of a rolling start, the day of the rollups."""
+    return datetime.datetime.fromtimestamp(rolling_start_interval_number * EN_INTERVAL_WINDOW, JST).date()
+
+
+class KeySketches:
+    """HyperLogLog sketches of the key_data of every JST day of the rolling start.
+
+    The distinct keys of any range of days, such as a week or a month, are estimated by merging the
+    sketches of its days, so the history is kept in a few KB per day instead of every key.
+    """
+    __slots__ = ("precision", "sketches")
+
+    def __init__(self, precision=PRECISION):
+        self.precision = precision
+        self.sketches = {}  # {datetime.date: HyperLogLog}
+
+    def add(self, rolling_start_interval_number, key_data):
+        rolling_start_interval_numbers, inverse = np.unique(rolling_start_interval_number, return_inverse=True)
+        ordinals = np.array([rolling_start_date(value).toordinal()
+                             for value in rolling_start_interval_numbers.tolist()], dtype=np.int64)[inverse]
+        for ordinal in np.unique(ordinals).tolist():
+            date = datetime.date.fromordinal(ordinal)
+            sketch = self.sketches.get(date)
+            if sketch is None:
+                sketch = HyperLogLog(self.precision)
+                self.sketches[date] = sketch
+            sketch.add(key_data[ordinals == ordinal])
+
+    def merged(self, start_date=None, end_date=None):
+        """Returns the merged sketch of the days from `start_date` to `end_date` (inclusive)."""
+        merged = HyperLogLog(self.precision)
+        for date, sketch in self.sketches.items():
+            if (start_date is None or start_date <= date) and (end_date is None or date <= end_date):
+                merged.merge(sketch)
+        return merged
+
+    def estimate(self, start_date=None, end_date=None):
+        return self.merged(start_date, end_date).estimate()
+
+    def grouped(self, period):
+        """Returns {period key: merged sketch} of the days grouped by `period(date)`."""
+        groups = {}
+        for date, sketch in self.sketches.items():
+            key = period(date)
+            if key in groups:
+                groups[key].merge(sketch)
+            else:
+                groups[key] = sketch.copy()
+        return groups
+
+    def save(self, path):
+        dates = sorted(self.sketches)
+        registers = np.zeros((len(dates), 1 << self.precision), dtype=REGISTER_DTYPE)
+        for index, date in enumerate(dates):
+            registers[index] = self.sketches[date].registers
+
+        dir = os.path.dirname(path)
+        if dir:
+            os.makedirs(dir, exist_ok=True)
+
+        tmp_path = "%s.tmp" % path
+        with open(tmp_path, mode='wb') as fp:
+            np.savez(fp, version=np.int64(SKETCH_VERSION), precision=np.int64(self.precision),
+                     ordinals=np.array([date.toordinal() for date in dates], dtype=np.int64), registers=registers)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path, precision=PRECISION):
+        key_sketches = KeySketches(precision)
+        if not os.path.exists(path):
+            return key_sketches
+
+        with np.load(path) as npz:
+            # Sketches of another version are dropped and rebuilt, as the state of that version is also dropped.
+            if int(npz["version"]) != SKETCH_VERSION:
+                return key_sketches
+            key_sketches.precision = int(npz["precision"])
+            for ordinal, registers in zip(npz["ordinals"].tolist(), npz["registers"]):
+                key_sketches.sketches[datetime.date.fromordinal(ordinal)] = HyperLogLog(
+                    key_sketches.precision, registers.astype(REGISTER_DTYPE))
+        return key_sketches
+
+
+def write_distinct_key_counts(key_sketches, path):
+    """Writes the estimated distinct keys per JST day and ISO week of the rolling start, and overall.
+
+    Every file is written to directory `path`, newest first. Returns the paths of the files.
+    """
+    os.makedirs(path, exist_ok=True)
+
+    file_paths = []
+    for file_name, key_column, period in DISTINCT_KEY_PERIODS:
+        groups = key_sketches.grouped(period)
+        if key_column is None and len(groups) == 0:
+            groups = {None: HyperLogLog(key_sketches.precision)}
+
+        file_path = os.path.join(path, file_name)
+        with open(file_path, mode='w') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(([key_column] if key_column is not None else []) + ["distinct_key_count"])
+            for key in sorted(groups, key=lambda key: (key is None, key), reverse=True):
+                writer.writerow(([key] if key_column is not None else []) + [round(groups[key].estimate())])
+        file_paths.append(file_path)
+
+    return file_paths
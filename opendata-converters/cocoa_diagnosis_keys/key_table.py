@@ -0,0 +1,144 @@
+import numpy as np
+
+from export_reader import TemporaryExposureKey
+
+KEY_DATA_LENGTH = 16
+
+KEY_DATA_DTYPE = np.dtype("S%d" % KEY_DATA_LENGTH)
+
+
+class KeyTable:
+    """Columnar representation of TemporaryExposureKeys.
+
+    `key_data` is a fixed 16-byte column (shorter keys are zero padded, longer ones truncated),
+    `key_data_length` keeps the original length, and the optional fields have presence masks.
+    The original bytes of keys whose length is not 16 are kept in `irregular_key_data`.
+    """
+    __slots__ = (
+        "key_data",
+        "key_data_length",
+        "transmission_risk_level",
+        "rolling_start_interval_number",
+        "rolling_period",
+        "report_type",
+        "has_report_type",
+        "days_since_onset_of_symptoms",
+        "has_days_since_onset_of_symptoms",
+        "irregular_key_data",
+    )
+
+    def __init__(self, key_data, key_data_length, transmission_risk_level, rolling_start_interval_number,
+                 rolling_period, report_type, has_report_type, days_since_onset_of_symptoms,
+                 has_days_since_onset_of_symptoms, irregular_key_data):
+        self.key_data = key_data
+        self.key_data_length = key_data_length
+        self.transmission_risk_level = transmission_risk_level
+        self.rolling_start_interval_number = rolling_start_interval_number
+        self.rolling_period = rolling_period
+        self.report_type = report_type
+        self.has_report_type = has_report_type
+        self.days_since_onset_of_symptoms = days_since_onset_of_symptoms
+        self.has_days_since_onset_of_symptoms = has_days_since_onset_of_symptoms
+        self.irregular_key_data = irregular_key_data
+
+    def __len__(self):
+        return len(self.key_data)
+
+    def raw_key_data(self, index):
+        if index in self.irregular_key_data:
+            return self.irregular_key_data[index]
+        return self.key_data[index:index + 1].tobytes()
+
+    def iter_keys(self):
+        """Yields every key as a TemporaryExposureKey, the inverse of from_keys()."""
+        columns = zip(
+            self.transmission_risk_level.tolist(),
+            self.rolling_start_interval_number.tolist(),
+            self.rolling_period.tolist(),
+            self.report_type.tolist(),
+            self.has_report_type.tolist(),
+            self.days_since_onset_of_symptoms.tolist(),
+            self.has_days_since_onset_of_symptoms.tolist(),
+        )
+        for index, (transmission_risk_level, rolling_start_interval_number, rolling_period, report_type,
+                    has_report_type, days_since_onset_of_symptoms, has_days_since_onset_of_symptoms) \
+                in enumerate(columns):
+            key = TemporaryExposureKey()
+            key.key_data = self.raw_key_data(index)
+            key.transmission_risk_level = transmission_risk_level
+            key.rolling_start_interval_number = rolling_start_interval_number
+            key.rolling_period = rolling_period
+            if has_report_type:
+                key.report_type = report_type
+            if has_days_since_onset_of_symptoms:
+                key.days_since_onset_of_symptoms = days_since_onset_of_symptoms
+            yield key
+
+    @staticmethod
+    def from_keys(keys):
+        key_data = []
+        key_data_length = []
+        transmission_risk_level = []
+        rolling_start_interval_number = []
+        rolling_period = []
+        report_type = []
+        has_report_type = []
+        days_since_onset_of_symptoms = []
+        has_days_since_onset_of_symptoms = []
+        irregular_key_data = {}
+
+        for index, key in enumerate(keys):
+            length = len(key.key_data)
+            if length != KEY_DATA_LENGTH:
+                irregular_key_data[index] = key.key_data
+            key_data.append(key.key_data)
+            key_data_length.append(length)
+            transmission_risk_level.append(key.transmission_risk_level)
+            rolling_start_interval_number.append(key.rolling_start_interval_number)
+            rolling_period.append(key.rolling_period)
+
+            if key.report_type is None:
+                report_type.append(0)
+                has_report_type.append(False)
+            else:
+                report_type.append(key.report_type)
+                has_report_type.append(True)
+
+            if key.days_since_onset_of_symptoms is None:
+                days_since_onset_of_symptoms.append(0)
+                has_days_since_onset_of_symptoms.append(False)
+            else:
+                days_since_onset_of_symptoms.append(key.days_since_onset_of_symptoms)
+                has_days_since_onset_of_symptoms.append(True)
+
+        return KeyTable(
+            key_data=np.array(key_data, dtype=KEY_DATA_DTYPE),
+            key_data_length=np.array(key_data_length, dtype=np.int32),
+            transmission_risk_level=np.array(transmission_risk_level, dtype=np.int32),
+            rolling_start_interval_number=np.array(rolling_start_interval_number, dtype=np.int32),
+            rolling_period=np.array(rolling_period, dtype=np.int32),
+            report_type=np.array(report_type, dtype=np.int32),
+            has_report_type=np.array(has_report_type, dtype=bool),
+            days_since_onset_of_symptoms=np.array(days_since_onset_of_symptoms, dtype=np.int32),
+            has_days_since_onset_of_symptoms=np.array(has_days_since_onset_of_symptoms, dtype=bool),
+            irregular_key_data=irregular_key_data,
+        )
+
+    @staticmethod
+    def concatenate(tables):
+        if len(tables) == 0:
+            return KeyTable.from_keys([])
+
+        irregular_key_data = {}
+        offset = 0
+        for table in tables:
+            for index, key_data in table.irregular_key_data.items():
+                irregular_key_data[offset + index] = key_data
+            offset += len(table)
+
+        columns = {}
+        for name in KeyTable.__slots__:
+            if name != "irregular_key_data":
+                columns[name] = np.concatenate([getattr(table, name) for table in tables])
+
+        return KeyTable(irregular_key_data=irregular_key_data, **columns)
@@ -0,0 +1,37 @@
+import base64
+import sys
+
+import numpy as np
+from absl import flags, app
+
+from key_filter import KeyFilter
+from key_table import KEY_DATA_DTYPE
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("key_filter_path", None, "Path of the key filter written by cocoa_diagnosis_keys.py")
+flags.DEFINE_list("keys", [], "Base64 key_data to look up")
+flags.DEFINE_string("keys_path", None, "File of base64 key_data to look up, one per line")
+
+
+def main(argv):
+    del argv  # Unused.
+
+    keys = list(FLAGS.keys)
+    if FLAGS.keys_path is not None:
+        with open(FLAGS.keys_path) as fp:
+            keys += [line.strip() for line in fp if line.strip()]
+
+    key_filter = KeyFilter.open(FLAGS.key_filter_path)
+    key_data = np.array([base64.b64decode(key) for key in keys], dtype=KEY_DATA_DTYPE)
+    published = key_filter.contains(key_data)
+
+    print("# %d keys, false positive rate %.1e" % (key_filter.key_count, key_filter.false_positive_rate),
+          file=sys.stderr)
+    lines = ["key_data,published\n"]
+    lines += ["%s,%d\n" % (key, value) for key, value in zip(keys, published.tolist())]
+    sys.stdout.write("".join(lines))
+
+
+if __name__ == '__main__':
+    flags.mark_flag_as_required("key_filter_path")
+    app.run(main)
@@ -0,0 +1,60 @@
+import base64
+import csv
+import os
+
+import numpy as np
+from absl import flags, app
+
+from exposure_matching import match_keys, DEFAULT_CHUNK_SIZE
+from key_archive import KeyArchive
+from key_table import KEY_DATA_LENGTH, KEY_DATA_DTYPE
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("archive_path", None, "Directory of the key archive written by cocoa_diagnosis_keys.py")
+flags.DEFINE_string("observed_rpis_path", None, "File of observed Rolling Proximity Identifiers, 16 bytes each")
+flags.DEFINE_string("output_path", "./matches.csv", "Output-file path")
+flags.DEFINE_integer("workers", 0, "Number of processes deriving RPIs (0: in the main process)")
+flags.DEFINE_integer("chunk_size", DEFAULT_CHUNK_SIZE, "Number of keys derived at once by a process")
+
+
+def main(argv):
+    del argv  # Unused.
+
+    file_size = os.path.getsize(FLAGS.observed_rpis_path)
+    assert file_size % KEY_DATA_LENGTH == 0, "%s is not a sequence of 16-byte RPIs." % FLAGS.observed_rpis_path
+    observed_rpis = np.memmap(FLAGS.observed_rpis_path, dtype=KEY_DATA_DTYPE, mode='r') \
+        if file_size > 0 else np.zeros(0, dtype=KEY_DATA_DTYPE)
+
+    key_archive = KeyArchive.load(FLAGS.archive_path)
+    keys = key_archive.keys()
+
+    print("Matching %d observed RPIs with %d keys..." % (len(observed_rpis), len(keys)))
+    matches = match_keys(keys, observed_rpis, FLAGS.workers, FLAGS.chunk_size)
+    print("%d RPIs matched." % len(matches))
+
+    dir = os.path.dirname(FLAGS.output_path)
+    if dir:
+        os.makedirs(dir, exist_ok=True)
+
+    with open(FLAGS.output_path, mode='w') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(["batch_id", "created", "key_data", "interval_number", "observed_count"])
+        for key_index, interval_number, observed_count in zip(
+                matches.key_indices.tolist(), matches.interval_numbers.tolist(), matches.observed_counts.tolist()):
+            key = keys[key_index]
+            batch_id = int(key["batch_id"])
+            writer.writerow([
+                batch_id,
+                key_archive.batches[batch_id].created,
+                base64.b64encode(key["key_data"].ljust(KEY_DATA_LENGTH, b"\x00")).decode('ascii'),
+                interval_number,
+                observed_count,
+            ])
+
+    print("Done.")
+
+
+if __name__ == '__main__':
+    flags.mark_flag_as_required("archive_path")
+    flags.mark_flag_as_required("observed_rpis_path")
+    app.run(main)
@@ -0,0 +1,73 @@
+import numpy as np
+
+from statistics import StatisticsData, COUNTER_NAMES, COUNTS_LENGTH, COUNTS_DTYPE, \
+    TRANSMISSION_RISK_LEVEL_RANGE, TRANSMISSION_RISK_LEVEL_OFFSET, REPORT_TYPE_RANGE, REPORT_TYPE_OFFSET, \
+    DAYS_SINCE_ONSET_OF_SYMPTOMS_RANGE, DAYS_SINCE_ONSET_OF_SYMPTOMS_OFFSET
+from validation import validate
+
+
+def hashed_groups(values):
+    """Returns (group_ids, group_count) where equal values share a group, numbered by first appearance."""
+    uniques, first_indices, inverse = np.unique(values, return_index=True, return_inverse=True)
+    order = np.argsort(first_indices, kind="stable")
+    rank = np.empty(len(uniques), dtype=np.int64)
+    rank[order] = np.arange(len(uniques))
+    return rank[inverse.reshape(-1)], len(uniques)
+
+
+def _count(group_ids, group_count, mask=None):
+    if mask is not None:
+        group_ids = group_ids[mask]
+    return np.bincount(group_ids, minlength=group_count)
+
+
+def _distribution(group_ids, group_count, values, value_range, mask):
+    # Values outside of the distribution are not counted.
+    bins = len(value_range)
+    values = values.astype(np.int64) - value_range.start
+    mask = mask & (values >= 0) & (values < bins)
+    return np.bincount(group_ids[mask] * bins + values[mask], minlength=group_count * bins) \
+        .reshape(group_count, bins)
+
+
+def statistics_key_table(created, table, group_ids, group_count):
+    """Computes one StatisticsData per group of `table`, in the order of the group ids.
+
+    Produces the same counters as _statistics_keys() in cocoa_diagnosis_keys.py; keys are validated by
+    the rules of validation.py.
+    """
+    counters = {
+        "key_count": _count(group_ids, group_count),
+        "has_not_report_type_count": _count(group_ids, group_count, ~table.has_report_type),
+        "has_not_days_since_onset_of_symptoms_count":
+            _count(group_ids, group_count, ~table.has_days_since_onset_of_symptoms),
+    }
+
+    counts = np.zeros((group_count, COUNTS_LENGTH), dtype=COUNTS_DTYPE)
+    for index, name in enumerate(COUNTER_NAMES):
+        if name in counters:
+            counts[:, index] = counters[name]
+
+    all_keys = np.ones(len(table), dtype=bool)
+    counts[:, TRANSMISSION_RISK_LEVEL_OFFSET:REPORT_TYPE_OFFSET] = _distribution(
+        group_ids, group_count, table.transmission_risk_level, TRANSMISSION_RISK_LEVEL_RANGE, all_keys)
+    counts[:, REPORT_TYPE_OFFSET:DAYS_SINCE_ONSET_OF_SYMPTOMS_OFFSET] = _distribution(
+        group_ids, group_count, table.report_type, REPORT_TYPE_RANGE, table.has_report_type)
+    counts[:, DAYS_SINCE_ONSET_OF_SYMPTOMS_OFFSET:COUNTS_LENGTH] = _distribution(
+        group_ids, group_count, table.days_since_onset_of_symptoms, DAYS_SINCE_ONSET_OF_SYMPTOMS_RANGE,
+        table.has_days_since_onset_of_symptoms)
+
+    # The first key of every group gives its rolling_start_interval_number.
+    _, first_indices = np.unique(group_ids, return_index=True)
+    rolling_start_interval_numbers = table.rolling_start_interval_number[first_indices].tolist()
+
+    statistics_list = []
+    for group in range(group_count):
+        statistics_data = StatisticsData(counts[group])
+        statistics_data.created = created
+        statistics_data.rolling_start_interval_number = rolling_start_interval_numbers[group]
+        statistics_list.append(statistics_data)
+
+    validate(table, group_ids, statistics_list)
+
+    return statistics_list
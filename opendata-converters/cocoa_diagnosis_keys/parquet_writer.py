@@ -0,0 +1,51 @@
+import numpy as np
+
+from statistics import CSV_HEADER, CSV_COUNT_INDICES, CSV_APPENDED_COUNT_INDICES, COUNTS_LENGTH, COUNTS_DTYPE, \
+    EN_INTERVAL_WINDOW
+
+TIMEZONE = "Asia/Tokyo"
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet output requires pyarrow. Run `pip install pyarrow`.") from e
+    return pyarrow, pyarrow.parquet
+
+
+def to_arrow_table(statistics_list):
+    """Converts StatisticsData into an Arrow table with the same columns as the CSV.
+
+    Counters are int64 and `rolling_start_interval_number_date` is a timestamp in JST.
+    """
+    pa, _ = _import_pyarrow()
+
+    counts = np.zeros((len(statistics_list), COUNTS_LENGTH), dtype=COUNTS_DTYPE)
+    for index, statistics_data in enumerate(statistics_list):
+        counts[index] = statistics_data.counts
+
+    created = np.array([statistics_data.created for statistics_data in statistics_list], dtype=np.int64)
+    rolling_start_interval_number = np.array(
+        [statistics_data.rolling_start_interval_number for statistics_data in statistics_list], dtype=np.int64)
+
+    columns = [
+        pa.array(created, type=pa.int64()),
+        pa.array(rolling_start_interval_number, type=pa.int64()),
+        pa.array(rolling_start_interval_number * EN_INTERVAL_WINDOW, type=pa.timestamp("s", tz=TIMEZONE)),
+    ]
+    for index in CSV_COUNT_INDICES.tolist():
+        columns.append(pa.array(counts[:, index], type=pa.int64()))
+    columns.append(pa.array([statistics_data.comment for statistics_data in statistics_list], type=pa.string()))
+    for index in CSV_APPENDED_COUNT_INDICES.tolist():
+        columns.append(pa.array(counts[:, index], type=pa.int64()))
+    columns.append(pa.array([statistics_data.first_seen_created for statistics_data in statistics_list],
+                            type=pa.int64()))
+
+    return pa.Table.from_arrays(columns, names=CSV_HEADER)
+
+
+def write_to_parquet(statistics_list, output_path):
+    _, pq = _import_pyarrow()
+    pq.write_table(to_arrow_table(statistics_list), output_path)
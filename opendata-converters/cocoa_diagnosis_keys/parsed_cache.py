@@ -0,0 +1,93 @@
+import os
+import threading
+import zipfile
+
+import numpy as np
+
+from key_table import KeyTable, KEY_DATA_DTYPE
+
+# Bump whenever the columns of KeyTable or their decoding change, so that older files are ignored.
+# Version 2 added the revised keys.
+SCHEMA_VERSION = 2
+
+DIRNAME_PARSED = "parsed"
+FILE_EXTENSION = ".npz"
+
+PREFIX_REVISED = "revised_"
+
+
+def _read_table(npz, prefix=""):
+    columns = {name: npz[prefix + name] for name in KeyTable.__slots__ if name != "irregular_key_data"}
+    irregular_indices = npz[prefix + "irregular_indices"].tolist()
+    irregular_offsets = npz[prefix + "irregular_offsets"].tolist()
+    irregular_bytes = npz[prefix + "irregular_bytes"].tobytes()
+
+    columns["key_data"] = columns["key_data"].astype(KEY_DATA_DTYPE, copy=False)
+    irregular_key_data = {
+        index: irregular_bytes[start:end]
+        for index, start, end in zip(irregular_indices, irregular_offsets[:-1], irregular_offsets[1:])}
+    return KeyTable(irregular_key_data=irregular_key_data, **columns)
+
+
+def _table_arrays(table, prefix=""):
+    irregular_indices = sorted(table.irregular_key_data)
+    irregular_key_data = [table.irregular_key_data[index] for index in irregular_indices]
+    irregular_offsets = np.cumsum([0] + [len(key_data) for key_data in irregular_key_data], dtype=np.int64)
+
+    arrays = {prefix + name: getattr(table, name) for name in KeyTable.__slots__ if name != "irregular_key_data"}
+    arrays[prefix + "irregular_indices"] = np.array(irregular_indices, dtype=np.int64)
+    arrays[prefix + "irregular_offsets"] = irregular_offsets
+    arrays[prefix + "irregular_bytes"] = np.frombuffer(b"".join(irregular_key_data), dtype=np.uint8)
+    return arrays
+
+
+class ParsedExportCache:
+    """Decoded KeyTables of export ZIPs, stored as `<sha256>.npz` by the SHA-256 of the ZIP.
+
+    A file holds the table of `keys` and the table of `revised_keys`, whose columns are prefixed with
+    `revised_`. A changed ZIP has another SHA-256, and a file of another SCHEMA_VERSION or that can not be
+    read is treated as missing, so a stale table is never used. Loading a table is a few array reads instead
+    of unzipping and decoding the protobuf. Files are written atomically, so concurrent processes can share it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def table_path(self, sha256):
+        return os.path.join(self.path, sha256 + FILE_EXTENSION)
+
+    def load_tables(self, sha256):
+        """Returns the KeyTables of `keys` and `revised_keys` of the ZIP with `sha256`, or None."""
+        try:
+            with np.load(self.table_path(sha256)) as npz:
+                if int(npz["schema_version"]) != SCHEMA_VERSION:
+                    return None
+                return _read_table(npz), _read_table(npz, PREFIX_REVISED)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+
+    def load(self, sha256):
+        """Returns the KeyTable of `keys` of the ZIP with `sha256`, or None."""
+        tables = self.load_tables(sha256)
+        return tables[0] if tables is not None else None
+
+    def store(self, sha256, table, revised_table=None):
+        if revised_table is None:
+            revised_table = KeyTable.from_keys([])
+
+        path = self.table_path(sha256)
+        tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(tmp_path, mode='wb') as fp:
+            np.savez(fp,
+                     schema_version=np.int64(SCHEMA_VERSION),
+                     **_table_arrays(table),
+                     **_table_arrays(revised_table, PREFIX_REVISED))
+        os.replace(tmp_path, path)
+
+    def retain(self, sha256s):
+        """Removes the tables of every ZIP not in `sha256s`."""
+        sha256s = set(sha256s)
+        for name in os.listdir(self.path):
+            if not name.endswith(FILE_EXTENSION) or name[:-len(FILE_EXTENSION)] not in sha256s:
+                os.remove(os.path.join(self.path, name))
@@ -0,0 +1,81 @@
+import contextlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+
+DEFAULT_DEPTH = 16
+
+_END = object()
+
+
+def _copy_result(future, source_future):
+    if source_future.exception() is not None:
+        future.set_exception(source_future.exception())
+    else:
+        future.set_result(source_future.result())
+
+
+def _submit_process(process_executor, process, processed_future, downloaded_future):
+    # Called by the download thread as soon as its item is downloaded.
+    if downloaded_future.exception() is not None:
+        processed_future.set_exception(downloaded_future.exception())
+        return
+
+    try:
+        future = process_executor.submit(process, downloaded_future.result())
+    except RuntimeError as e:
+        # The pipeline is being shut down.
+        processed_future.set_exception(e)
+        return
+    future.add_done_callback(partial(_copy_result, processed_future))
+
+
+def run_pipeline(items, download, process, download_workers, workers, depth=DEFAULT_DEPTH):
+    """Yields (download(item), process(download(item))) for every item, in the order of the items.
+
+    Items are downloaded by `download_workers` threads and processed by `workers` processes (0: by the
+    caller's thread when the result is taken), so downloading, processing and the consumer of the results
+    overlap. At most `depth` items are downloading, processing or waiting to be consumed, which bounds
+    memory regardless of the number of items. `process` must be picklable when `workers` > 0.
+    """
+    depth = max(depth, 1)
+
+    if workers > 0:
+        process_executor_context = ProcessPoolExecutor(max_workers=workers)
+    else:
+        process_executor_context = contextlib.nullcontext()
+
+    with ThreadPoolExecutor(max_workers=max(download_workers, 1)) as download_executor, \
+            process_executor_context as process_executor:
+        def start(item):
+            downloaded_future = download_executor.submit(download, item)
+            if process_executor is None:
+                return downloaded_future, None
+
+            processed_future = Future()
+            downloaded_future.add_done_callback(
+                partial(_submit_process, process_executor, process, processed_future))
+            return downloaded_future, processed_future
+
+        items = iter(items)
+        window = deque()
+
+        def fill():
+            while len(window) < depth:
+                item = next(items, _END)
+                if item is _END:
+                    return
+                window.append(start(item))
+
+        fill()
+        while window:
+            downloaded_future, processed_future = window.popleft()
+            downloaded = downloaded_future.result()
+            if processed_future is None:
+                processed = process(downloaded)
+            else:
+                processed = processed_future.result()
+
+            # Start the next item before handing this one over, so that the stages keep running meanwhile.
+            fill()
+            yield downloaded, processed
@@ -0,0 +1,61 @@
+import numpy as np
+
+from key_table import KeyTable
+from statistics import StatisticsData
+from validation import validate
+
+
+def _count_value(distribution, value):
+    # Values outside of the distribution are not counted, as in numpy_statistics._distribution().
+    if value in distribution.values:
+        distribution[value] += 1
+
+
+def _statistics_key(statistics_data, key):
+    # Validity is counted by validate() over every key of the batch at once.
+    statistics_data.key_count += 1
+
+    _count_value(statistics_data.transmission_risk_level_distribution, key.transmission_risk_level)
+
+    if key.report_type is not None:
+        _count_value(statistics_data.report_type_distribution, key.report_type)
+    else:
+        statistics_data.has_not_report_type_count += 1
+
+    if key.days_since_onset_of_symptoms is not None:
+        _count_value(statistics_data.days_since_onset_of_symptoms_distribution, key.days_since_onset_of_symptoms)
+    else:
+        statistics_data.has_not_days_since_onset_of_symptoms_count += 1
+
+
+def aggregate_keys(statistics_dict, created, keys, table=None):
+    """Counts TemporaryExposureKeys one by one into `statistics_dict`.
+
+    Single pass over keys in any order. `statistics_dict` maps (created, rolling_start_interval_number) to
+    StatisticsData, so memory depends on the number of groups and not on the number of keys.
+    `table` is the KeyTable of `keys` if the caller already has it.
+    """
+    keys = list(keys)
+    if table is None:
+        table = KeyTable.from_keys(keys)
+
+    group_ids = []
+    statistics_list = []
+    group_indices = {}
+    for key in keys:
+        group = (created, key.rolling_start_interval_number)
+        group_index = group_indices.get(group)
+        if group_index is None:
+            statistics_data = statistics_dict.get(group)
+            if statistics_data is None:
+                statistics_data = StatisticsData()
+                statistics_data.created = created
+                statistics_data.rolling_start_interval_number = key.rolling_start_interval_number
+                statistics_dict[group] = statistics_data
+            group_index = len(statistics_list)
+            group_indices[group] = group_index
+            statistics_list.append(statistics_data)
+        group_ids.append(group_index)
+        _statistics_key(statistics_list[group_index], key)
+
+    validate(table, np.array(group_ids, dtype=np.int64), statistics_list)
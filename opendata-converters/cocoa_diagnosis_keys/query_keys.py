@@ -0,0 +1,33 @@
+from absl import flags, app
+
+from key_query import KeyQuery, query_range
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string("archive_path", None, "Directory of the key archive written by cocoa_diagnosis_keys.py")
+flags.DEFINE_integer("from_rolling_start_interval_number", None, "Minimum rolling_start_interval_number (inclusive)")
+flags.DEFINE_integer("to_rolling_start_interval_number", None, "Maximum rolling_start_interval_number (inclusive)")
+flags.DEFINE_integer("from_created", None, "Minimum created of the batches (inclusive)")
+flags.DEFINE_integer("to_created", None, "Maximum created of the batches (inclusive)")
+flags.DEFINE_integer("batch_id", None, "Only keys of this batch")
+flags.DEFINE_string("group_by", "report_type", "Column to count keys by")
+
+
+def main(argv):
+    del argv  # Unused.
+
+    key_query = KeyQuery.open(FLAGS.archive_path)
+
+    rolling_start_interval_number_range = query_range(FLAGS.from_rolling_start_interval_number,
+                                                 FLAGS.to_rolling_start_interval_number)
+    created_range = query_range(FLAGS.from_created, FLAGS.to_created)
+
+    counts = key_query.count_by(FLAGS.group_by, rolling_start_interval_number_range, created_range, FLAGS.batch_id)
+
+    print("%s,key_count" % FLAGS.group_by)
+    for value in sorted(counts, key=lambda value: (value is not None, value)):
+        print("%s,%d" % ("" if value is None else value, counts[value]))
+
+
+if __name__ == '__main__':
+    flags.mark_flag_as_required("archive_path")
+    app.run(main)
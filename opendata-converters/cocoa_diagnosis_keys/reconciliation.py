@@ -0,0 +1,109 @@
+import numpy as np
+
+from key_archive import table_from_records, RECORD_DTYPE
+from key_index import key_prefix, search_keys, PREFIX_DTYPE
+from key_table import KEY_DATA_DTYPE
+
+# Columns a revised key replaces. rolling_start_interval_number stays the one of the original key, so a
+# revision changes the distributions of the group of the original key but not the groups.
+REVISED_COLUMNS = [
+    "transmission_risk_level",
+    "report_type",
+    "has_report_type",
+    "days_since_onset_of_symptoms",
+    "has_days_since_onset_of_symptoms",
+]
+
+
+class Reconciliation:
+    """Keys of the reconciled batches with their revisions applied.
+
+    `batches` is [(created, url, KeyTable)] in the order of `created`. `revised_key_count` is the number of
+    revised keys of the batches, `applied_key_count` the number of records a revision is applied to and
+    `unmatched_key_count` the number of revised keys whose key_data is not in any batch.
+    """
+    __slots__ = ("batches", "revised_key_count", "applied_key_count", "unmatched_key_count")
+
+    def __init__(self, batches, revised_key_count, applied_key_count, unmatched_key_count):
+        self.batches = batches
+        self.revised_key_count = revised_key_count
+        self.applied_key_count = applied_key_count
+        self.unmatched_key_count = unmatched_key_count
+
+
+def _sorted_order(key_data):
+    # Order of key_data by its bytes, with equal keys in the order of their positions. The first 8 bytes of keys are random, so sorting them as integers orders
+    # almost every key; only the keys sharing their first 8 bytes are sorted again by every byte.
+    words = np.ascontiguousarray(key_data, dtype=KEY_DATA_DTYPE).view(">u8").astype(PREFIX_DTYPE)
+    prefix = words[::2]
+    order = np.argsort(prefix)
+
+    sorted_prefix = prefix[order]
+    ties = np.flatnonzero(sorted_prefix[1:] == sorted_prefix[:-1])
+    if len(ties) > 0:
+        # Runs of an equal prefix are contiguous, so sorting the union of the runs keeps every run in place.
+        tied = np.union1d(ties, ties + 1)
+        tied_order = order[tied]
+        order[tied] = tied_order[np.lexsort((tied_order, words[1::2][tied_order], prefix[tied_order]))]
+    return order
+
+
+def reconcile(key_archive, batch_ids):
+    """Applies the `revised_keys` of archived batches to the keys they revise, in one pass.
+
+    Every key_data of the batches of `batch_ids` is indexed to its records, in the order of `created`.
+    Revised keys are looked up in the index and replace the REVISED_COLUMNS of every record of the key,
+    including the ones published again in later batches; when a key is revised more than once, the revision
+    of the latest batch is applied.
+    """
+    batch_records = sorted((key_archive.batches[batch_id] for batch_id in batch_ids),
+                           key=lambda batch_record: (batch_record.created, batch_record.batch_id))
+
+    # Copies of the memory-mapped records, which are modified.
+    records = np.concatenate([np.zeros(0, dtype=RECORD_DTYPE)] + [
+        key_archive.batch_keys(batch_record.batch_id) for batch_record in batch_records])
+    revised_records = np.concatenate([np.zeros(0, dtype=RECORD_DTYPE)] + [
+        key_archive.batch_revised_keys(batch_record.batch_id) for batch_record in batch_records])
+
+    applied_key_count = 0
+    found = np.zeros(len(revised_records), dtype=bool)
+    if len(records) > 0 and len(revised_records) > 0:
+        order = _sorted_order(records["key_data"])
+        sorted_key_data = records["key_data"][order]
+        # Runs of the records of every key_data in the sorted order.
+        is_first = np.ones(len(order), dtype=bool)
+        is_first[1:] = sorted_key_data[1:] != sorted_key_data[:-1]
+        index_key_data = sorted_key_data[is_first]
+        run_starts = np.flatnonzero(is_first)
+        run_lengths = np.diff(np.append(run_starts, len(order)))
+
+        revised_key_data = np.ascontiguousarray(revised_records["key_data"])
+        positions, found = search_keys(index_key_data, key_prefix(index_key_data),
+                                       revised_key_data, key_prefix(revised_key_data))
+
+        # Revised records are in the order of batches, so the last revision of every key wins.
+        keys = positions[found]
+        revisions = np.flatnonzero(found)
+        _, reversed_first = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - reversed_first
+        keys = keys[last]
+        revisions = revisions[last]
+
+        # The revision applies to every record of the key, as a key can be published again in later batches.
+        lengths = run_lengths[keys]
+        run_offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        targets = order[np.repeat(run_starts[keys], lengths) + np.arange(len(run_offsets)) - run_offsets]
+        revisions = np.repeat(revisions, lengths)
+
+        for name in REVISED_COLUMNS:
+            records[name][targets] = revised_records[name][revisions]
+        applied_key_count = len(targets)
+
+    batches = []
+    offset = 0
+    for batch_record in batch_records:
+        batch_records_slice = records[offset:offset + batch_record.key_count]
+        batches.append((batch_record.created, batch_record.url, table_from_records(batch_records_slice)))
+        offset += batch_record.key_count
+
+    return Reconciliation(batches, len(revised_records), applied_key_count, int((~found).sum()))
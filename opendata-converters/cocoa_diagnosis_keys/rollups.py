@@ -0,0 +1,88 @@
+import csv
+import datetime
+import os
+
+import numpy as np
+
+from statistics import CSV_HEADER, CSV_COUNT_INDICES, CSV_APPENDED_COUNTER_NAMES, CSV_APPENDED_COUNT_INDICES, \
+    COUNTS_LENGTH, COUNTS_DTYPE, EN_INTERVAL_WINDOW, JST
+
+ROLLUP_CREATED = "created"
+ROLLUP_DAY = "day"
+ROLLUP_WEEK = "week"
+ROLLUP_OVERALL = "overall"
+
+# File name and key columns of every rollup.
+ROLLUPS = {
+    ROLLUP_CREATED: ("by_created.csv", ["created"]),
+    ROLLUP_DAY: ("by_rolling_start_date.csv", ["rolling_start_date"]),
+    ROLLUP_WEEK: ("by_rolling_start_iso_week.csv", ["rolling_start_iso_week"]),
+    ROLLUP_OVERALL: ("overall.csv", []),
+}
+
+# Columns of counts, the same as the ones of the statistics CSV and in the same order.
+COUNT_INDICES = np.concatenate([CSV_COUNT_INDICES, CSV_APPENDED_COUNT_INDICES])
+COUNT_HEADER = CSV_HEADER[3:3 + len(CSV_COUNT_INDICES)] + CSV_APPENDED_COUNTER_NAMES
+
+
+def _rolling_start_keys(rolling_start_interval_number):
+    # Calendar day and ISO week (JST) of a rolling start.
+    date = datetime.datetime.fromtimestamp(rolling_start_interval_number * EN_INTERVAL_WINDOW, JST).date()
+    year, week, _ = date.isocalendar()
+    return (date.isoformat(),), ("%04d-W%02d" % (year, week),)
+
+
+class Rollups:
+    """Totals of counts of StatisticsData per `created`, per JST day and ISO week of the rolling start, and overall.
+
+    Partial statistics of any grain down to (created, rolling_start_interval_number) are added as they are
+    produced, so the rollups come from the same pass as the statistics without reading the keys again.
+    Counts are sums, so `first_seen_created` and `comment` are not rolled up.
+    """
+
+    def __init__(self):
+        self.cubes = {name: {} for name in ROLLUPS}
+        self._rolling_start_keys = {}
+
+    def _add(self, name, key, counts):
+        cube = self.cubes[name]
+        cube_counts = cube.get(key)
+        if cube_counts is None:
+            cube[key] = counts.astype(COUNTS_DTYPE, copy=True)
+        else:
+            cube_counts += counts
+
+    def add(self, statistics_list):
+        for statistics_data in statistics_list:
+            rolling_start_interval_number = statistics_data.rolling_start_interval_number
+            rolling_start_keys = self._rolling_start_keys.get(rolling_start_interval_number)
+            if rolling_start_keys is None:
+                rolling_start_keys = _rolling_start_keys(rolling_start_interval_number)
+                self._rolling_start_keys[rolling_start_interval_number] = rolling_start_keys
+            day_key, week_key = rolling_start_keys
+
+            counts = statistics_data.counts
+            self._add(ROLLUP_CREATED, (statistics_data.created,), counts)
+            self._add(ROLLUP_DAY, day_key, counts)
+            self._add(ROLLUP_WEEK, week_key, counts)
+            self._add(ROLLUP_OVERALL, (), counts)
+
+    def write(self, path):
+        """Writes a CSV per rollup to directory `path`, newest first. Returns the paths of the files."""
+        os.makedirs(path, exist_ok=True)
+
+        file_paths = []
+        for name, (file_name, key_columns) in ROLLUPS.items():
+            cube = self.cubes[name]
+            if name == ROLLUP_OVERALL and len(cube) == 0:
+                cube = {(): np.zeros(COUNTS_LENGTH, dtype=COUNTS_DTYPE)}
+
+            file_path = os.path.join(path, file_name)
+            with open(file_path, mode='w') as fp:
+                writer = csv.writer(fp)
+                writer.writerow(key_columns + COUNT_HEADER)
+                for key in sorted(cube, reverse=True):
+                    writer.writerow(list(key) + cube[key][COUNT_INDICES].tolist())
+            file_paths.append(file_path)
+
+        return file_paths
@@ -0,0 +1,92 @@
+import base64
+import json
+import os
+
+from statistics import StatisticsData
+
+STATE_VERSION = 5
+
+
+class BatchState:
+    url = None
+    created = -1
+    statistics_list = None
+
+    def __init__(self, url, created, statistics_list):
+        self.url = url
+        self.created = created
+        self.statistics_list = statistics_list
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "created": self.created,
+            "statistics": base64.b64encode(StatisticsData.list_to_bytes(self.statistics_list)).decode('ascii'),
+        }
+
+    @staticmethod
+    def from_dict(dict_obj):
+        statistics_list = StatisticsData.list_from_bytes(base64.b64decode(dict_obj["statistics"]))
+        # States written before have the SHA-256 of the batch too, which is not needed: known batches are
+        # not downloaded again, so it could not be compared with anything.
+        return BatchState(dict_obj["url"], dict_obj["created"], statistics_list)
+
+
+class StateStore:
+    """Persisted per-batch partial statistics, so that a run only processes batches it has not seen before.
+
+    A batch is identified by its URL and `created`. The state of batches that disappeared from the
+    diagnosis-keys list is dropped by `retain()`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._batches = {}
+
+    @staticmethod
+    def load(path):
+        state_store = StateStore(path)
+        if not os.path.exists(path):
+            return state_store
+
+        with open(path, mode='r') as fp:
+            json_obj = json.load(fp)
+
+        if json_obj.get("version") != STATE_VERSION:
+            print("State %s has version %s, ignored." % (path, json_obj.get("version")))
+            return state_store
+
+        for batch_obj in json_obj["batches"]:
+            batch_state = BatchState.from_dict(batch_obj)
+            state_store._batches[batch_state.url] = batch_state
+        return state_store
+
+    def get(self, url, created):
+        batch_state = self._batches.get(url)
+        if batch_state is None or batch_state.created != created:
+            return None
+        return batch_state
+
+    def put(self, batch_state):
+        self._batches[batch_state.url] = batch_state
+
+    def retain(self, urls):
+        urls = set(urls)
+        for url in list(self._batches.keys()):
+            if url not in urls:
+                del self._batches[url]
+
+    def save(self):
+        dir = os.path.dirname(self.path)
+        if dir:
+            os.makedirs(dir, exist_ok=True)
+
+        json_obj = {
+            "version": STATE_VERSION,
+            "batches": [batch_state.to_dict() for batch_state in self._batches.values()],
+        }
+
+        tmp_path = "%s.tmp" % self.path
+        with open(tmp_path, mode='w') as fp:
+            json.dump(json_obj, fp)
+        os.replace(tmp_path, self.path)
@@ -1,4 +1,7 @@
 import datetime
+import struct
+
+import numpy as np
 
 # RFC3339
 FORMAT_RFC3339 = "%Y-%m-%dT%H:%M:%S.%f%z"
@@ -13,40 +16,205 @@ def _rolling_start_interval_number_to_date(rolling_start_interval_number):
     return datetime.datetime.fromtimestamp(epoch).astimezone(JST)
 
 
+# Layout of StatisticsData.counts
+COUNTER_NAMES = [
+    "key_count",
+    "valid_key_count",
+    "invalid_key_data_count",
+    "invalid_transmission_risk_level_key_count",
+    "invalid_report_type_key_count",
+    "invalid_days_since_onset_of_symptoms_key_count",
+    "has_not_report_type_count",
+    "has_not_days_since_onset_of_symptoms_count",
+    "duplicate_key_count",
+]
+# Values counted in the distributions; other values are only counted as invalid keys.
+TRANSMISSION_RISK_LEVEL_RANGE = range(0, 7 + 1)
+# ENDiagnosisReportType ends with revoked (5). Other values are dropped by export_reader like by protobuf,
+# so they are counted as keys without a report_type.
+REPORT_TYPE_RANGE = range(0, 5 + 1)
+DAYS_SINCE_ONSET_OF_SYMPTOMS_RANGE = range(-14, 14 + 1)
+
+TRANSMISSION_RISK_LEVEL_OFFSET = len(COUNTER_NAMES)
+REPORT_TYPE_OFFSET = TRANSMISSION_RISK_LEVEL_OFFSET + len(TRANSMISSION_RISK_LEVEL_RANGE)
+DAYS_SINCE_ONSET_OF_SYMPTOMS_OFFSET = REPORT_TYPE_OFFSET + len(REPORT_TYPE_RANGE)
+COUNTS_LENGTH = DAYS_SINCE_ONSET_OF_SYMPTOMS_OFFSET + len(DAYS_SINCE_ONSET_OF_SYMPTOMS_RANGE)
+
+COUNTS_DTYPE = np.dtype("<i8")
+
+# Counters added after the original columns of the CSV. They are written after `comment`, in this order,
+# so that the original columns keep their positions for readers of latest.csv.
+CSV_APPENDED_COUNTER_NAMES = [
+    "duplicate_key_count",
+]
+
+# Indices of counts written to CSV: the original counters, transmission_risk_level 0-6, report_type 0-5 and
+# days_since_onset_of_symptoms -14 to +14.
+CSV_COUNT_INDICES = np.concatenate([
+    np.arange(0, len(COUNTER_NAMES) - len(CSV_APPENDED_COUNTER_NAMES)),
+    np.arange(TRANSMISSION_RISK_LEVEL_OFFSET, TRANSMISSION_RISK_LEVEL_OFFSET + 7),
+    np.arange(REPORT_TYPE_OFFSET, REPORT_TYPE_OFFSET + len(REPORT_TYPE_RANGE)),
+    np.arange(DAYS_SINCE_ONSET_OF_SYMPTOMS_OFFSET, COUNTS_LENGTH),
+])
+CSV_APPENDED_COUNT_INDICES = np.array([COUNTER_NAMES.index(name) for name in CSV_APPENDED_COUNTER_NAMES])
+
+CSV_HEADER = [
+    "created",
+    "rolling_start_interval_number",
+    "rolling_start_interval_number_date",
+    "key_count",
+    "valid_key_count",
+    "invalid_key_data_count",
+    "invalid_transmission_risk_level_key_count",
+    "invalid_report_type_key_count",
+    "invalid_days_since_onset_of_symptoms_key_count",
+    "has_not_report_type_count",
+    "has_not_days_since_onset_of_symptoms_count",
+    "transmission_risk_level_unused_count",
+    "transmission_risk_level_low_count",
+    "transmission_risk_level_standard_count",
+    "transmission_risk_level_high_count",
+    "transmission_risk_level_confirmed_clinical_diagnosis_count",
+    "transmission_risk_level_negative_case_count",
+    "transmission_risk_level_recursive_case_count",
+    "report_type_unknown_count",
+    "report_type_confirmed_test_count",
+    "report_type_confirmed_clinical_diagnosis_count",
+    "report_type_self_reported_count",
+    "report_type_recursive_count",
+    "report_type_revoked_count",
+    "days_since_onset_of_symptoms_-14_count",
+    "days_since_onset_of_symptoms_-13_count",
+    "days_since_onset_of_symptoms_-12_count",
+    "days_since_onset_of_symptoms_-11_count",
+    "days_since_onset_of_symptoms_-10_count",
+    "days_since_onset_of_symptoms_-9_count",
+    "days_since_onset_of_symptoms_-8_count",
+    "days_since_onset_of_symptoms_-7_count",
+    "days_since_onset_of_symptoms_-6_count",
+    "days_since_onset_of_symptoms_-5_count",
+    "days_since_onset_of_symptoms_-4_count",
+    "days_since_onset_of_symptoms_-3_count",
+    "days_since_onset_of_symptoms_-2_count",
+    "days_since_onset_of_symptoms_-1_count",
+    "days_since_onset_of_symptoms_0_count",
+    "days_since_onset_of_symptoms_+1_count",
+    "days_since_onset_of_symptoms_+2_count",
+    "days_since_onset_of_symptoms_+3_count",
+    "days_since_onset_of_symptoms_+4_count",
+    "days_since_onset_of_symptoms_+5_count",
+    "days_since_onset_of_symptoms_+6_count",
+    "days_since_onset_of_symptoms_+7_count",
+    "days_since_onset_of_symptoms_+8_count",
+    "days_since_onset_of_symptoms_+9_count",
+    "days_since_onset_of_symptoms_+10_count",
+    "days_since_onset_of_symptoms_+11_count",
+    "days_since_onset_of_symptoms_+12_count",
+    "days_since_onset_of_symptoms_+13_count",
+    "days_since_onset_of_symptoms_+14_count",
+    "comment",
+] + CSV_APPENDED_COUNTER_NAMES + [
+    "first_seen_created",
+]
+
+# created, rolling_start_interval_number, first_seen_created and the length of comment in bytes
+BYTES_HEADER = struct.Struct("<qqqI")
+
+FIRST_SEEN_CREATED_UNKNOWN = -1
+
+# comment holds messages of the first invalid keys of a group.
+MAX_COMMENT_EXAMPLES = 3
+COMMENT_SEPARATOR = "|"
+
+
+class Distribution:
+    """Histogram indexed by value, backed by a slice of StatisticsData.counts."""
+    __slots__ = ("values", "counts")
+
+    def __init__(self, values, counts):
+        self.values = values
+        self.counts = counts
+
+    def _index(self, value):
+        if value not in self.values:
+            raise KeyError(value)
+        return value - self.values.start
+
+    def __getitem__(self, value):
+        return int(self.counts[self._index(value)])
+
+    def __setitem__(self, value, count):
+        self.counts[self._index(value)] = count
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def keys(self):
+        return self.values
+
+    def items(self):
+        return zip(self.values, self.counts.tolist())
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+def _counter(index):
+    def getter(self):
+        return int(self.counts[index])
+
+    def setter(self, value):
+        self.counts[index] = value
+
+    return property(getter, setter)
+
+
 class StatisticsData:
-    created = -1
-    rolling_start_interval_number = -1
-    key_count = 0
-    valid_key_count = 0
-    invalid_key_data_count = 0
-    invalid_transmission_risk_level_key_count = 0
-    invalid_report_type_key_count = 0
-    invalid_days_since_onset_of_symptoms_key_count = 0
-    has_not_report_type_count = 0
-    has_not_days_since_onset_of_symptoms_count = 0
-    transmission_risk_level_distribution = {}
-    report_type_distribution = {}
-    days_since_onset_of_symptoms_distribution = {}
-    comment = ""
-
-    def __init__(self):
-        self.key_count = 0
-        self.valid_key_count = 0
-        self.invalid_key_data_count = 0
-        self.invalid_transmission_risk_level_key_count = 0
-        self.invalid_report_type_key_count = 0
-        self.invalid_days_since_onset_of_symptoms_key_count = 0
-        self.transmission_risk_level_distribution = {}
-        for level in range(7 + 1):
-            self.transmission_risk_level_distribution[level] = 0
-
-        self.report_type_distribution = {}
-        for type in range(6 + 1):
-            self.report_type_distribution[type] = 0
-
-        self.days_since_onset_of_symptoms_distribution = {}
-        for day in range(-14, 14 + 1):
-            self.days_since_onset_of_symptoms_distribution[day] = 0
+    __slots__ = (
+        "created",
+        "rolling_start_interval_number",
+        "counts",
+        "transmission_risk_level_distribution",
+        "report_type_distribution",
+        "days_since_onset_of_symptoms_distribution",
+        "first_seen_created",
+        "comment",
+    )
+
+    key_count = _counter(0)
+    valid_key_count = _counter(1)
+    invalid_key_data_count = _counter(2)
+    invalid_transmission_risk_level_key_count = _counter(3)
+    invalid_report_type_key_count = _counter(4)
+    invalid_days_since_onset_of_symptoms_key_count = _counter(5)
+    has_not_report_type_count = _counter(6)
+    has_not_days_since_onset_of_symptoms_count = _counter(7)
+    duplicate_key_count = _counter(8)
+
+    def __init__(self, counts=None):
+        self.created = -1
+        self.rolling_start_interval_number = -1
+
+        if counts is None:
+            counts = np.zeros(COUNTS_LENGTH, dtype=COUNTS_DTYPE)
+        assert len(counts) == COUNTS_LENGTH, "counts length %d is invalid." % len(counts)
+        self.counts = counts
+
+        self.transmission_risk_level_distribution = Distribution(
+            TRANSMISSION_RISK_LEVEL_RANGE,
+            counts[TRANSMISSION_RISK_LEVEL_OFFSET:REPORT_TYPE_OFFSET])
+        self.report_type_distribution = Distribution(
+            REPORT_TYPE_RANGE,
+            counts[REPORT_TYPE_OFFSET:DAYS_SINCE_ONSET_OF_SYMPTOMS_OFFSET])
+        self.days_since_onset_of_symptoms_distribution = Distribution(
+            DAYS_SINCE_ONSET_OF_SYMPTOMS_RANGE,
+            counts[DAYS_SINCE_ONSET_OF_SYMPTOMS_OFFSET:COUNTS_LENGTH])
+
+        # The earliest `created` any key of this group was first seen in.
+        self.first_seen_created = FIRST_SEEN_CREATED_UNKNOWN
 
         self.comment = ""
 
@@ -63,9 +231,11 @@ class StatisticsData:
                "invalid_days_since_onset_of_symptoms_key_count: %d, \n" \
                "has_not_report_type_count: %d, \n" \
                "has_not_days_since_onset_of_symptoms_count: %d, \n" \
+               "duplicate_key_count: %d, \n" \
                "transmission_risk_level_distribution: %s, \n" \
                "report_type_distribution: %s, \n" \
                "days_since_onset_of_symptoms_distribution: %s, \n" \
+               "first_seen_created: %d, \n" \
                "comment: %s, \n" \
                ")" % (self.created,
                       self.rolling_start_interval_number,
@@ -78,12 +248,100 @@ class StatisticsData:
                       self.invalid_report_type_key_count,
                       self.invalid_days_since_onset_of_symptoms_key_count,
                       self.has_not_report_type_count, self.has_not_days_since_onset_of_symptoms_count,
+                      self.duplicate_key_count,
                       self.transmission_risk_level_distribution,
                       self.report_type_distribution,
                       self.days_since_onset_of_symptoms_distribution,
+                      self.first_seen_created,
                       self.comment,
                       )
 
+    def merge(self, other):
+        """Adds the counts of `other`, which must be a partial aggregate of the same group, to this instance."""
+        assert self.created == other.created, "created %d != %d" % (self.created, other.created)
+        assert self.rolling_start_interval_number == other.rolling_start_interval_number, \
+            "rolling_start_interval_number %d != %d" % (self.rolling_start_interval_number,
+                                                        other.rolling_start_interval_number)
+
+        self.counts += other.counts
+
+        if other.first_seen_created != FIRST_SEEN_CREATED_UNKNOWN and (
+                self.first_seen_created == FIRST_SEEN_CREATED_UNKNOWN
+                or other.first_seen_created < self.first_seen_created):
+            self.first_seen_created = other.first_seen_created
+
+        # Partials are merged in the order of their keys, so the first examples are kept.
+        if other.comment:
+            self.add_comment_examples(other.comment.split(COMMENT_SEPARATOR))
+
+        return self
+
+    def add_comment_examples(self, messages):
+        """Appends messages of invalid keys to comment, keeping at most MAX_COMMENT_EXAMPLES of them."""
+        examples = self.comment.split(COMMENT_SEPARATOR) if self.comment else []
+        room = MAX_COMMENT_EXAMPLES - len(examples)
+        if room > 0:
+            self.comment = COMMENT_SEPARATOR.join(examples + list(messages[:room]))
+
+    def copy(self):
+        statistics_data = StatisticsData(self.counts.copy())
+        statistics_data.created = self.created
+        statistics_data.rolling_start_interval_number = self.rolling_start_interval_number
+        statistics_data.first_seen_created = self.first_seen_created
+        statistics_data.comment = self.comment
+        return statistics_data
+
+    def __add__(self, other):
+        return self.copy().merge(other)
+
+    def to_bytes(self):
+        comment = self.comment.encode('utf-8')
+        return BYTES_HEADER.pack(self.created, self.rolling_start_interval_number, self.first_seen_created,
+                                 len(comment)) \
+            + self.counts.astype(COUNTS_DTYPE, copy=False).tobytes() \
+            + comment
+
+    @staticmethod
+    def from_bytes(buffer, offset=0):
+        """Returns (StatisticsData, next offset) decoded from `buffer` at `offset`."""
+        created, rolling_start_interval_number, first_seen_created, comment_length = \
+            BYTES_HEADER.unpack_from(buffer, offset)
+        offset += BYTES_HEADER.size
+
+        counts = np.frombuffer(buffer, dtype=COUNTS_DTYPE, count=COUNTS_LENGTH, offset=offset).copy()
+        offset += COUNTS_LENGTH * COUNTS_DTYPE.itemsize
+
+        statistics_data = StatisticsData(counts)
+        statistics_data.created = created
+        statistics_data.rolling_start_interval_number = rolling_start_interval_number
+        statistics_data.first_seen_created = first_seen_created
+        statistics_data.comment = bytes(buffer[offset:offset + comment_length]).decode('utf-8')
+        offset += comment_length
+
+        return statistics_data, offset
+
+    @staticmethod
+    def list_to_bytes(statistics_list):
+        return b"".join([statistics_data.to_bytes() for statistics_data in statistics_list])
+
+    @staticmethod
+    def list_from_bytes(buffer):
+        statistics_list = []
+        offset = 0
+        while offset < len(buffer):
+            statistics_data, offset = StatisticsData.from_bytes(buffer, offset)
+            statistics_list.append(statistics_data)
+        return statistics_list
+
+    def __getstate__(self):
+        # Compact pickling for process pools
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        statistics_data, _ = StatisticsData.from_bytes(state)
+        for name in StatisticsData.__slots__:
+            setattr(self, name, getattr(statistics_data, name))
+
     @staticmethod
     def compare(l, r):
         if l.created < r.created:
@@ -100,117 +358,17 @@ class StatisticsData:
 
     @staticmethod
     def write_header_to_csv(csv_writer):
-        csv_writer.writerow([
-            "created",
-            "rolling_start_interval_number",
-            "rolling_start_interval_number_date",
-            "key_count",
-            "valid_key_count",
-            "invalid_key_data_count",
-            "invalid_transmission_risk_level_key_count",
-            "invalid_report_type_key_count",
-            "invalid_days_since_onset_of_symptoms_key_count",
-            "has_not_report_type_count",
-            "has_not_days_since_onset_of_symptoms_count",
-            "transmission_risk_level_unused_count",
-            "transmission_risk_level_low_count",
-            "transmission_risk_level_standard_count",
-            "transmission_risk_level_high_count",
-            "transmission_risk_level_confirmed_clinical_diagnosis_count",
-            "transmission_risk_level_negative_case_count",
-            "transmission_risk_level_recursive_case_count",
-            "report_type_unknown_count",
-            "report_type_confirmed_test_count",
-            "report_type_confirmed_clinical_diagnosis_count",
-            "report_type_self_reported_count",
-            "report_type_recursive_count",
-            "report_type_revoked_count",
-            "days_since_onset_of_symptoms_-14_count",
-            "days_since_onset_of_symptoms_-13_count",
-            "days_since_onset_of_symptoms_-12_count",
-            "days_since_onset_of_symptoms_-11_count",
-            "days_since_onset_of_symptoms_-10_count",
-            "days_since_onset_of_symptoms_-9_count",
-            "days_since_onset_of_symptoms_-8_count",
-            "days_since_onset_of_symptoms_-7_count",
-            "days_since_onset_of_symptoms_-6_count",
-            "days_since_onset_of_symptoms_-5_count",
-            "days_since_onset_of_symptoms_-4_count",
-            "days_since_onset_of_symptoms_-3_count",
-            "days_since_onset_of_symptoms_-2_count",
-            "days_since_onset_of_symptoms_-1_count",
-            "days_since_onset_of_symptoms_0_count",
-            "days_since_onset_of_symptoms_+1_count",
-            "days_since_onset_of_symptoms_+2_count",
-            "days_since_onset_of_symptoms_+3_count",
-            "days_since_onset_of_symptoms_+4_count",
-            "days_since_onset_of_symptoms_+5_count",
-            "days_since_onset_of_symptoms_+6_count",
-            "days_since_onset_of_symptoms_+7_count",
-            "days_since_onset_of_symptoms_+8_count",
-            "days_since_onset_of_symptoms_+9_count",
-            "days_since_onset_of_symptoms_+10_count",
-            "days_since_onset_of_symptoms_+11_count",
-            "days_since_onset_of_symptoms_+12_count",
-            "days_since_onset_of_symptoms_+13_count",
-            "days_since_onset_of_symptoms_+14_count",
-            "comment",
-        ])
+        csv_writer.writerow(CSV_HEADER)
 
     def write_to_csv(self, csv_writer):
-        csv_writer.writerow([
-            self.created,
-            self.rolling_start_interval_number,
-            _rolling_start_interval_number_to_date(self.rolling_start_interval_number).strftime(FORMAT_RFC3339),
-            self.key_count,
-            self.valid_key_count,
-            self.invalid_key_data_count,
-            self.invalid_transmission_risk_level_key_count,
-            self.invalid_report_type_key_count,
-            self.invalid_days_since_onset_of_symptoms_key_count,
-            self.has_not_report_type_count,
-            self.has_not_days_since_onset_of_symptoms_count,
-            self.transmission_risk_level_distribution[0],
-            self.transmission_risk_level_distribution[1],
-            self.transmission_risk_level_distribution[2],
-            self.transmission_risk_level_distribution[3],
-            self.transmission_risk_level_distribution[4],
-            self.transmission_risk_level_distribution[5],
-            self.transmission_risk_level_distribution[6],
-            self.report_type_distribution[0],
-            self.report_type_distribution[1],
-            self.report_type_distribution[2],
-            self.report_type_distribution[3],
-            self.report_type_distribution[4],
-            self.report_type_distribution[5],
-            self.days_since_onset_of_symptoms_distribution[-14],
-            self.days_since_onset_of_symptoms_distribution[-13],
-            self.days_since_onset_of_symptoms_distribution[-12],
-            self.days_since_onset_of_symptoms_distribution[-11],
-            self.days_since_onset_of_symptoms_distribution[-10],
-            self.days_since_onset_of_symptoms_distribution[-9],
-            self.days_since_onset_of_symptoms_distribution[-8],
-            self.days_since_onset_of_symptoms_distribution[-7],
-            self.days_since_onset_of_symptoms_distribution[-6],
-            self.days_since_onset_of_symptoms_distribution[-5],
-            self.days_since_onset_of_symptoms_distribution[-4],
-            self.days_since_onset_of_symptoms_distribution[-3],
-            self.days_since_onset_of_symptoms_distribution[-2],
-            self.days_since_onset_of_symptoms_distribution[-1],
-            self.days_since_onset_of_symptoms_distribution[0],
-            self.days_since_onset_of_symptoms_distribution[+1],
-            self.days_since_onset_of_symptoms_distribution[+2],
-            self.days_since_onset_of_symptoms_distribution[+3],
-            self.days_since_onset_of_symptoms_distribution[+4],
-            self.days_since_onset_of_symptoms_distribution[+5],
-            self.days_since_onset_of_symptoms_distribution[+6],
-            self.days_since_onset_of_symptoms_distribution[+7],
-            self.days_since_onset_of_symptoms_distribution[+8],
-            self.days_since_onset_of_symptoms_distribution[+9],
-            self.days_since_onset_of_symptoms_distribution[+10],
-            self.days_since_onset_of_symptoms_distribution[+11],
-            self.days_since_onset_of_symptoms_distribution[+12],
-            self.days_since_onset_of_symptoms_distribution[+13],
-            self.days_since_onset_of_symptoms_distribution[+14],
-            self.comment,
-        ])
+        csv_writer.writerow(
+            [
+                self.created,
+                self.rolling_start_interval_number,
+                _rolling_start_interval_number_to_date(self.rolling_start_interval_number).strftime(FORMAT_RFC3339),
+            ]
+            + self.counts[CSV_COUNT_INDICES].tolist()
+            + [self.comment]
+            + self.counts[CSV_APPENDED_COUNT_INDICES].tolist()
+            + [self.first_seen_created]
+        )
@@ -0,0 +1,80 @@
+import csv
+import io
+import os
+from functools import cmp_to_key
+
+from statistics import StatisticsData
+
+ENCODING = "utf-8"
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class StreamingCsvWriter:
+    """Writes the CSV of statistics a `created` at a time, without keeping every group in memory.
+
+    Partial statistics must be added in ascending order of `created`. Once every batch of a `created`
+    has been added, its rows are sorted and written to a spool file next to the output. `close()` copies
+    the spooled generations in reverse, so the output is in the order of StatisticsData.compare() like
+    the CSV written from a whole list.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.spool_path = "%s.spool" % output_path
+        self._spool = open(self.spool_path, mode='w+b')
+        self._generations = []  # [(offset, length)]
+        self._created = None
+        self._statistics_dict = {}
+        self.row_count = 0
+
+    def _flush(self):
+        if len(self._statistics_dict) == 0:
+            return
+
+        statistics_list = sorted(self._statistics_dict.values(), key=cmp_to_key(StatisticsData.compare))
+        string_io = io.StringIO()
+        writer = csv.writer(string_io)
+        for statistics_data in statistics_list:
+            statistics_data.write_to_csv(writer)
+        data = string_io.getvalue().encode(ENCODING)
+
+        self._generations.append((self._spool.tell(), len(data)))
+        self._spool.write(data)
+        self.row_count += len(statistics_list)
+        self._statistics_dict = {}
+
+    def add(self, partial_statistics_list):
+        for partial_statistics_data in partial_statistics_list:
+            created = partial_statistics_data.created
+            if created != self._created:
+                assert self._created is None or created > self._created, \
+                    "created %d is added after %d." % (created, self._created)
+                self._flush()
+                self._created = created
+
+            group = partial_statistics_data.rolling_start_interval_number
+            statistics_data = self._statistics_dict.get(group)
+            if statistics_data is None:
+                statistics_data = StatisticsData()
+                statistics_data.created = created
+                statistics_data.rolling_start_interval_number = group
+                self._statistics_dict[group] = statistics_data
+            statistics_data.merge(partial_statistics_data)
+
+    def close(self):
+        self._flush()
+
+        with open(self.output_path, mode='wb') as fp:
+            string_io = io.StringIO()
+            StatisticsData.write_header_to_csv(csv.writer(string_io))
+            fp.write(string_io.getvalue().encode(ENCODING))
+
+            for offset, length in reversed(self._generations):
+                self._spool.seek(offset)
+                while length > 0:
+                    chunk = self._spool.read(min(length, COPY_CHUNK_SIZE))
+                    fp.write(chunk)
+                    length -= len(chunk)
+
+        self._spool.close()
+        os.remove(self.spool_path)
@@ -0,0 +1,108 @@
+import base64
+
+import numpy as np
+
+from key_table import KEY_DATA_LENGTH
+from statistics import COUNTER_NAMES, MAX_COMMENT_EXAMPLES, TRANSMISSION_RISK_LEVEL_RANGE, \
+    DAYS_SINCE_ONSET_OF_SYMPTOMS_RANGE
+
+
+class ValidationRule:
+    """A check of every key of a KeyTable at once.
+
+    `invalid(table)` returns a bool array that is True for the keys breaking the rule, which are counted
+    in the `counter_name` column of StatisticsData. `message(table, index)` describes an invalid key for
+    the comment, so only the sampled examples are formatted.
+    """
+    __slots__ = ("name", "counter_name", "invalid", "message")
+
+    def __init__(self, name, counter_name, invalid, message):
+        assert counter_name in COUNTER_NAMES, "counter %s is unknown." % counter_name
+        self.name = name
+        self.counter_name = counter_name
+        self.invalid = invalid
+        self.message = message
+
+
+def _out_of_range(values, value_range, has_values=None):
+    invalid = (values < value_range.start) | (values >= value_range.stop)
+    if has_values is not None:
+        invalid &= has_values
+    return invalid
+
+
+RULES = [
+    # https://developer.apple.com/documentation/exposurenotification/enexposureinfo/3583716-transmissionrisklevel
+    ValidationRule(
+        "transmission_risk_level", "invalid_transmission_risk_level_key_count",
+        lambda table: _out_of_range(table.transmission_risk_level, TRANSMISSION_RISK_LEVEL_RANGE),
+        lambda table, index: "value transmission_risk_level %d is invalid." % table.transmission_risk_level[index]),
+    # report_type has no rule: values out of ENDiagnosisReportType are dropped while decoding, so
+    # invalid_report_type_key_count stays 0 like in the original output.
+    # https://developers.google.com/android/exposure-notifications/meaningful-exposures
+    ValidationRule(
+        "days_since_onset_of_symptoms", "invalid_days_since_onset_of_symptoms_key_count",
+        lambda table: _out_of_range(table.days_since_onset_of_symptoms, DAYS_SINCE_ONSET_OF_SYMPTOMS_RANGE,
+                                    table.has_days_since_onset_of_symptoms),
+        lambda table, index:
+            "value days_since_onset_of_symptoms %d is invalid." % table.days_since_onset_of_symptoms[index]),
+    # Temporary Exposure Key
+    # The use of 16-byte keys limits the server and device requirements for transferring and storing
+    # Diagnosis Keys while preserving low false-positive probabilities.
+    # https://blog.google/documents/69/Exposure_Notification_-_Cryptography_Specification_v1.2.1.pdf/
+    ValidationRule(
+        "key_data", "invalid_key_data_count",
+        lambda table: table.key_data_length != KEY_DATA_LENGTH,
+        lambda table, index: "key_data %s length %d is invalid." % (
+            base64.b64encode(table.raw_key_data(index)), table.key_data_length[index])),
+]
+
+
+def _first_per_group(indices, group_ids, limit):
+    # The first `limit` of `indices` (ascending) of every group, in the same order.
+    order = np.argsort(group_ids[indices], kind="stable")
+    sorted_group_ids = group_ids[indices][order]
+    group_starts = np.flatnonzero(np.r_[True, sorted_group_ids[1:] != sorted_group_ids[:-1]])
+    ranks = np.arange(len(order)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(order)]))
+    return np.sort(indices[order[ranks < limit]])
+
+
+def validate(table, group_ids, statistics_list, rules=RULES, max_examples=MAX_COMMENT_EXAMPLES):
+    """Adds the counts of invalid keys of every rule, valid_key_count and examples of invalid keys.
+
+    `statistics_list[group]` is the StatisticsData of the keys of `table` whose `group_ids` is `group`.
+    At most `max_examples` messages are appended to the comment of every group, from its first invalid keys.
+    """
+    group_count = len(statistics_list)
+    if group_count == 0:
+        return
+
+    invalid = np.zeros((len(rules), len(table)), dtype=bool)
+    for rule_index, rule in enumerate(rules):
+        invalid[rule_index] = rule.invalid(table)
+    is_invalid_key = invalid.any(axis=0)
+
+    columns = [COUNTER_NAMES.index(rule.counter_name) for rule in rules] + [COUNTER_NAMES.index("valid_key_count")]
+    counts = np.zeros((group_count, len(columns)), dtype=np.int64)
+    for rule_index in range(len(rules)):
+        counts[:, rule_index] = np.bincount(group_ids[invalid[rule_index]], minlength=group_count)
+    counts[:, -1] = np.bincount(group_ids[~is_invalid_key], minlength=group_count)
+
+    # Columns may be shared by rules, so they are added one by one.
+    for statistics_data, group_counts in zip(statistics_list, counts.tolist()):
+        for column, count in zip(columns, group_counts):
+            statistics_data.counts[column] += count
+
+    invalid_indices = np.flatnonzero(is_invalid_key)
+    if len(invalid_indices) == 0 or max_examples <= 0:
+        return
+
+    examples = [[] for _ in range(group_count)]
+    for index in _first_per_group(invalid_indices, group_ids, max_examples).tolist():
+        messages = examples[group_ids[index]]
+        for rule_index, rule in enumerate(rules):
+            if invalid[rule_index, index]:
+                messages.append(rule.message(table, index))
+    for statistics_data, messages in zip(statistics_list, examples):
+        if len(messages) > 0:
+            statistics_data.add_comment_examples(messages)
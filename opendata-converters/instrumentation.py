@@ -0,0 +1,208 @@
+import contextlib
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+from absl import flags
+
+FLAGS = flags.FLAGS
+
+TRACEMALLOC_FRAMES = 1
+TOP_LINES = 30
+
+
+def define_flags():
+    """Defines --profile, --profile_path and --run_report_path. Called once by every converter script."""
+    flags.DEFINE_boolean("profile", False, "Dump cProfile and tracemalloc statistics of every stage to --profile_path")
+    flags.DEFINE_string("profile_path", "./profile", "Directory the --profile output is written to")
+    flags.DEFINE_string("run_report_path", None, "Path of the JSON report of the run")
+
+
+class StageStats:
+    """Totals of a stage. Times are summed over calls, so they may exceed the run time with threads or workers.
+
+    `cpu_seconds` is the CPU time of the calling thread. `peak_traced_bytes` is only measured with --profile.
+    """
+    __slots__ = ("calls", "wall_seconds", "cpu_seconds", "bytes", "peak_traced_bytes")
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.bytes = 0
+        self.peak_traced_bytes = None
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        self.bytes += other.bytes
+        if other.peak_traced_bytes is not None:
+            self.peak_traced_bytes = max(self.peak_traced_bytes or 0, other.peak_traced_bytes)
+        return self
+
+    def to_dict(self):
+        json_obj = {
+            "calls": self.calls,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "bytes": self.bytes,
+        }
+        if self.peak_traced_bytes is not None:
+            json_obj["peak_traced_bytes"] = self.peak_traced_bytes
+        return json_obj
+
+
+class Instrumentation:
+    """Wall time, CPU time and bytes of every stage of a converter run, and counters.
+
+    Stages may be entered from any thread. With `profile_path`, stages entered from the thread that
+    created the instance are also profiled with cProfile, and the peak of memory traced by tracemalloc
+    is recorded for every stage, with the allocations left at the end of the call that reached it.
+    """
+
+    def __init__(self, name=None, profile_path=None):
+        self.name = name
+        self.stages = {}
+        self.counters = {}
+        self.profile_path = profile_path
+
+        self._lock = threading.Lock()
+        self._thread_ident = threading.get_ident()
+        self._profiling = False
+        self._profilers = {}
+        self._snapshots = {}
+
+        self._started_at = datetime.datetime.now(datetime.timezone.utc)
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+        if profile_path is not None:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    @staticmethod
+    def from_flags(name):
+        return Instrumentation(name, FLAGS.profile_path if FLAGS.profile else None)
+
+    def _stats(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = StageStats()
+            self.stages[name] = stats
+        return stats
+
+    @contextlib.contextmanager
+    def stage(self, name, bytes=0):
+        profiler = None
+        if self.profile_path is not None and threading.get_ident() == self._thread_ident and not self._profiling:
+            # Only the outermost stage is profiled: cProfile can not nest.
+            profiler = self._profilers.get(name)
+            if profiler is None:
+                profiler = cProfile.Profile()
+                self._profilers[name] = profiler
+            tracemalloc.reset_peak()
+            self._profiling = True
+            profiler.enable()
+
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall_seconds = time.perf_counter() - start_wall
+            cpu_seconds = time.thread_time() - start_cpu
+
+            peak_traced_bytes = None
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+
+            with self._lock:
+                stats = self._stats(name)
+                stats.calls += 1
+                stats.wall_seconds += wall_seconds
+                stats.cpu_seconds += cpu_seconds
+                stats.bytes += bytes
+                if peak_traced_bytes is not None and peak_traced_bytes > (stats.peak_traced_bytes or -1):
+                    stats.peak_traced_bytes = peak_traced_bytes
+                    self._snapshots[name] = tracemalloc.take_snapshot()
+
+    def add_bytes(self, name, bytes):
+        with self._lock:
+            self._stats(name).bytes += bytes
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge_stages(self, stages):
+        """Adds stages recorded by another instance, e.g. in a worker process."""
+        with self._lock:
+            for name, stats in stages.items():
+                self._stats(name).merge(stats)
+
+    def report(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "started_at": self._started_at.isoformat(),
+                "wall_seconds": time.perf_counter() - self._start_wall,
+                "cpu_seconds": time.process_time() - self._start_cpu,
+                # Kilobytes on Linux.
+                "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                "python_version": sys.version.split()[0],
+                "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+    def summary(self):
+        report = self.report()
+        lines = ["%s: %.3f s wall, %.3f s CPU, %.1f MB max RSS." % (
+            self.name, report["wall_seconds"], report["cpu_seconds"], report["max_rss_bytes"] / 1000 / 1000)]
+        for name, stats in report["stages"].items():
+            lines.append("  %-18s %6d calls %10.3f s wall %10.3f s CPU %14d bytes" % (
+                name, stats["calls"], stats["wall_seconds"], stats["cpu_seconds"], stats["bytes"]))
+        for name, value in report["counters"].items():
+            lines.append("  %s: %d" % (name, value))
+        return "\n".join(lines)
+
+    def _dump_profiles(self):
+        os.makedirs(self.profile_path, exist_ok=True)
+
+        for name, profiler in self._profilers.items():
+            profiler.dump_stats(os.path.join(self.profile_path, "%s.prof" % name))
+
+            string_io = io.StringIO()
+            pstats.Stats(profiler, stream=string_io).sort_stats("cumulative").print_stats(TOP_LINES)
+            with open(os.path.join(self.profile_path, "%s.txt" % name), mode='w') as fp:
+                fp.write(string_io.getvalue())
+
+        for name, snapshot in self._snapshots.items():
+            with open(os.path.join(self.profile_path, "%s.tracemalloc.txt" % name), mode='w') as fp:
+                fp.write("Peak traced memory: %d bytes\n" % self.stages[name].peak_traced_bytes)
+                for statistic in snapshot.statistics("lineno")[:TOP_LINES]:
+                    fp.write("%s\n" % statistic)
+
+    def close(self, report_path=None):
+        """Writes the profiles and the JSON report, and prints the summary."""
+        if self.profile_path is not None:
+            tracemalloc.stop()
+            self._dump_profiles()
+
+        if report_path is not None:
+            dir = os.path.dirname(report_path)
+            if dir:
+                os.makedirs(dir, exist_ok=True)
+            with open(report_path, mode='w') as fp:
+                json.dump(self.report(), fp, indent=2)
+
+        print(self.summary())
@@ -5,9 +5,12 @@ from urllib import request
 
 from absl import flags, app
 
+from instrumentation import Instrumentation, define_flags
+
 FLAGS = flags.FLAGS
 flags.DEFINE_string("tmp_path", "/tmp", "Temporary Path")
 flags.DEFINE_string("output_path", "./test/latest.csv", "Output-file path")
+define_flags()
 
 OPENDATA_URL = "https://covid19.mhlw.go.jp/public/opendata/newly_confirmed_cases_daily.csv"
 
@@ -34,18 +37,30 @@ def main(argv):
     dir = os.path.dirname(FLAGS.output_path)
     os.makedirs(dir, exist_ok=True)
 
-    csv_file = _download_opendata()
+    instrumentation = Instrumentation.from_flags("newly_confirmed_cases_daily")
+
+    with instrumentation.stage("fetch"):
+        csv_file = _download_opendata()
+    instrumentation.add_bytes("fetch", os.path.getsize(csv_file))
     try:
-        with open(csv_file, 'r') as fp:
-            reader = list(csv.reader(fp))
-            latest_day = reader[-1][0]
-            print(latest_day)
+        with instrumentation.stage("parse"):
+            with open(csv_file, 'r') as fp:
+                reader = list(csv.reader(fp))
+        latest_day = reader[-1][0]
+        print(latest_day)
 
-            filtered_rows = filter(lambda row: row[0] == latest_day, reader)
+        filtered_rows = list(filter(lambda row: row[0] == latest_day, reader))
+        with instrumentation.stage("write"):
             _save(filtered_rows)
+        instrumentation.add_bytes("write", os.path.getsize(FLAGS.output_path))
+
+        instrumentation.count("rows", len(reader))
+        instrumentation.count("rows_written", len(filtered_rows))
     finally:
         os.remove(csv_file)
 
+    instrumentation.close(FLAGS.run_report_path)
+
 
 if __name__ == '__main__':
     app.run(main)
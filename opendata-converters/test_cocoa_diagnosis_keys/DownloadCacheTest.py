@@ -0,0 +1,118 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from download_cache import DownloadCache
+from downloader import Downloader, DownloadError
+from helpers import StubServer
+
+BODY = b"PK diagnosis keys"
+ETAG = '"v1"'
+
+
+def _not_modified_if_etag(body, etag):
+    def response(headers):
+        if headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag}, body
+
+    return response
+
+
+class TestDownloadCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.server = StubServer().__enter__()
+        self.downloader = Downloader(retries=0, backoff=0, proxies={})
+        self.cache = DownloadCache(self.dir.name, self.downloader)
+
+    def tearDown(self):
+        self.downloader.close()
+        self.server.__exit__(None, None, None)
+        self.dir.cleanup()
+
+    def _request_headers(self):
+        return [headers for _, headers, _ in self.server.requests]
+
+    def test_revalidation(self):
+        self.server.respond("/a.zip", _not_modified_if_etag(BODY, ETAG))
+        url = self.server.url("/a.zip")
+
+        file_path, sha256 = self.cache.fetch(url)
+        with open(file_path, 'rb') as fp:
+            self.assertEqual(BODY, fp.read())
+        self.assertEqual(hashlib.sha256(BODY).hexdigest(), sha256)
+        self.assertEqual(os.path.join(self.dir.name, "objects", sha256), file_path)
+
+        # The next run sends the validators and uses the cached file on 304 Not Modified.
+        self.cache.save()
+        cache = DownloadCache(self.dir.name, self.downloader)
+        self.assertEqual((file_path, sha256), cache.fetch(url))
+        self.assertEqual(ETAG, self._request_headers()[1].get("If-None-Match"))
+        self.assertEqual((1, 0, 0), (cache.hit_count, cache.miss_count, cache.corrupted_count))
+
+    def test_changed_content(self):
+        self.server.respond("/a.zip", (200, {"ETag": ETAG}, BODY), (200, {"ETag": '"v2"'}, b"changed"))
+        url = self.server.url("/a.zip")
+
+        self.cache.fetch(url)
+        file_path, sha256 = self.cache.fetch(url)
+
+        self.assertEqual(hashlib.sha256(b"changed").hexdigest(), sha256)
+        with open(file_path, 'rb') as fp:
+            self.assertEqual(b"changed", fp.read())
+        self.assertEqual(2, self.cache.miss_count)
+
+    def test_corrupted_file(self):
+        self.server.respond("/a.zip", _not_modified_if_etag(BODY, ETAG))
+        url = self.server.url("/a.zip")
+        file_path, sha256 = self.cache.fetch(url)
+
+        # Same size, other content: only the SHA-256 tells.
+        with open(file_path, 'wb') as fp:
+            fp.write(b"x" * len(BODY))
+
+        self.assertEqual((file_path, sha256), self.cache.fetch(url))
+        self.assertNotIn("If-None-Match", self._request_headers()[1])
+        self.assertEqual((0, 2, 1), (self.cache.hit_count, self.cache.miss_count, self.cache.corrupted_count))
+        with open(file_path, 'rb') as fp:
+            self.assertEqual(BODY, fp.read())
+
+    def test_missing_file(self):
+        self.server.respond("/a.zip", _not_modified_if_etag(BODY, ETAG))
+        url = self.server.url("/a.zip")
+        file_path, _ = self.cache.fetch(url)
+        os.remove(file_path)
+
+        self.cache.fetch(url)
+        self.assertEqual(1, self.cache.corrupted_count)
+        self.assertTrue(os.path.exists(file_path))
+
+    def test_not_modified_without_cached_file(self):
+        self.server.respond("/a.zip", (304, {}, b""))
+
+        with self.assertRaises(DownloadError):
+            self.cache.fetch(self.server.url("/a.zip"))
+        self.assertEqual([], os.listdir(os.path.join(self.dir.name, "objects")))
+
+    def test_evict(self):
+        for index, path in enumerate(["/a.zip", "/b.zip", "/c.zip", "/d.zip"]):
+            self.server.respond(path, (200, {}, bytes([index]) * 10))
+        sha256s = {}
+        for path, used_at in [("/a.zip", 1000), ("/b.zip", 2000), ("/c.zip", 3000), ("/d.zip", 4000)]:
+            _, sha256s[path] = self.cache.fetch(self.server.url(path))
+            self.cache._entries[self.server.url(path)]["used_at"] = used_at
+
+        # /a.zip is too old, and only the two most recently used of the others fit in 25 bytes.
+        self.cache.evict(max_bytes=25, max_age_seconds=2000, now=3500)
+
+        retained = {sha256s["/c.zip"], sha256s["/d.zip"]}
+        self.assertEqual(retained, self.cache.sha256s())
+        self.assertEqual(retained, set(os.listdir(os.path.join(self.dir.name, "objects"))))
+        self.assertEqual(2, self.cache.evicted_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
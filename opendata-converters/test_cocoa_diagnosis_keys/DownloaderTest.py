@@ -0,0 +1,145 @@
+import contextlib
+import http.client
+import io
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from downloader import Downloader, DownloadError, MAX_REDIRECTS, USER_AGENT
+from helpers import StubServer
+
+BODY = b"PK diagnosis keys"
+
+
+class TestDownloader(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer().__enter__()
+        self.downloader = Downloader(retries=2, backoff=0.5, proxies={})
+        sleep_patch = mock.patch("downloader.time.sleep")
+        self.sleep = sleep_patch.start()
+        self.addCleanup(sleep_patch.stop)
+
+    def tearDown(self):
+        self.downloader.close()
+        self.server.__exit__(None, None, None)
+
+    def _fetch(self, path, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.downloader.fetch(self.server.url(path), **kwargs)
+
+    def test_fetch(self):
+        self.server.respond("/a.zip", (200, {"ETag": '"v1"'}, BODY))
+
+        response = self._fetch("/a.zip", headers={"If-None-Match": '"v0"'})
+
+        self.assertEqual((200, BODY, '"v1"'), (response.status, response.body, response.headers["ETag"]))
+        self.assertEqual('"v0"', self.server.requests[0][1]["If-None-Match"])
+        self.assertEqual(USER_AGENT, self.server.requests[0][1]["User-Agent"])
+        self.sleep.assert_not_called()
+
+    def test_fetch_to_file(self):
+        self.server.respond("/a.zip", (200, {}, BODY))
+
+        with tempfile.TemporaryFile() as fp:
+            fp.write(b"previous content longer than the body")
+            response = self._fetch("/a.zip", fp=fp)
+            fp.seek(0)
+            self.assertEqual(BODY, fp.read())
+        self.assertIsNone(response.body)
+
+    def test_retry_with_backoff(self):
+        self.server.respond("/a.zip", (503, {}, b""), (500, {}, b""), (200, {}, BODY))
+
+        self.assertEqual(BODY, self._fetch("/a.zip").body)
+        self.assertEqual(["/a.zip"] * 3, self.server.paths())
+        self.assertEqual([mock.call(0.5), mock.call(1.0)], self.sleep.call_args_list)
+
+    def test_retries_exhausted(self):
+        self.server.respond("/a.zip", (503, {}, b""))
+
+        with self.assertRaises(DownloadError) as context:
+            self._fetch("/a.zip")
+        self.assertEqual(503, context.exception.status)
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_not_retryable(self):
+        self.server.respond("/a.zip", (404, {}, b""))
+
+        with self.assertRaises(DownloadError) as context:
+            self._fetch("/a.zip")
+        self.assertEqual(404, context.exception.status)
+        self.assertEqual(1, len(self.server.requests))
+        self.sleep.assert_not_called()
+
+    def test_incomplete_body_is_retried(self):
+        self.server.respond("/a.zip", (200, {"Content-Length": str(len(BODY) + 10)}, BODY), (200, {}, BODY))
+
+        self.assertEqual(BODY, self._fetch("/a.zip").body)
+        self.assertEqual(2, len(self.server.requests))
+
+    def test_incomplete_body_retries_exhausted(self):
+        self.server.respond("/a.zip", (200, {"Content-Length": str(len(BODY) + 10)}, BODY))
+
+        with self.assertRaises(http.client.IncompleteRead):
+            self._fetch("/a.zip")
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_redirect(self):
+        self.server.respond("/a.zip", (302, {"Location": "/b/a.zip"}, b""))
+        self.server.respond("/b/a.zip", (301, {"Location": self.server.url("/c.zip")}, b""))
+        self.server.respond("/c.zip", (200, {}, BODY))
+
+        self.assertEqual(BODY, self._fetch("/a.zip").body)
+        self.assertEqual(["/a.zip", "/b/a.zip", "/c.zip"], self.server.paths())
+
+    def test_too_many_redirects(self):
+        self.server.respond("/a.zip", (302, {"Location": "/a.zip"}, b""))
+
+        with self.assertRaises(DownloadError) as context:
+            self._fetch("/a.zip")
+        self.assertEqual(310, context.exception.status)
+        self.assertEqual(MAX_REDIRECTS + 1, len(self.server.requests))
+
+    def test_http_proxy(self):
+        self.server.respond("http://example.test/a.zip", (200, {}, BODY))
+        proxy_url = self.server.url("").replace("//", "//user:p%40ss@")
+        downloader = Downloader(retries=0, proxies={"http": proxy_url})
+        self.addCleanup(downloader.close)
+
+        with mock.patch("downloader.urllib.request.proxy_bypass", return_value=False):
+            self.assertEqual(BODY, downloader.fetch("http://example.test/a.zip").body)
+
+        # The proxy is sent the absolute URL and the credentials of the proxy URL.
+        self.assertEqual(["http://example.test/a.zip"], self.server.paths())
+        self.assertEqual("Basic dXNlcjpwQHNz", self.server.requests[0][1]["Proxy-Authorization"])
+
+    def test_proxy_bypass(self):
+        self.server.respond("/a.zip", (200, {}, BODY))
+        downloader = Downloader(retries=0, proxies={"http": "http://proxy.invalid:3128"})
+        self.addCleanup(downloader.close)
+
+        with mock.patch("downloader.urllib.request.proxy_bypass", return_value=True):
+            self.assertEqual(BODY, downloader.fetch(self.server.url("/a.zip")).body)
+        self.assertEqual(["/a.zip"], self.server.paths())
+
+    def test_connection_per_thread(self):
+        for path in ["/a.zip", "/b.zip", "/c.zip", "/d.zip"]:
+            self.server.respond(path, (200, {}, BODY))
+
+        self._fetch("/a.zip")
+        self._fetch("/b.zip")
+        thread = threading.Thread(target=lambda: [self._fetch("/c.zip"), self._fetch("/d.zip")])
+        thread.start()
+        thread.join()
+
+        # Requests of a thread reuse its keep-alive connection, and other threads have their own.
+        client_ports = [client_port for _, _, client_port in self.server.requests]
+        self.assertEqual(client_ports[0], client_ports[1])
+        self.assertEqual(client_ports[2], client_ports[3])
+        self.assertNotEqual(client_ports[0], client_ports[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import protobuf.temporary_exposure_key_export_pb2 as tek_export
+from export_generator import ExportProfile, encode_export, generate_exports, generate_keys, load_generated_rows, \
+    write_list_json
+from export_reader import read_export_payload, read_export_header, iter_keys, iter_revised_keys
+from key_table import KeyTable
+
+
+def _fields(key):
+    return (key.key_data, key.transmission_risk_level, key.rolling_start_interval_number, key.rolling_period,
+            key.report_type, key.days_since_onset_of_symptoms)
+
+
+class TestExportGenerator(unittest.TestCase):
+
+    def test_same_bytes_as_generated_classes(self):
+        profile = ExportProfile(v2_ratio=0.5, invalid_key_data_ratio=0.2, partial_rolling_period_ratio=0.2)
+        keys = generate_keys(np.random.default_rng(1), 200, 1650000000000, profile)
+        keys[0].days_since_onset_of_symptoms = -14
+        keys[0].report_type = 1
+
+        payload = encode_export(1649990000, 1650000000, 2, 3, keys, keys[:2])
+
+        export = tek_export.TemporaryExposureKeyExport()
+        export.ParseFromString(payload)
+        self.assertEqual(200, len(export.keys))
+        self.assertEqual(2, len(export.revised_keys))
+        self.assertEqual(payload, export.SerializeToString())
+        self.assertEqual([_fields(key) for key in keys], [_fields(key) for key in iter_keys(payload)])
+
+    def test_generate_exports(self):
+        profile = ExportProfile(v2_ratio=0.0, revised_key_ratio=0.1, batches_per_created=2)
+
+        with tempfile.TemporaryDirectory() as dir:
+            rows = generate_exports(dir, 250, keys_per_file=100, profile=profile, seed=1)
+
+            self.assertEqual(3, len(rows))
+            self.assertEqual(rows[0]["created"], rows[1]["created"])
+            self.assertLess(rows[1]["created"], rows[2]["created"])
+
+            key_counts = []
+            for row in rows:
+                payload = read_export_payload(os.path.join(dir, row["file_name"]))
+                header = read_export_header(payload)
+                table = KeyTable.from_keys(iter_keys(payload))
+
+                key_counts.append(header.key_count)
+                self.assertEqual(2, header.batch_size)
+                self.assertFalse(table.has_report_type.any())
+                self.assertTrue(all(key.report_type == 5 for key in iter_revised_keys(payload)))
+
+                days = row["created"] // 1000 // 86400
+                self.assertTrue(((table.rolling_start_interval_number % 144) == 0).all())
+                self.assertTrue((table.rolling_start_interval_number < days * 144).all())
+            self.assertEqual([100, 100, 50], key_counts)
+
+            self.assertEqual(rows, load_generated_rows(dir, 250, keys_per_file=100, profile=profile, seed=1))
+            self.assertIsNone(load_generated_rows(dir, 250, keys_per_file=100, profile=profile, seed=2))
+
+            list_path = os.path.join(dir, "list.json")
+            write_list_json(list_path, rows, "http://localhost/")
+            with open(list_path) as fp:
+                json_obj = json.load(fp)
+            self.assertEqual("http://localhost/" + rows[0]["file_name"], json_obj[0]["url"])
+            self.assertEqual(rows[0]["created"], json_obj[0]["created"])
+
+    def test_same_seed(self):
+        with tempfile.TemporaryDirectory() as dir1, tempfile.TemporaryDirectory() as dir2:
+            rows = generate_exports(dir1, 100, seed=3)
+            generate_exports(dir2, 100, seed=3)
+
+            self.assertEqual(
+                [_fields(key) for key in iter_keys(read_export_payload(os.path.join(dir1, rows[0]["file_name"])))],
+                [_fields(key) for key in iter_keys(read_export_payload(os.path.join(dir2, rows[0]["file_name"])))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import io
+import unittest
+import zipfile
+
+import protobuf.temporary_exposure_key_export_pb2 as tek_export
+from export_reader import read_export_payload, read_export_header, iter_keys, iter_revised_keys, BIN_HEADER_BYTES
+
+
+def _dummy_export():
+    export = tek_export.TemporaryExposureKeyExport()
+    export.start_timestamp = 1650000000
+    export.end_timestamp = 1650086400
+    export.region = "440"
+    export.batch_num = 1
+    export.batch_size = 2
+
+    signature_info = export.signature_infos.add()
+    signature_info.verification_key_version = "v1"
+    signature_info.verification_key_id = "440"
+    signature_info.signature_algorithm = "1.2.840.10045.4.3.2"
+
+    # v2 key
+    key = export.keys.add()
+    key.key_data = bytes(range(16))
+    key.transmission_risk_level = 4
+    key.rolling_start_interval_number = 2750000
+    key.rolling_period = 144
+    key.report_type = tek_export.TemporaryExposureKey.CONFIRMED_TEST
+    key.days_since_onset_of_symptoms = -14
+
+    # v1 key, rolling_period left to its default
+    key = export.keys.add()
+    key.key_data = bytes(range(16, 32))
+    key.transmission_risk_level = 7
+    key.rolling_start_interval_number = 2750144
+
+    # Invalid key_data length and large values
+    key = export.keys.add()
+    key.key_data = b"\xff" * 17
+    key.rolling_start_interval_number = 2 ** 31 - 1
+    key.rolling_period = 1
+    key.report_type = tek_export.TemporaryExposureKey.UNKNOWN
+    key.days_since_onset_of_symptoms = 14
+
+    key = export.revised_keys.add()
+    key.key_data = bytes(range(16))
+    key.rolling_start_interval_number = 2750000
+    key.report_type = tek_export.TemporaryExposureKey.REVOKED
+    key.days_since_onset_of_symptoms = 0
+
+    return export
+
+
+def _dummy_zip(export_bin):
+    bytes_io = io.BytesIO()
+    with zipfile.ZipFile(bytes_io, "w") as zip:
+        zip.writestr("export.bin", export_bin)
+        zip.writestr("export.sig", b"")
+    bytes_io.seek(0)
+    return bytes_io
+
+
+def _assert_same_key(test_case, expected, actual):
+    test_case.assertEqual(expected.key_data, actual.key_data)
+    test_case.assertEqual(expected.transmission_risk_level, actual.transmission_risk_level)
+    test_case.assertEqual(expected.rolling_start_interval_number, actual.rolling_start_interval_number)
+    test_case.assertEqual(expected.rolling_period, actual.rolling_period)
+
+    if expected.HasField("report_type"):
+        test_case.assertEqual(expected.report_type, actual.report_type)
+    else:
+        test_case.assertIsNone(actual.report_type)
+
+    if expected.HasField("days_since_onset_of_symptoms"):
+        test_case.assertEqual(expected.days_since_onset_of_symptoms, actual.days_since_onset_of_symptoms)
+    else:
+        test_case.assertIsNone(actual.days_since_onset_of_symptoms)
+
+
+class TestExportReader(unittest.TestCase):
+
+    def test_read_export_payload(self):
+        payload = _dummy_export().SerializeToString()
+
+        actual = read_export_payload(_dummy_zip(BIN_HEADER_BYTES + payload))
+
+        self.assertEqual(payload, actual.tobytes())
+
+    def test_read_export_payload_invalid_header(self):
+        payload = _dummy_export().SerializeToString()
+
+        with self.assertRaises(ValueError):
+            read_export_payload(_dummy_zip(b"EK Export v2    " + payload))
+
+    def test_read_export_header(self):
+        expected = _dummy_export()
+
+        header = read_export_header(memoryview(expected.SerializeToString()))
+
+        self.assertEqual(expected.start_timestamp, header.start_timestamp)
+        self.assertEqual(expected.end_timestamp, header.end_timestamp)
+        self.assertEqual(expected.region, header.region)
+        self.assertEqual(expected.batch_num, header.batch_num)
+        self.assertEqual(expected.batch_size, header.batch_size)
+        self.assertEqual(len(expected.keys), header.key_count)
+        self.assertEqual(len(expected.revised_keys), header.revised_key_count)
+
+    def test_iter_keys(self):
+        expected = _dummy_export()
+
+        actual = list(iter_keys(memoryview(expected.SerializeToString())))
+
+        self.assertEqual(len(expected.keys), len(actual))
+        for expected_key, actual_key in zip(expected.keys, actual):
+            _assert_same_key(self, expected_key, actual_key)
+
+    def test_iter_revised_keys(self):
+        expected = _dummy_export()
+
+        actual = list(iter_revised_keys(memoryview(expected.SerializeToString())))
+
+        self.assertEqual(len(expected.revised_keys), len(actual))
+        for expected_key, actual_key in zip(expected.revised_keys, actual):
+            _assert_same_key(self, expected_key, actual_key)
+
+    def test_iter_keys_unknown_report_type(self):
+        key = tek_export.TemporaryExposureKey()
+        key.key_data = bytes(16)
+        # report_type = 6, which is not a value of ReportType
+        payload = b"\x3a" + bytes([len(key.SerializeToString()) + 2]) + key.SerializeToString() + b"\x28\x06"
+
+        expected = tek_export.TemporaryExposureKeyExport()
+        expected.ParseFromString(payload)
+
+        actual = list(iter_keys(memoryview(payload)))
+
+        self.assertEqual(1, len(actual))
+        _assert_same_key(self, expected.keys[0], actual[0])
+
+    def test_truncated_payload(self):
+        payload = _dummy_export().SerializeToString()
+
+        # Cut in the middle of the length of the first key, in a key and before the end of the last key.
+        key_offset = payload.index(b"\x3a")
+        for length in (key_offset + 1, key_offset + 10, len(payload) - 1):
+            with self.assertRaises(ValueError):
+                list(iter_keys(memoryview(payload[:length])))
+            with self.assertRaises(ValueError):
+                read_export_header(memoryview(payload[:length]))
+
+        # A varint whose last byte still has the continuation bit.
+        with self.assertRaises(ValueError):
+            list(iter_keys(memoryview(b"\x3a\x80")))
@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+
+from exposure_matching import derive_rolling_proximity_identifier_key, derive_rolling_proximity_identifiers, \
+    match_keys, EK_ROLLING_PERIOD
+from export_reader import TemporaryExposureKey
+from key_table import KeyTable
+
+# Test vectors of the Exposure Notification Cryptography Specification
+TEST_TEMPORARY_EXPOSURE_KEY = bytes.fromhex("75c734c6dd1a782de7a965da5eb93125")
+TEST_ROLLING_START_INTERVAL_NUMBER = 2642976
+TEST_RPIK = bytes.fromhex("185ad91db69ec7dd048960f1f3ba6175")
+TEST_RPI_0 = bytes.fromhex("8be6cd371c5c891604bfbe49df845096")
+
+
+def _table(count, rolling_period=144):
+    rng = np.random.default_rng(0)
+    keys = []
+    for index in range(count):
+        key = TemporaryExposureKey()
+        key.key_data = rng.bytes(16)
+        key.rolling_start_interval_number = 2750000 + 144 * (index % 3)
+        key.rolling_period = rolling_period
+        keys.append(key)
+    return KeyTable.from_keys(keys)
+
+
+class TestExposureMatching(unittest.TestCase):
+
+    def test_test_vector(self):
+        self.assertEqual(TEST_RPIK, derive_rolling_proximity_identifier_key(TEST_TEMPORARY_EXPOSURE_KEY))
+
+        rpis = derive_rolling_proximity_identifiers(np.array([TEST_TEMPORARY_EXPOSURE_KEY], dtype="S16"),
+                                                    np.array([TEST_ROLLING_START_INTERVAL_NUMBER]))
+
+        self.assertEqual(EK_ROLLING_PERIOD, len(rpis))
+        self.assertEqual(TEST_RPI_0, rpis[0])
+        self.assertEqual(EK_ROLLING_PERIOD, len(set(rpis.tolist())))
+
+    def test_match_keys(self):
+        table = _table(30)
+        rpis = derive_rolling_proximity_identifiers(table.key_data, table.rolling_start_interval_number)
+        observed_rpis = np.concatenate([
+            rpis[[5 * 144 + 10, 5 * 144 + 10, 17 * 144 + 143]],
+            np.array([bytes(16), b"\x01" * 16], dtype="S16"),
+        ])
+
+        # A window of one chunk waits for every chunk before submitting the next one.
+        for workers, chunk_size, depth in ((0, 7, None), (2, 4, None), (2, 4, 1)):
+            matches = match_keys(table, observed_rpis, workers=workers, chunk_size=chunk_size, depth=depth)
+
+            self.assertEqual([5, 17], matches.key_indices.tolist())
+            self.assertEqual([table.rolling_start_interval_number[5] + 10,
+                              table.rolling_start_interval_number[17] + 143], matches.interval_numbers.tolist())
+            self.assertEqual([2, 1], matches.observed_counts.tolist())
+
+    def test_match_keys_rolling_period(self):
+        table = _table(2, rolling_period=100)
+        rpis = derive_rolling_proximity_identifiers(table.key_data, table.rolling_start_interval_number)
+
+        matches = match_keys(table, rpis[[99, 100, 144 + 143]])
+
+        self.assertEqual([0], matches.key_indices.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import json
+import os
+import pickle
+import tempfile
+import threading
+import unittest
+
+from instrumentation import Instrumentation, StageStats
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_stages_and_counters(self):
+        instrumentation = Instrumentation("test")
+        for _ in range(3):
+            with instrumentation.stage("decode", bytes=10):
+                sum(range(1000))
+        instrumentation.add_bytes("decode", 5)
+        instrumentation.count("keys", 7)
+        instrumentation.count("keys")
+
+        with self.assertRaises(ValueError):
+            with instrumentation.stage("write"):
+                raise ValueError()
+
+        report = instrumentation.report()
+        self.assertEqual("test", report["name"])
+        self.assertEqual(3, report["stages"]["decode"]["calls"])
+        self.assertEqual(35, report["stages"]["decode"]["bytes"])
+        self.assertGreater(report["stages"]["decode"]["wall_seconds"], 0)
+        self.assertEqual(1, report["stages"]["write"]["calls"])
+        self.assertEqual({"keys": 8}, report["counters"])
+        self.assertNotIn("peak_traced_bytes", report["stages"]["decode"])
+
+    def test_threads(self):
+        instrumentation = Instrumentation("test")
+
+        def fetch():
+            for _ in range(100):
+                with instrumentation.stage("fetch", bytes=1):
+                    pass
+
+        threads = [threading.Thread(target=fetch) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(400, instrumentation.stages["fetch"].calls)
+        self.assertEqual(400, instrumentation.stages["fetch"].bytes)
+
+    def test_merge_stages_of_worker(self):
+        worker = Instrumentation()
+        with worker.stage("aggregate", bytes=3):
+            pass
+        stages = pickle.loads(pickle.dumps(worker.stages))
+
+        instrumentation = Instrumentation("test")
+        with instrumentation.stage("aggregate", bytes=1):
+            pass
+        instrumentation.merge_stages(stages)
+
+        self.assertIsInstance(instrumentation.stages["aggregate"], StageStats)
+        self.assertEqual(2, instrumentation.stages["aggregate"].calls)
+        self.assertEqual(4, instrumentation.stages["aggregate"].bytes)
+
+    def test_profile_and_report(self):
+        with tempfile.TemporaryDirectory() as dir:
+            profile_path = os.path.join(dir, "profile")
+            report_path = os.path.join(dir, "report", "run.json")
+
+            instrumentation = Instrumentation("test", profile_path)
+            with instrumentation.stage("decode"):
+                data = [bytes(100) for _ in range(1000)]
+                # Nested stages are timed but only the outer one is profiled.
+                with instrumentation.stage("inner"):
+                    pass
+            del data
+            instrumentation.close(report_path)
+
+            self.assertEqual(["decode.prof", "decode.tracemalloc.txt", "decode.txt"], sorted(os.listdir(profile_path)))
+            with open(report_path) as fp:
+                report = json.load(fp)
+            self.assertGreater(report["stages"]["decode"]["peak_traced_bytes"], 100 * 1000)
+            self.assertEqual(1, report["stages"]["inner"]["calls"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import io
+import json
+import unittest
+
+from json_stream import iter_json_array
+
+
+class TestJsonStream(unittest.TestCase):
+
+    def test_elements(self):
+        expected = [{"url": "https://example.com/1.zip", "created": 1600000000000}, 12345, -1.5e3, "a,]b",
+                    [1, [2, {}]], True, None, {}]
+        text = " \n[ " + ",\n ".join(json.dumps(value) for value in expected) + " ] \n"
+
+        for chunk_size in (1, 2, 3, 7, 1024):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(expected, list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)))
+
+    def test_number_at_chunk_end(self):
+        self.assertEqual([12345, 678], list(iter_json_array(io.StringIO("[12345,678]"), chunk_size=4)))
+
+    def test_empty(self):
+        self.assertEqual([], list(iter_json_array(io.StringIO("[]"), chunk_size=1)))
+        self.assertEqual([], list(iter_json_array(io.StringIO(" [ \n ] "), chunk_size=2)))
+
+    def test_invalid(self):
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(io.StringIO('{"a": 1}')))
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(io.StringIO('[1, {"a": ')))
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(io.StringIO('')))
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(io.StringIO('[1 2]'), chunk_size=2))
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(io.StringIO('[1,]'), chunk_size=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from export_reader import TemporaryExposureKey
+from key_archive import KeyArchive, RECORD_DTYPE, table_from_records
+from key_table import KeyTable
+
+
+def _table(rolling_start_interval_numbers, report_type=None):
+    keys = []
+    for index, rolling_start_interval_number in enumerate(rolling_start_interval_numbers):
+        key = TemporaryExposureKey()
+        key.key_data = bytes([index + 1] * 16)
+        key.transmission_risk_level = 4
+        key.rolling_start_interval_number = rolling_start_interval_number
+        key.report_type = report_type
+        keys.append(key)
+    return KeyTable.from_keys(keys)
+
+
+class TestKeyArchive(unittest.TestCase):
+
+    def test_append_and_load(self):
+        with tempfile.TemporaryDirectory() as dir:
+            key_archive = KeyArchive.load(dir)
+            self.assertEqual(0, key_archive.append("url1", 100, "sha1", _table([1, 2, 3], report_type=1)))
+            self.assertEqual(1, key_archive.append("url2", 200, "sha2", _table([4, 5])))
+            key_archive.save()
+
+            loaded = KeyArchive.load(dir)
+            keys = loaded.keys()
+
+            self.assertIsInstance(keys, np.memmap)
+            self.assertEqual(RECORD_DTYPE, keys.dtype)
+            self.assertEqual([1, 2, 3, 4, 5], keys["rolling_start_interval_number"].tolist())
+            self.assertEqual([0, 0, 0, 1, 1], keys["batch_id"].tolist())
+            self.assertEqual([True, True, True, False, False], keys["has_report_type"].tolist())
+            self.assertEqual([4, 5], loaded.batch_keys(1)["rolling_start_interval_number"].tolist())
+            self.assertEqual(200, loaded.batches[1].created)
+            del keys
+
+    def test_append_same_batch(self):
+        with tempfile.TemporaryDirectory() as dir:
+            key_archive = KeyArchive.load(dir)
+            key_archive.append("url1", 100, "sha1", _table([1, 2]))
+
+            self.assertEqual(0, key_archive.append("url1", 100, "sha1", _table([1, 2])))
+            self.assertEqual(1, key_archive.append("url1", 100, "sha2", _table([1, 2])))
+            self.assertEqual(4, len(key_archive))
+
+    def test_unsaved_records_are_overwritten(self):
+        with tempfile.TemporaryDirectory() as dir:
+            key_archive = KeyArchive.load(dir)
+            key_archive.append("url1", 100, "sha1", _table([1]))
+            key_archive.save()
+            # Interrupted before save()
+            key_archive.append("url2", 200, "sha2", _table([2, 3]))
+
+            key_archive = KeyArchive.load(dir)
+            key_archive.append("url3", 300, "sha3", _table([4]))
+            key_archive.save()
+
+            self.assertEqual(2 * RECORD_DTYPE.itemsize, os.path.getsize(os.path.join(dir, "keys.bin")))
+            self.assertEqual([1, 4], KeyArchive.load(dir).keys()["rolling_start_interval_number"].tolist())
+
+    def test_revised_keys(self):
+        with tempfile.TemporaryDirectory() as dir:
+            key_archive = KeyArchive.load(dir)
+            key_archive.append("url1", 100, "sha1", _table([1, 2]), _table([1], report_type=5))
+            key_archive.append("url2", 200, "sha2", _table([3]))
+            key_archive.append("url3", 300, "sha3", _table([4]), _table([2, 3], report_type=5))
+            key_archive.save()
+
+            loaded = KeyArchive.load(dir)
+            self.assertEqual(3, loaded.revised_key_count())
+            self.assertEqual([1, 2, 3], loaded.revised_keys()["rolling_start_interval_number"].tolist())
+            self.assertEqual([0, 2, 2], loaded.revised_keys()["batch_id"].tolist())
+            self.assertEqual(0, len(loaded.batch_revised_keys(1)))
+            self.assertEqual([2, 3], loaded.batch_revised_keys(2)["rolling_start_interval_number"].tolist())
+
+    def test_latest_batch_ids(self):
+        with tempfile.TemporaryDirectory() as dir:
+            key_archive = KeyArchive.load(dir)
+            key_archive.append("url1", 100, "sha1", _table([1]))
+            key_archive.append("url2", 200, "sha2", _table([2]))
+            key_archive.append("url1", 100, "sha3", _table([3]))
+
+            self.assertEqual([2, 1], key_archive.latest_batch_ids(["url1", "url2", "url3"]))
+
+    def test_table_from_records(self):
+        with tempfile.TemporaryDirectory() as dir:
+            expected = _table([1, 2, 3], report_type=2)
+            key_archive = KeyArchive.load(dir)
+            key_archive.append("url1", 100, "sha1", expected)
+
+            actual = table_from_records(key_archive.keys())
+
+            for name in KeyTable.__slots__:
+                if name != "irregular_key_data":
+                    self.assertEqual(getattr(expected, name).tolist(), getattr(actual, name).tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
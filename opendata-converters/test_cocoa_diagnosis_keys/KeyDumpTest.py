@@ -0,0 +1,120 @@
+import base64
+import json
+import os
+import tempfile
+import unittest
+
+from export_reader import TemporaryExposureKey, ExportHeader
+from key_dump import KeyDumpWriter
+from key_table import KeyTable
+
+URL = "https://example.com/diagnosis_keys/1.zip"
+OTHER_URL = "https://example.com/diagnosis_keys/2.zip"
+CREATED = 1650000000000
+
+
+def _key(key_data, rolling_start_interval_number, report_type=None, days_since_onset_of_symptoms=None):
+    key = TemporaryExposureKey()
+    key.key_data = key_data
+    key.transmission_risk_level = 4
+    key.rolling_start_interval_number = rolling_start_interval_number
+    key.rolling_period = 144
+    key.report_type = report_type
+    key.days_since_onset_of_symptoms = days_since_onset_of_symptoms
+    return key
+
+
+def _header(key_count, revised_key_count):
+    header = ExportHeader()
+    header.start_timestamp = 1649990000
+    header.end_timestamp = 1650000000
+    header.region = "440"
+    header.batch_num = 1
+    header.batch_size = 1
+    header.key_count = key_count
+    header.revised_key_count = revised_key_count
+    return header
+
+
+class TestKeyDumpWriter(unittest.TestCase):
+
+    def _dump(self, keys, revised_keys, **kwargs):
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "dump.jsonl")
+            key_dump = KeyDumpWriter(path, **kwargs)
+            key_dump.write(URL, CREATED, _header(len(keys), len(revised_keys)), KeyTable.from_keys(keys),
+                           iter(revised_keys))
+            key_dump.close()
+            with open(path) as fp:
+                lines = [json.loads(line) for line in fp]
+        self.assertEqual(len(lines), key_dump.line_count)
+        return lines
+
+    def test_write(self):
+        keys = [
+            _key(bytes(range(16)), 2650000, 1, -3),
+            _key(b"short", 2650144),
+        ]
+        revised_keys = [_key(bytes([7] * 16), 2650000, 2, None)]
+        lines = self._dump(keys, revised_keys)
+
+        self.assertEqual(4, len(lines))
+        self.assertEqual({
+            "record": "export", "url": URL, "created": CREATED, "start_timestamp": 1649990000,
+            "end_timestamp": 1650000000, "region": "440", "batch_num": 1, "batch_size": 1, "key_count": 2,
+            "revised_key_count": 1,
+        }, lines[0])
+        self.assertEqual({
+            "record": "key", "url": URL, "created": CREATED, "revised": False, "index": 0,
+            "key_data": base64.b64encode(bytes(range(16))).decode("ascii"), "transmission_risk_level": 4,
+            "rolling_start_interval_number": 2650000, "rolling_period": 144, "report_type": 1,
+            "days_since_onset_of_symptoms": -3,
+        }, lines[1])
+        # Irregular key_data is dumped as is, absent fields as null.
+        self.assertEqual(base64.b64encode(b"short").decode("ascii"), lines[2]["key_data"])
+        self.assertIsNone(lines[2]["report_type"])
+        self.assertIsNone(lines[2]["days_since_onset_of_symptoms"])
+        self.assertTrue(lines[3]["revised"])
+        self.assertEqual(2, lines[3]["report_type"])
+        self.assertIsNone(lines[3]["days_since_onset_of_symptoms"])
+
+    def test_rolling_start_interval_number_range(self):
+        keys = [_key(bytes([index] * 16), 2650000 + index * 144) for index in range(4)]
+        revised_keys = [_key(bytes([9] * 16), 2650000)]
+        lines = self._dump(keys, revised_keys, rolling_start_interval_number_range=(2650144, 2650288))
+
+        self.assertEqual("export", lines[0]["record"])
+        self.assertEqual([1, 2], [line["index"] for line in lines[1:]])
+
+    def test_append(self):
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "dump.jsonl")
+            for url, append in [(URL, False), (OTHER_URL, True)]:
+                key_dump = KeyDumpWriter(path, append=append)
+                key_dump.write(url, CREATED, _header(1, 0), KeyTable.from_keys([_key(bytes(16), 2650000)]), iter([]))
+                key_dump.close()
+            with open(path) as fp:
+                lines = [json.loads(line) for line in fp]
+
+            # Without append, the file is replaced.
+            KeyDumpWriter(path).close()
+            self.assertEqual(0, os.path.getsize(path))
+
+        self.assertEqual([URL, URL, OTHER_URL, OTHER_URL], [line["url"] for line in lines])
+
+    def test_accepts(self):
+        with tempfile.TemporaryDirectory() as dir:
+            key_dump = KeyDumpWriter(os.path.join(dir, "dump.jsonl"), batches=["1.zip"],
+                                     created_range=(CREATED, CREATED + 1000))
+            self.assertTrue(key_dump.accepts(URL, CREATED))
+            self.assertFalse(key_dump.accepts(URL, CREATED + 1001))
+            self.assertFalse(key_dump.accepts("https://example.com/diagnosis_keys/2.zip", CREATED))
+            key_dump.close()
+
+            key_dump = KeyDumpWriter(os.path.join(dir, "dump.jsonl"), batches=[URL])
+            self.assertTrue(key_dump.accepts(URL, 0))
+            key_dump.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
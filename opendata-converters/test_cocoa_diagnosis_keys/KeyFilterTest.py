@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from key_filter import KeyFilter, filter_parameters, HEADER_DTYPE
+
+
+def _key_data(count, seed):
+    return np.frombuffer(np.random.default_rng(seed).bytes(16 * count), dtype="S16")
+
+
+class TestKeyFilter(unittest.TestCase):
+
+    def test_filter_parameters(self):
+        bit_count, hash_count = filter_parameters(1000000, 1e-6)
+        self.assertEqual(0, bit_count % 64)
+        self.assertAlmostEqual(28.76, bit_count / 1000000, delta=0.01)
+        self.assertEqual(20, hash_count)
+        self.assertEqual((64, 1), filter_parameters(0, 1e-6))
+
+    def test_contains(self):
+        key_data = _key_data(20000, 0)
+        key_filter = KeyFilter.build(key_data, 1e-3)
+
+        self.assertTrue(key_filter.contains(key_data).all())
+        self.assertAlmostEqual(1e-3, key_filter.false_positive_rate, delta=1e-4)
+        false_positive_count = key_filter.contains(_key_data(100000, 1)).sum()
+        self.assertLess(false_positive_count, 200)
+
+    def test_build_in_chunks(self):
+        key_data = _key_data(5000, 5)
+        key_filter = KeyFilter.build(key_data)
+
+        with mock.patch("key_filter.BUILD_CHUNK_KEYS", 1000):
+            chunked = KeyFilter.build(key_data)
+        np.testing.assert_array_equal(key_filter.words, chunked.words)
+
+        # Every position sets bit (position % 64) of word (position // 64).
+        positions = np.concatenate(list(key_filter._positions(key_data)))
+        bits = np.unpackbits(key_filter.words.view(np.uint8), bitorder="little")
+        self.assertTrue(bits[positions.astype(np.int64)].all())
+        self.assertEqual(len(np.unique(positions)), bits.sum())
+
+    def test_invalid_key_data(self):
+        key_data = np.array([b"", b"\x01\x02", bytes(15) + b"\x01"], dtype="S16")
+        key_filter = KeyFilter.build(key_data)
+
+        self.assertTrue(key_filter.contains(key_data).all())
+        self.assertFalse(key_filter.contains(np.array([b"\x01\x03"], dtype="S16"))[0])
+
+    def test_save_and_open(self):
+        key_data = _key_data(5000, 2)
+        key_filter = KeyFilter.build(key_data)
+        other_key_data = _key_data(5000, 3)
+
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "filter", "keys.bloom")
+            key_filter.save(path)
+            self.assertEqual(HEADER_DTYPE.itemsize + key_filter.bit_count // 8, os.path.getsize(path))
+
+            opened = KeyFilter.open(path)
+            self.assertIsInstance(opened.words, np.memmap)
+            self.assertEqual((key_filter.hash_count, key_filter.bit_count, 5000),
+                             (opened.hash_count, opened.bit_count, opened.key_count))
+            self.assertTrue(opened.contains(key_data).all())
+            np.testing.assert_array_equal(key_filter.contains(other_key_data), opened.contains(other_key_data))
+            del opened
+
+            with open(path, mode='r+b') as fp:
+                fp.write(b"NOTBLOOM")
+            with self.assertRaises(AssertionError):
+                KeyFilter.open(path)
+
+    def test_empty(self):
+        key_filter = KeyFilter.build(np.zeros(0, dtype="S16"))
+
+        self.assertEqual(0.0, key_filter.false_positive_rate)
+        self.assertFalse(key_filter.contains(_key_data(10, 4)).any())
+
+
+if __name__ == '__main__':
+    unittest.main()
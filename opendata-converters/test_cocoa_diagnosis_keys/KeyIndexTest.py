@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from key_index import KeyIndex, NOT_FOUND, batch_hash, find_duplicates
+
+
+def _key(value):
+    return value.to_bytes(16, byteorder='big')
+
+
+class TestKeyIndex(unittest.TestCase):
+
+    def test_add_and_lookup(self):
+        key_index = KeyIndex()
+
+        self.assertEqual([100, 100], key_index.add([_key(1), _key(2)], 100).tolist())
+        self.assertEqual([100, 200], key_index.add([_key(2), _key(3)], 200).tolist())
+        self.assertEqual(3, len(key_index))
+
+        self.assertEqual([100, 100, 200, NOT_FOUND], key_index.lookup([_key(1), _key(2), _key(3), _key(4)]).tolist())
+
+    def test_lookup_shared_prefix(self):
+        # Keys with the same first 8 bytes
+        keys = [bytes(8) + value.to_bytes(8, byteorder='big') for value in (5, 9, 7)]
+        key_index = KeyIndex()
+        key_index.add(keys, 100)
+        key_index.add([_key(1)], 200)
+
+        self.assertEqual([100, 100, 100, 200, NOT_FOUND],
+                         key_index.lookup(keys + [_key(1), bytes(8) + _key(6)[8:]]).tolist())
+
+    def test_add_keeps_earliest_created(self):
+        key_index = KeyIndex()
+        key_index.add([_key(1)], 200)
+
+        self.assertEqual([50], key_index.add([_key(1)], 50).tolist())
+        self.assertEqual([50], key_index.add([_key(1)], 100).tolist())
+
+    def test_many_batches(self):
+        random = np.random.default_rng(0)
+        key_index = KeyIndex()
+        expected = {}
+
+        for created in range(50):
+            values = random.integers(0, 2000, size=100).tolist()
+            actual = key_index.add([_key(value) for value in values], created)
+            for value in values:
+                expected.setdefault(value, created)
+            self.assertEqual([expected[value] for value in values], actual.tolist())
+
+        self.assertEqual(len(expected), len(key_index))
+
+    def test_save_and_load(self):
+        key_index = KeyIndex()
+        key_index.add([_key(3), _key(1)], 100)
+        key_index.add([_key(2)], 200)
+
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "key_index.npz")
+            key_index.save(path)
+            loaded = KeyIndex.load(path)
+
+        self.assertEqual(3, len(loaded))
+        self.assertEqual([100, 200, 100], loaded.lookup([_key(1), _key(2), _key(3)]).tolist())
+
+    def test_find_duplicates(self):
+        key_index = KeyIndex()
+        find_duplicates(key_index, 100, batch_hash("url1"), [_key(1)])
+
+        is_duplicate, first_seen_created = find_duplicates(key_index, 200, batch_hash("url2"),
+                                                           [_key(1), _key(2), _key(2)])
+
+        self.assertEqual([True, False, True], is_duplicate.tolist())
+        self.assertEqual([100, 200, 200], first_seen_created.tolist())
+
+        # Adding the same batch again does not make its keys duplicates of themselves.
+        is_duplicate, _ = find_duplicates(key_index, 200, batch_hash("url2"), [_key(1), _key(2), _key(2)])
+        self.assertEqual([True, False, True], is_duplicate.tolist())
+
+    def test_find_duplicates_same_created(self):
+        key_index = KeyIndex()
+        find_duplicates(key_index, 100, batch_hash("url1"), [_key(1), _key(2)])
+
+        is_duplicate, first_seen_created = find_duplicates(key_index, 100, batch_hash("url2"), [_key(2), _key(3)])
+
+        self.assertEqual([True, False], is_duplicate.tolist())
+        self.assertEqual([100, 100], first_seen_created.tolist())
+
+        is_duplicate, _ = find_duplicates(key_index, 100, batch_hash("url1"), [_key(1), _key(2)])
+        self.assertEqual([False, False], is_duplicate.tolist())
+
+    def test_load_without_batches(self):
+        # Keys of an index saved before batches were recorded belong to the first batch of their created.
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "key_index.npz")
+            np.savez(path, key_data=np.array([_key(1), _key(2)], dtype="S16"),
+                     first_seen_created=np.array([100, 100]))
+            key_index = KeyIndex.load(path)
+
+            is_duplicate, _ = find_duplicates(key_index, 100, batch_hash("url1"), [_key(1)])
+            self.assertEqual([False], is_duplicate.tolist())
+            is_duplicate, _ = find_duplicates(key_index, 100, batch_hash("url2"), [_key(1), _key(2)])
+            self.assertEqual([True, False], is_duplicate.tolist())
+            is_duplicate, _ = find_duplicates(key_index, 200, batch_hash("url3"), [_key(2)])
+            self.assertEqual([True], is_duplicate.tolist())
+
+            key_index.save(path)
+            is_duplicate, _ = find_duplicates(KeyIndex.load(path), 100, batch_hash("url2"), [_key(1), _key(2)])
+            self.assertEqual([True, False], is_duplicate.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from export_reader import TemporaryExposureKey
+from key_archive import KeyArchive
+from key_query import BLOCK_SIZE, KeyQuery, query_range
+from key_table import KeyTable
+
+
+def _table(rolling_start_interval_numbers, report_types):
+    keys = []
+    for rolling_start_interval_number, report_type in zip(rolling_start_interval_numbers, report_types):
+        key = TemporaryExposureKey()
+        key.key_data = bytes(16)
+        key.rolling_start_interval_number = rolling_start_interval_number
+        key.report_type = report_type
+        keys.append(key)
+    return KeyTable.from_keys(keys)
+
+
+@mock.patch("key_query.BLOCK_SIZE", 4)
+class TestKeyQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.key_archive = KeyArchive.load(self.tmp_dir.name)
+        self.key_archive.append("url0", 100, "sha0", _table([10, 10, 11, 11, 12, 12], [1, 1, 2, None, 1, 3]))
+        self.key_archive.append("url1", 200, "sha1", _table([20, 21, 22, 23, 24, 25], [1, 2, 2, 2, None, 1]))
+        self.key_archive.save()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_count_by_rolling_start_interval_number(self):
+        key_query = KeyQuery(self.key_archive)
+
+        self.assertEqual([0, 1], key_query.candidate_blocks(rolling_start_interval_number_range=(11, 12)).tolist())
+        self.assertEqual({1: 1, 2: 1, 3: 1, None: 1},
+                         key_query.count_by("report_type", rolling_start_interval_number_range=(11, 12)))
+
+    def test_count_by_created(self):
+        key_query = KeyQuery(self.key_archive)
+
+        self.assertEqual([1, 2], key_query.candidate_blocks(created_range=(200, 200)).tolist())
+        self.assertEqual({200: 6}, key_query.count_by("created", created_range=(150, 250)))
+
+    def test_count_by_open_range(self):
+        key_query = KeyQuery(self.key_archive)
+
+        self.assertIsNone(query_range(None, None))
+        self.assertEqual({200: 6}, key_query.count_by("created", created_range=query_range(150, None)))
+        self.assertEqual({100: 6}, key_query.count_by("created", created_range=query_range(None, 150)))
+
+    def test_select_batch(self):
+        key_query = KeyQuery(self.key_archive)
+
+        records = key_query.select(batch_id=1)
+
+        self.assertEqual([20, 21, 22, 23, 24, 25], records["rolling_start_interval_number"].tolist())
+        self.assertEqual(0, len(key_query.select(rolling_start_interval_number_range=(13, 19))))
+
+    def test_block_index_is_extended(self):
+        self.assertEqual(3, len(KeyQuery(self.key_archive).block_index))
+
+        self.key_archive.append("url2", 300, "sha2", _table([30, 31, 32], [5, 5, 5]))
+        self.key_archive.save()
+        key_query = KeyQuery.open(self.tmp_dir.name)
+
+        self.assertEqual(4, len(key_query.block_index))
+        self.assertEqual([100, 100, 200, 300], key_query.block_index.created_min.tolist())
+        self.assertEqual({5: 3}, key_query.count_by("report_type", rolling_start_interval_number_range=(26, 40)))
+
+    def test_appended_records_are_merged_in_order(self):
+        KeyQuery(self.key_archive)
+
+        self.key_archive.append("url2", 300, "sha2", _table([15, 11, 30], [4, 4, 4]))
+        self.key_archive.save()
+        key_query = KeyQuery.open(self.tmp_dir.name)
+
+        self.assertEqual([10, 11, 20, 24], key_query.block_index.rolling_start_interval_number_min.tolist())
+        self.assertEqual([0, 1], key_query.candidate_blocks(rolling_start_interval_number_range=(11, 11)).tolist())
+        # Records of several blocks come back in the order of the archive.
+        records = key_query.select(rolling_start_interval_number_range=(11, 15))
+        self.assertEqual([11, 11, 12, 12, 15, 11], records["rolling_start_interval_number"].tolist())
+        self.assertEqual([0, 0, 0, 0, 2, 2], records["batch_id"].tolist())
+
+
+class TestKeyQueryBlocks(unittest.TestCase):
+    """Blocks of BLOCK_SIZE records, over batches that all have keys of the last 14 days like the real ones."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.key_archive = KeyArchive.load(self.tmp_dir.name)
+        generator = random.Random(0)
+        for batch_id in range(20):
+            created_day = 100 + batch_id
+            rolling_start_interval_numbers = [(created_day - generator.randrange(14)) * 144
+                                              for _ in range(BLOCK_SIZE // 2)]
+            self.key_archive.append("url%d" % batch_id, created_day, "sha%d" % batch_id,
+                                    _table(rolling_start_interval_numbers, [1] * len(rolling_start_interval_numbers)))
+        self.key_archive.save()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_query_of_one_day_skips_blocks(self):
+        key_query = KeyQuery(self.key_archive)
+        day = (110 * 144, 110 * 144)
+
+        candidate_blocks = key_query.candidate_blocks(rolling_start_interval_number_range=day)
+
+        self.assertEqual(10, len(key_query.block_index))
+        self.assertLessEqual(len(candidate_blocks), 2)
+        keys = self.key_archive.keys()
+        expected_count = int((keys["rolling_start_interval_number"] == 110 * 144).sum())
+        self.assertEqual({1: expected_count},
+                         key_query.count_by("report_type", rolling_start_interval_number_range=day))
+        self.assertEqual(expected_count, len(key_query.select(rolling_start_interval_number_range=day)))
+
+
+if __name__ == '__main__':
+    unittest.main()
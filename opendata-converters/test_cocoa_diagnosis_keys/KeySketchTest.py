@@ -0,0 +1,90 @@
+import csv
+import datetime
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from key_sketch import HyperLogLog, KeySketches, hash_key_data, write_distinct_key_counts
+
+# 2022-04-15 00:00 JST
+ROLLING_START_INTERVAL_NUMBER = 2749914
+DAY = 144
+
+
+def _key_data(count, seed):
+    return np.frombuffer(np.random.default_rng(seed).bytes(16 * count), dtype="S16")
+
+
+class TestHyperLogLog(unittest.TestCase):
+
+    def test_estimate(self):
+        for count in [0, 10, 1000, 100000]:
+            key_data = _key_data(count, count)
+            estimate = HyperLogLog().add(key_data).add(key_data[:count // 2]).estimate()
+            self.assertAlmostEqual(count, estimate, delta=max(count * 0.05, 1))
+
+    def test_merge(self):
+        key_data = _key_data(20000, 0)
+        merged = HyperLogLog().add(key_data[:15000]).merge(HyperLogLog().add(key_data[5000:]))
+
+        np.testing.assert_array_equal(HyperLogLog().add(key_data).registers, merged.registers)
+
+    def test_hash_key_data(self):
+        # Keys differing only in their last bytes, or in their length, have different hashes.
+        key_data = np.array([bytes(15) + b"\x01", bytes(15) + b"\x02", b"", b"\x00\x01"], dtype="S16")
+        self.assertEqual(4, len(set(hash_key_data(key_data).tolist())))
+
+
+class TestKeySketches(unittest.TestCase):
+
+    def test_periods_and_persistence(self):
+        key_sketches = KeySketches()
+        key_sketches.add(np.full(100, ROLLING_START_INTERVAL_NUMBER), _key_data(100, 1))
+        # The same keys on the same day
+        key_sketches.add(np.full(100, ROLLING_START_INTERVAL_NUMBER + 18), _key_data(100, 1))
+        key_sketches.add(np.full(200, ROLLING_START_INTERVAL_NUMBER + DAY), _key_data(200, 2))
+        # A batch is split by the day of the rolling start of every key.
+        key_sketches.add(np.repeat([ROLLING_START_INTERVAL_NUMBER + DAY - 1, ROLLING_START_INTERVAL_NUMBER + 20 * DAY],
+                                   [30, 50]), _key_data(80, 3))
+
+        self.assertEqual(3, len(key_sketches.sketches))
+        self.assertAlmostEqual(130, key_sketches.estimate(datetime.date(2022, 4, 15), datetime.date(2022, 4, 15)),
+                               delta=2)
+        self.assertAlmostEqual(380, key_sketches.estimate(), delta=5)
+
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "key_sketches.npz")
+            key_sketches.save(path)
+            loaded = KeySketches.load(path)
+            self.assertEqual(sorted(key_sketches.sketches), sorted(loaded.sketches))
+            self.assertEqual(key_sketches.estimate(), loaded.estimate())
+
+            write_distinct_key_counts(loaded, dir)
+            with open(os.path.join(dir, "distinct_keys_by_rolling_start_iso_week.csv")) as fp:
+                rows = list(csv.reader(fp))
+            self.assertEqual(["rolling_start_iso_week", "distinct_key_count"], rows[0])
+            self.assertEqual(["2022-W18", "2022-W15"], [row[0] for row in rows[1:]])
+            self.assertAlmostEqual(330, int(rows[2][1]), delta=5)
+
+            with open(os.path.join(dir, "distinct_keys_by_rolling_start_date.csv")) as fp:
+                self.assertEqual(["2022-05-05", "2022-04-16", "2022-04-15"],
+                                 [row[0] for row in list(csv.reader(fp))[1:]])
+
+    def test_load_other_version(self):
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "key_sketches.npz")
+            with open(path, mode='wb') as fp:
+                np.savez(fp, version=np.int64(1), precision=np.int64(12), ordinals=np.zeros(1, dtype=np.int64),
+                         registers=np.ones((1, 4096), dtype=np.uint8))
+
+            self.assertEqual({}, KeySketches.load(path).sketches)
+
+    def test_load_missing(self):
+        with tempfile.TemporaryDirectory() as dir:
+            self.assertEqual(0, KeySketches.load(os.path.join(dir, "key_sketches.npz")).estimate())
+
+
+if __name__ == '__main__':
+    unittest.main()
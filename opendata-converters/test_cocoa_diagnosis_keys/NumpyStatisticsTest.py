@@ -0,0 +1,125 @@
+import csv
+import io
+import random
+import unittest
+
+from export_reader import TemporaryExposureKey
+from key_table import KeyTable
+from numpy_statistics import statistics_key_table, hashed_groups
+from python_statistics import aggregate_keys
+
+
+def _dummy_keys(count):
+    random.seed(0)
+
+    keys = []
+    for _ in range(count):
+        key = TemporaryExposureKey()
+        key.key_data = bytes(random.getrandbits(8) for _ in range(random.choice([16, 16, 16, 15, 17])))
+        key.transmission_risk_level = random.randint(0, 7)
+        key.rolling_start_interval_number = 2750000 + 144 * random.randint(0, 2)
+        if random.random() < 0.7:
+            key.report_type = random.randint(0, 5)
+        if random.random() < 0.7:
+            key.days_since_onset_of_symptoms = random.randint(-14, 14)
+        keys.append(key)
+    return keys
+
+
+def _statistics_keys(created, rolling_start_interval_number, keys):
+    # Statistics of keys of one group by the per-key Python engine, which the NumPy engine must match.
+    statistics_dict = {}
+    aggregate_keys(statistics_dict, created, keys)
+    statistics_data, = statistics_dict.values()
+    assert statistics_data.rolling_start_interval_number == rolling_start_interval_number
+    return statistics_data
+
+
+def _to_csv(statistics_list):
+    string_io = io.StringIO()
+    writer = csv.writer(string_io)
+    for statistics_data in statistics_list:
+        statistics_data.write_to_csv(writer)
+    return string_io.getvalue()
+
+
+class TestNumpyStatistics(unittest.TestCase):
+
+    def test_hashed_groups(self):
+        group_ids, group_count = hashed_groups(_values([5, 5, 3, 5]))
+        self.assertEqual([0, 0, 1, 0], group_ids.tolist())
+        self.assertEqual(2, group_count)
+
+    def test_statistics_key_table(self):
+        keys = _dummy_keys(500)
+
+        expected = []
+        keys_dict = {}
+        for key in keys:
+            keys_dict.setdefault(key.rolling_start_interval_number, []).append(key)
+        for rolling_start_interval_number, group_keys in keys_dict.items():
+            expected.append(_statistics_keys(1, rolling_start_interval_number, group_keys))
+
+        table = KeyTable.from_keys(keys)
+        group_ids, group_count = hashed_groups(table.rolling_start_interval_number)
+        actual = statistics_key_table(1, table, group_ids, group_count)
+
+        self.assertEqual(_to_csv(expected), _to_csv(actual))
+
+    def test_aggregate_keys_unsorted(self):
+        keys = _dummy_keys(500)
+
+        statistics_dict = {}
+        aggregate_keys(statistics_dict, 1, sorted(keys, key=lambda key: key.rolling_start_interval_number))
+        expected = sorted(statistics_dict.values(), key=lambda data: data.rolling_start_interval_number)
+
+        random.shuffle(keys)
+        statistics_dict = {}
+        aggregate_keys(statistics_dict, 1, keys[:250])
+        aggregate_keys(statistics_dict, 1, keys[250:])
+        actual = sorted(statistics_dict.values(), key=lambda data: data.rolling_start_interval_number)
+
+        for statistics_data in expected + actual:
+            statistics_data.comment = ""
+        self.assertEqual(_to_csv(expected), _to_csv(actual))
+
+    def test_out_of_range_values(self):
+        values = [
+            # transmission_risk_level, report_type, days_since_onset_of_symptoms
+            (9, 1, 0),
+            (-1, None, None),
+            (1, None, 20),
+            (1, 2, -15),
+            (2, 1, 0),
+        ]
+        keys = []
+        for index, (transmission_risk_level, report_type, days_since_onset_of_symptoms) in enumerate(values):
+            key = TemporaryExposureKey()
+            key.key_data = bytes([index]) * 16
+            key.transmission_risk_level = transmission_risk_level
+            key.rolling_start_interval_number = 2750000
+            key.report_type = report_type
+            key.days_since_onset_of_symptoms = days_since_onset_of_symptoms
+            keys.append(key)
+
+        expected = _statistics_keys(1, 2750000, keys)
+        table = KeyTable.from_keys(keys)
+        actual, = statistics_key_table(1, table, *hashed_groups(table.rolling_start_interval_number))
+
+        self.assertEqual(expected.counts.tolist(), actual.counts.tolist())
+        self.assertEqual(expected.comment, actual.comment)
+        self.assertEqual((5, 1), (actual.key_count, actual.valid_key_count))
+        self.assertEqual(2, actual.invalid_transmission_risk_level_key_count)
+        self.assertEqual(2, actual.invalid_days_since_onset_of_symptoms_key_count)
+        # Out-of-range values are not in the distributions.
+        self.assertEqual(3, sum(count for _, count in actual.transmission_risk_level_distribution.items()))
+        self.assertEqual(2, actual.days_since_onset_of_symptoms_distribution[0])
+
+
+def _values(values):
+    keys = []
+    for value in values:
+        key = TemporaryExposureKey()
+        key.rolling_start_interval_number = value
+        keys.append(key)
+    return KeyTable.from_keys(keys).rolling_start_interval_number
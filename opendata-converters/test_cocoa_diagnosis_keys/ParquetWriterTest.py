@@ -0,0 +1,76 @@
+import csv
+import datetime
+import importlib.util
+import io
+import os
+import tempfile
+import unittest
+
+from statistics import StatisticsData, CSV_HEADER, FORMAT_RFC3339
+
+# 2022-04-14T09:00:00+0900
+ROLLING_START_INTERVAL_NUMBER = 2749824
+
+
+def _statistics(created, key_count, comment):
+    statistics_data = StatisticsData()
+    statistics_data.created = created
+    statistics_data.rolling_start_interval_number = ROLLING_START_INTERVAL_NUMBER
+    statistics_data.key_count = key_count
+    statistics_data.valid_key_count = key_count
+    statistics_data.transmission_risk_level_distribution[3] = key_count
+    statistics_data.report_type_distribution[1] = key_count
+    statistics_data.days_since_onset_of_symptoms_distribution[-14] = key_count
+    statistics_data.duplicate_key_count = 1
+    statistics_data.first_seen_created = created - 1
+    statistics_data.comment = comment
+    return statistics_data
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+class TestParquetWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.statistics_list = [_statistics(1650000000000, 3, "comment"), _statistics(1650000100000, 5, "")]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from parquet_writer import write_to_parquet
+
+        path = os.path.join(self.tmp_dir.name, "latest.parquet")
+        write_to_parquet(self.statistics_list, path)
+        table = pq.read_table(path)
+
+        self.assertEqual(CSV_HEADER, table.column_names)
+        for name, field_type in zip(table.column_names, table.schema.types):
+            if name == "rolling_start_interval_number_date":
+                # Parquet has no unit of seconds, so the timestamp is read back in milliseconds.
+                self.assertTrue(pa.types.is_timestamp(field_type))
+                self.assertEqual("Asia/Tokyo", field_type.tz)
+            elif name == "comment":
+                self.assertEqual(pa.string(), field_type)
+            else:
+                self.assertEqual(pa.int64(), field_type, name)
+
+        dates = table.column("rolling_start_interval_number_date").to_pylist()
+        jst = datetime.timezone(datetime.timedelta(hours=9))
+        self.assertEqual([datetime.datetime(2022, 4, 14, 9, tzinfo=jst)] * 2, dates)
+        self.assertEqual(datetime.timedelta(hours=9), dates[0].utcoffset())
+
+        # Every value is the one written to the CSV.
+        string_io = io.StringIO()
+        writer = csv.writer(string_io)
+        for statistics_data in self.statistics_list:
+            statistics_data.write_to_csv(writer)
+        rows = [[value.strftime(FORMAT_RFC3339) if isinstance(value, datetime.datetime) else str(value)
+                 for value in row.values()] for row in table.to_pylist()]
+        self.assertEqual(list(csv.reader(io.StringIO(string_io.getvalue()))), rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import parsed_cache
+from export_reader import TemporaryExposureKey
+from key_table import KeyTable
+from parsed_cache import ParsedExportCache
+
+
+def _keys():
+    keys = []
+    for index, key_data in enumerate([bytes([1] * 16), b"short", bytes([2] * 15) + b"\x00", bytes([3] * 17), b""]):
+        key = TemporaryExposureKey()
+        key.key_data = key_data
+        key.transmission_risk_level = index
+        key.rolling_start_interval_number = 2650000 + index
+        key.rolling_period = 144 - index
+        key.report_type = index if index % 2 == 0 else None
+        key.days_since_onset_of_symptoms = -index if index % 3 == 0 else None
+        keys.append(key)
+    return keys
+
+
+def _fields(keys):
+    return [tuple(getattr(key, name) for name in TemporaryExposureKey.__slots__) for key in keys]
+
+
+class TestParsedExportCache(unittest.TestCase):
+
+    def test_iter_keys(self):
+        keys = _keys()
+        self.assertEqual(_fields(keys), _fields(KeyTable.from_keys(keys).iter_keys()))
+
+    def test_store_and_load(self):
+        table = KeyTable.from_keys(_keys())
+
+        with tempfile.TemporaryDirectory() as dir:
+            cache = ParsedExportCache(dir)
+            self.assertIsNone(cache.load("sha1"))
+
+            cache.store("sha1", table)
+            loaded = cache.load("sha1")
+
+            for name in KeyTable.__slots__:
+                if name != "irregular_key_data":
+                    np.testing.assert_array_equal(getattr(table, name), getattr(loaded, name))
+                    self.assertEqual(getattr(table, name).dtype, getattr(loaded, name).dtype)
+            self.assertEqual(table.irregular_key_data, loaded.irregular_key_data)
+            self.assertEqual(_fields(_keys()), _fields(loaded.iter_keys()))
+            self.assertEqual(["sha1.npz"], os.listdir(dir))
+
+    def test_revised_table(self):
+        revised_keys = _keys()[1:3]
+
+        with tempfile.TemporaryDirectory() as dir:
+            cache = ParsedExportCache(dir)
+            cache.store("sha1", KeyTable.from_keys(_keys()), KeyTable.from_keys(revised_keys))
+            cache.store("sha2", KeyTable.from_keys(_keys()))
+
+            table, revised_table = cache.load_tables("sha1")
+            self.assertEqual(_fields(_keys()), _fields(table.iter_keys()))
+            self.assertEqual(_fields(revised_keys), _fields(revised_table.iter_keys()))
+            self.assertEqual(0, len(cache.load_tables("sha2")[1]))
+
+    def test_empty_table(self):
+        with tempfile.TemporaryDirectory() as dir:
+            cache = ParsedExportCache(dir)
+            cache.store("sha1", KeyTable.from_keys([]))
+
+            self.assertEqual(0, len(cache.load("sha1")))
+
+    def test_invalidated(self):
+        table = KeyTable.from_keys(_keys())
+
+        with tempfile.TemporaryDirectory() as dir:
+            cache = ParsedExportCache(dir)
+            cache.store("sha1", table)
+            with mock.patch.object(parsed_cache, "SCHEMA_VERSION", parsed_cache.SCHEMA_VERSION + 1):
+                self.assertIsNone(cache.load("sha1"))
+
+            with open(cache.table_path("sha2"), mode='wb') as fp:
+                fp.write(b"corrupted")
+            self.assertIsNone(cache.load("sha2"))
+
+    def test_retain(self):
+        table = KeyTable.from_keys(_keys())
+
+        with tempfile.TemporaryDirectory() as dir:
+            cache = ParsedExportCache(dir)
+            cache.store("sha1", table)
+            cache.store("sha2", table)
+            cache.retain(["sha2", "sha3"])
+
+            self.assertEqual(["sha2.npz"], os.listdir(dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
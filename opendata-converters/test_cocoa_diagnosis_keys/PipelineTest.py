@@ -0,0 +1,71 @@
+import threading
+import time
+import unittest
+
+from pipeline import run_pipeline
+
+
+def _square(value):
+    return value * value
+
+
+class _InFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.max_count = 0
+
+    def download(self, value):
+        with self.lock:
+            self.count += 1
+            self.max_count = max(self.max_count, self.count)
+        time.sleep(0.001)
+        return value
+
+    def consumed(self):
+        with self.lock:
+            self.count -= 1
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_order(self):
+        def download(value):
+            # Later items are downloaded first.
+            time.sleep(0.001 * (10 - value))
+            return value
+
+        actual = list(run_pipeline(range(10), download, _square, download_workers=4, workers=0, depth=4))
+
+        self.assertEqual([(value, value * value) for value in range(10)], actual)
+
+    def test_process_pool(self):
+        actual = list(run_pipeline(range(20), lambda value: value, _square, download_workers=2, workers=2, depth=3))
+
+        self.assertEqual([(value, value * value) for value in range(20)], actual)
+
+    def test_depth(self):
+        in_flight = _InFlight()
+
+        for _ in run_pipeline(range(30), in_flight.download, _square, download_workers=8, workers=0, depth=3):
+            in_flight.consumed()
+
+        # The item being consumed and the ones started meanwhile
+        self.assertLessEqual(in_flight.max_count, 3 + 1)
+
+    def test_download_error(self):
+        def download(value):
+            if value == 3:
+                raise IOError("failed")
+            return value
+
+        actual = []
+        with self.assertRaises(IOError):
+            for downloaded, _ in run_pipeline(range(10), download, _square, download_workers=2, workers=2, depth=2):
+                actual.append(downloaded)
+
+        self.assertEqual([0, 1, 2], actual)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from export_reader import TemporaryExposureKey
+from key_archive import KeyArchive
+from key_table import KeyTable
+from reconciliation import reconcile, _sorted_order
+
+REVOKED = 5
+
+
+def _key(key_data, report_type=1, transmission_risk_level=4):
+    key = TemporaryExposureKey()
+    key.key_data = key_data
+    key.transmission_risk_level = transmission_risk_level
+    key.rolling_start_interval_number = 2650000
+    key.rolling_period = 144
+    key.report_type = report_type
+    return key
+
+
+def _table(*keys):
+    return KeyTable.from_keys(keys)
+
+
+class TestReconciliation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.key_archive = KeyArchive.load(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_reconcile(self):
+        a, b, c, d = (bytes([index] * 16) for index in range(1, 5))
+        # Appended out of the order of created.
+        self.key_archive.append("url2", 200, "sha2", _table(_key(c), _key(a)),
+                                _table(_key(a, report_type=REVOKED, transmission_risk_level=7)))
+        self.key_archive.append("url1", 100, "sha1", _table(_key(a), _key(b)),
+                                _table(_key(b, report_type=REVOKED), _key(d, report_type=REVOKED)))
+        self.key_archive.append("url3", 300, "sha3", _table(),
+                                _table(_key(b, report_type=None, transmission_risk_level=2)))
+
+        reconciliation = reconcile(self.key_archive, [0, 1, 2])
+
+        self.assertEqual([100, 200, 300], [created for created, _, _ in reconciliation.batches])
+        first, second, third = [table for _, _, table in reconciliation.batches]
+        # The revision of a is applied to both records of a, and the latest revision of b wins.
+        self.assertEqual([REVOKED, 0], first.report_type.tolist())
+        self.assertEqual([True, False], first.has_report_type.tolist())
+        self.assertEqual([7, 2], first.transmission_risk_level.tolist())
+        self.assertEqual([1, REVOKED], second.report_type.tolist())
+        self.assertEqual([4, 7], second.transmission_risk_level.tolist())
+        self.assertEqual(0, len(third))
+
+        self.assertEqual(4, reconciliation.revised_key_count)
+        self.assertEqual(3, reconciliation.applied_key_count)
+        self.assertEqual(1, reconciliation.unmatched_key_count)
+
+        # The archive is not modified.
+        self.assertEqual([1, 1, 1, 1], self.key_archive.keys()["report_type"].tolist())
+
+    def test_reconcile_republished_key(self):
+        a, b = (bytes([index] * 16) for index in range(1, 3))
+        # a is published in two batches, then revised; b is published twice in the same batch.
+        self.key_archive.append("url1", 100, "sha1", _table(_key(a), _key(b), _key(b)))
+        self.key_archive.append("url2", 200, "sha2", _table(_key(b), _key(a)))
+        self.key_archive.append("url3", 300, "sha3", _table(),
+                                _table(_key(a, report_type=REVOKED), _key(b, report_type=REVOKED)))
+
+        reconciliation = reconcile(self.key_archive, [0, 1, 2])
+
+        first, second, _ = [table for _, _, table in reconciliation.batches]
+        self.assertEqual([REVOKED, REVOKED, REVOKED], first.report_type.tolist())
+        self.assertEqual([REVOKED, REVOKED], second.report_type.tolist())
+        self.assertEqual(5, reconciliation.applied_key_count)
+
+    def test_reconcile_selected_batches(self):
+        a = bytes([1] * 16)
+        self.key_archive.append("url1", 100, "sha1", _table(_key(a)))
+        self.key_archive.append("url2", 200, "sha2", _table(), _table(_key(a, report_type=REVOKED)))
+
+        reconciliation = reconcile(self.key_archive, [0])
+        self.assertEqual([1], reconciliation.batches[0][2].report_type.tolist())
+        self.assertEqual(0, reconciliation.revised_key_count)
+
+    def test_sorted_order(self):
+        key_data = np.array([bytes([1] * 8 + [2] * 8), b"", bytes([1] * 16), b"", bytes(16), bytes([1] * 16),
+                             bytes([0] * 8 + [1] * 8)], dtype="S16")
+
+        order = _sorted_order(key_data)
+
+        self.assertEqual([1, 3, 4, 6, 2, 5, 0], order.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
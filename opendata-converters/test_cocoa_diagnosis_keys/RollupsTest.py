@@ -0,0 +1,67 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from rollups import Rollups, ROLLUPS, ROLLUP_CREATED, ROLLUP_DAY, ROLLUP_WEEK, ROLLUP_OVERALL, COUNT_HEADER
+from statistics import StatisticsData
+
+# 2022-04-25 09:00 JST (Monday of ISO week 17) and the day before.
+MONDAY = 2751408
+SUNDAY = MONDAY - 144
+
+
+def _statistics_data(created, rolling_start_interval_number, key_count, report_type=1):
+    statistics_data = StatisticsData()
+    statistics_data.created = created
+    statistics_data.rolling_start_interval_number = rolling_start_interval_number
+    statistics_data.key_count = key_count
+    statistics_data.report_type_distribution[report_type] = key_count
+    return statistics_data
+
+
+def _read(path, rollup):
+    with open(os.path.join(path, ROLLUPS[rollup][0])) as fp:
+        return list(csv.DictReader(fp))
+
+
+class TestRollups(unittest.TestCase):
+
+    def test_rollups(self):
+        rollups = Rollups()
+        rollups.add([_statistics_data(100, MONDAY, 1), _statistics_data(100, SUNDAY, 2, report_type=3)])
+        rollups.add([_statistics_data(200, MONDAY, 4), _statistics_data(200, MONDAY + 1, 8)])
+
+        with tempfile.TemporaryDirectory() as dir:
+            file_paths = rollups.write(dir)
+            self.assertEqual(len(ROLLUPS), len(file_paths))
+
+            by_created = _read(dir, ROLLUP_CREATED)
+            self.assertEqual([("200", "12"), ("100", "3")],
+                             [(row["created"], row["key_count"]) for row in by_created])
+            self.assertEqual(["created"] + COUNT_HEADER, list(by_created[0].keys()))
+
+            by_day = _read(dir, ROLLUP_DAY)
+            self.assertEqual([("2022-04-25", "13"), ("2022-04-24", "2")],
+                             [(row["rolling_start_date"], row["key_count"]) for row in by_day])
+
+            by_week = _read(dir, ROLLUP_WEEK)
+            self.assertEqual([("2022-W17", "13"), ("2022-W16", "2")],
+                             [(row["rolling_start_iso_week"], row["key_count"]) for row in by_week])
+
+            overall, = _read(dir, ROLLUP_OVERALL)
+            self.assertEqual("15", overall["key_count"])
+            self.assertEqual("13", overall["report_type_confirmed_test_count"])
+            self.assertEqual("2", overall["report_type_self_reported_count"])
+
+    def test_empty(self):
+        with tempfile.TemporaryDirectory() as dir:
+            Rollups().write(dir)
+
+            self.assertEqual([], _read(dir, ROLLUP_CREATED))
+            overall, = _read(dir, ROLLUP_OVERALL)
+            self.assertEqual("0", overall["key_count"])
+
+
+if __name__ == '__main__':
+    unittest.main()
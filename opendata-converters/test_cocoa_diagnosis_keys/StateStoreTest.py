@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+import unittest
+
+from state_store import StateStore, BatchState, STATE_VERSION
+from statistics import StatisticsData
+
+
+def _statistics(created, key_count, comment=""):
+    statistics_data = StatisticsData()
+    statistics_data.created = created
+    statistics_data.rolling_start_interval_number = 2700000
+    statistics_data.key_count = key_count
+    statistics_data.report_type_distribution[1] = key_count
+    statistics_data.comment = comment
+    return statistics_data
+
+
+class TestStateStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "state", "state.json")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, json_obj):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, mode='w') as fp:
+            json.dump(json_obj, fp)
+
+    def test_save_and_load(self):
+        state_store = StateStore.load(self.path)
+        self.assertIsNone(state_store.get("url0", 100))
+        state_store.put(BatchState("url0", 100, [_statistics(100, 3, "comment"), _statistics(100, 4)]))
+        state_store.put(BatchState("url1", 200, []))
+        state_store.save()
+
+        state_store = StateStore.load(self.path)
+
+        batch_state = state_store.get("url0", 100)
+        self.assertEqual([(100, 3, "comment"), (100, 4, "")],
+                         [(statistics_data.created, statistics_data.key_count, statistics_data.comment)
+                          for statistics_data in batch_state.statistics_list])
+        self.assertEqual(3, batch_state.statistics_list[0].report_type_distribution[1])
+        self.assertEqual([], state_store.get("url1", 200).statistics_list)
+        self.assertFalse(os.path.exists("%s.tmp" % self.path))
+
+    def test_get_with_other_created(self):
+        state_store = StateStore(self.path)
+        state_store.put(BatchState("url0", 100, []))
+
+        # The same URL published again with another created is a new batch.
+        self.assertIsNone(state_store.get("url0", 101))
+
+    def test_other_version_is_ignored(self):
+        self._write({"version": STATE_VERSION - 1, "batches": [{"url": "url0", "created": 100, "statistics": ""}]})
+
+        self.assertIsNone(StateStore.load(self.path).get("url0", 100))
+
+    def test_load_with_sha256(self):
+        # States written before the SHA-256 was dropped still load.
+        state_store = StateStore(self.path)
+        state_store.put(BatchState("url0", 100, [_statistics(100, 3)]))
+        state_store.save()
+        with open(self.path) as fp:
+            json_obj = json.load(fp)
+        json_obj["batches"][0]["sha256"] = "0" * 64
+        self._write(json_obj)
+
+        self.assertEqual(3, StateStore.load(self.path).get("url0", 100).statistics_list[0].key_count)
+
+    def test_retain(self):
+        state_store = StateStore(self.path)
+        for url, created in [("url0", 100), ("url1", 200), ("url2", 300)]:
+            state_store.put(BatchState(url, created, []))
+
+        state_store.retain(["url1", "url2", "url3"])
+        state_store.save()
+
+        state_store = StateStore.load(self.path)
+        self.assertIsNone(state_store.get("url0", 100))
+        self.assertIsNotNone(state_store.get("url1", 200))
+        self.assertIsNotNone(state_store.get("url2", 300))
+
+
+if __name__ == '__main__':
+    unittest.main()
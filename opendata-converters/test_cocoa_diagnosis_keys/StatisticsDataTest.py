@@ -1,9 +1,10 @@
 import csv
+import pickle
 import unittest
 
 import io
 
-from statistics import StatisticsData
+from statistics import StatisticsData, TRANSMISSION_RISK_LEVEL_OFFSET
 
 
 def _dummy_statistics_keys():
@@ -18,6 +19,7 @@ def _dummy_statistics_keys():
     statistics_data.valid_key_count = 8
     statistics_data.has_not_days_since_onset_of_symptoms_count = 9
     statistics_data.has_not_report_type_count = 10
+    statistics_data.duplicate_key_count = 11
 
     for key in range(8):
         statistics_data.transmission_risk_level_distribution[key] = 100 + key
@@ -28,6 +30,7 @@ def _dummy_statistics_keys():
     for key in range(-14, 15):
         statistics_data.days_since_onset_of_symptoms_distribution[key] = 10000 + key
 
+    statistics_data.first_seen_created = 0
     statistics_data.comment = "this is comment"
 
     return statistics_data
@@ -37,10 +40,69 @@ class TestStatisticsData(unittest.TestCase):
 
     def test_csv(self):
         expected_csv = "1,2,1970-01-01T09:20:00.000000+0900,3,8,7,4,5,6,10,9,100,101,102,103,104,105,106,1000,1001,1002,1003,1004,1005,9986,9987,9988,9989,9990,9991,9992,9993,9994,9995,9996,9997,9998,9999,10000,10001,10002,10003,10004,10005,10006,10007,10008,10009,10010,10011,10012,10013,10014,this is comment\r\n"
+        # Columns added since (duplicate_key_count, first_seen_created) follow the original ones.
+        expected_appended_csv = ",11,0"
 
         string_io = io.StringIO()
         writer = csv.writer(string_io)
 
         _dummy_statistics_keys().write_to_csv(writer)
 
+        self.assertEqual(expected_csv.replace("\r\n", expected_appended_csv + "\r\n"), string_io.getvalue())
+
+    def test_merge(self):
+        expected_csv = "1,2,1970-01-01T09:20:00.000000+0900,6,16,14,8,10,12,20,18,200,202,204,206,208,210,212,2000,2002,2004,2006,2008,2010,19972,19974,19976,19978,19980,19982,19984,19986,19988,19990,19992,19994,19996,19998,20000,20002,20004,20006,20008,20010,20012,20014,20016,20018,20020,20022,20024,20026,20028,this is comment|other comment,22,0\r\n"
+
+        other = _dummy_statistics_keys()
+        other.comment = "other comment"
+
+        string_io = io.StringIO()
+        writer = csv.writer(string_io)
+
+        _dummy_statistics_keys().merge(other).write_to_csv(writer)
+
         self.assertEqual(expected_csv, string_io.getvalue())
+
+    def test_merge_first_seen_created(self):
+        statistics_data = StatisticsData()
+        other = _dummy_statistics_keys()
+        other.first_seen_created = 5
+
+        statistics_data.created = other.created
+        statistics_data.rolling_start_interval_number = other.rolling_start_interval_number
+        statistics_data.merge(other)
+        self.assertEqual(5, statistics_data.first_seen_created)
+
+        other.first_seen_created = 3
+        statistics_data.merge(other)
+        self.assertEqual(3, statistics_data.first_seen_created)
+
+        other.first_seen_created = 4
+        statistics_data.merge(other)
+        self.assertEqual(3, statistics_data.first_seen_created)
+
+    def test_add(self):
+        expected = _dummy_statistics_keys().merge(_dummy_statistics_keys())
+
+        left = _dummy_statistics_keys()
+        actual = left + _dummy_statistics_keys()
+
+        self.assertEqual(str(expected), str(actual))
+        self.assertEqual(str(_dummy_statistics_keys()), str(left))
+
+    def test_bytes(self):
+        expected = [_dummy_statistics_keys(), _dummy_statistics_keys()]
+        expected[1].comment = "コメント"
+
+        actual = StatisticsData.list_from_bytes(StatisticsData.list_to_bytes(expected))
+
+        self.assertEqual([str(data) for data in expected], [str(data) for data in actual])
+
+    def test_pickle(self):
+        expected = _dummy_statistics_keys()
+
+        actual = pickle.loads(pickle.dumps(expected))
+
+        self.assertEqual(str(expected), str(actual))
+        actual.transmission_risk_level_distribution[0] += 1
+        self.assertEqual(expected.transmission_risk_level_distribution[0] + 1, actual.counts[TRANSMISSION_RISK_LEVEL_OFFSET])
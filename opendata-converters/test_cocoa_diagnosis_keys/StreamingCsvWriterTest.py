@@ -0,0 +1,71 @@
+import csv
+import os
+import tempfile
+import unittest
+from functools import cmp_to_key
+
+import io
+
+from statistics import StatisticsData
+from streaming_csv_writer import StreamingCsvWriter
+
+
+def _partial_statistics(created, rolling_start_interval_number, key_count):
+    statistics_data = StatisticsData()
+    statistics_data.created = created
+    statistics_data.rolling_start_interval_number = rolling_start_interval_number
+    statistics_data.key_count = key_count
+    return statistics_data
+
+
+class TestStreamingCsvWriter(unittest.TestCase):
+
+    def test_same_as_sorted_csv(self):
+        # Batches in ascending order of created, two of them with the same created.
+        batches = [
+            [_partial_statistics(100, 10, 1), _partial_statistics(100, 30, 2)],
+            [_partial_statistics(100, 20, 3), _partial_statistics(100, 10, 4)],
+            [_partial_statistics(200, 20, 5)],
+            [],
+            [_partial_statistics(300, 10, 6), _partial_statistics(300, 40, 7)],
+        ]
+
+        statistics_dict = {}
+        for batch in batches:
+            for partial_statistics_data in batch:
+                key = (partial_statistics_data.created, partial_statistics_data.rolling_start_interval_number)
+                if key in statistics_dict:
+                    statistics_dict[key].merge(partial_statistics_data)
+                else:
+                    statistics_dict[key] = partial_statistics_data.copy()
+        string_io = io.StringIO()
+        writer = csv.writer(string_io)
+        StatisticsData.write_header_to_csv(writer)
+        for statistics_data in sorted(statistics_dict.values(), key=cmp_to_key(StatisticsData.compare)):
+            statistics_data.write_to_csv(writer)
+
+        with tempfile.TemporaryDirectory() as dir:
+            output_path = os.path.join(dir, "output.csv")
+            streaming_writer = StreamingCsvWriter(output_path)
+            for batch in batches:
+                streaming_writer.add(batch)
+            streaming_writer.close()
+
+            with open(output_path, newline='') as fp:
+                actual = fp.read()
+
+            self.assertEqual(string_io.getvalue(), actual)
+            self.assertEqual(6, streaming_writer.row_count)
+            self.assertEqual(["output.csv"], os.listdir(dir))
+
+    def test_created_in_descending_order(self):
+        with tempfile.TemporaryDirectory() as dir:
+            streaming_writer = StreamingCsvWriter(os.path.join(dir, "output.csv"))
+            streaming_writer.add([_partial_statistics(200, 10, 1)])
+            with self.assertRaises(AssertionError):
+                streaming_writer.add([_partial_statistics(100, 10, 1)])
+            streaming_writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+
+from export_reader import TemporaryExposureKey
+from key_table import KeyTable
+from statistics import StatisticsData, MAX_COMMENT_EXAMPLES
+from validation import validate, ValidationRule, RULES
+
+
+def _key(transmission_risk_level=1, report_type=None, days_since_onset_of_symptoms=None, key_data=bytes(16)):
+    key = TemporaryExposureKey()
+    key.key_data = key_data
+    key.transmission_risk_level = transmission_risk_level
+    key.rolling_start_interval_number = 2650000
+    key.rolling_period = 144
+    key.report_type = report_type
+    key.days_since_onset_of_symptoms = days_since_onset_of_symptoms
+    return key
+
+
+def _validate(keys, group_ids, rules=RULES):
+    statistics_list = [StatisticsData() for _ in range(max(group_ids) + 1)]
+    validate(KeyTable.from_keys(keys), np.array(group_ids), statistics_list, rules)
+    return statistics_list
+
+
+class TestValidation(unittest.TestCase):
+
+    def test_counters(self):
+        keys = [
+            _key(),
+            _key(transmission_risk_level=8),
+            _key(report_type=5, days_since_onset_of_symptoms=-15),
+            _key(key_data=b"short", transmission_risk_level=-1),
+        ]
+        statistics_data, = _validate(keys, [0] * len(keys))
+
+        self.assertEqual(1, statistics_data.valid_key_count)
+        self.assertEqual(2, statistics_data.invalid_transmission_risk_level_key_count)
+        self.assertEqual(0, statistics_data.invalid_report_type_key_count)
+        self.assertEqual(1, statistics_data.invalid_days_since_onset_of_symptoms_key_count)
+        self.assertEqual(1, statistics_data.invalid_key_data_count)
+
+    def test_comment_examples_per_group(self):
+        keys = [_key(transmission_risk_level=10 + index) for index in range(10)]
+        keys.append(_key(key_data=b"", transmission_risk_level=-1))
+        group_ids = [0] * 10 + [1]
+        first, second = _validate(keys, group_ids)
+
+        self.assertEqual("|".join("value transmission_risk_level %d is invalid." % (10 + index)
+                                  for index in range(MAX_COMMENT_EXAMPLES)), first.comment)
+        self.assertEqual("value transmission_risk_level -1 is invalid.|key_data b'' length 0 is invalid.",
+                         second.comment)
+
+    def test_comment_examples_merge(self):
+        first, = _validate([_key(transmission_risk_level=8)], [0])
+        second, = _validate([_key(days_since_onset_of_symptoms=15)] * MAX_COMMENT_EXAMPLES, [0] * MAX_COMMENT_EXAMPLES)
+        first.merge(second)
+
+        self.assertEqual(1 + MAX_COMMENT_EXAMPLES, first.invalid_transmission_risk_level_key_count
+                         + first.invalid_days_since_onset_of_symptoms_key_count)
+        self.assertEqual(["value transmission_risk_level 8 is invalid."]
+                         + ["value days_since_onset_of_symptoms 15 is invalid."] * (MAX_COMMENT_EXAMPLES - 1),
+                         first.comment.split("|"))
+
+    def test_custom_rule(self):
+        rule = ValidationRule("rolling_period", "invalid_key_data_count",
+                              lambda table: table.rolling_period > 144,
+                              lambda table, index: "rolling_period %d" % table.rolling_period[index])
+        keys = [_key(), _key()]
+        keys[1].rolling_period = 145
+        statistics_data, = _validate(keys, [0, 0], [rule])
+
+        self.assertEqual(1, statistics_data.valid_key_count)
+        self.assertEqual(1, statistics_data.invalid_key_data_count)
+        self.assertEqual("rolling_period 145", statistics_data.comment)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import http.server
+import threading
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.stub_server.handle(self)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer:
+    """Local HTTP/1.1 server with keep-alive answering scripted responses, for tests of downloads.
+
+    `respond(path, *responses)` queues responses of a path; the last one is repeated. A response is
+    (status, headers, body) or a callable taking the request headers and returning one. Every request is
+    recorded in `requests` as (path, headers, client port), so reused connections share the port.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self._responses = {}
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub_server = self
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.01},
+                                        daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def url(self, path):
+        return "http://127.0.0.1:%d%s" % (self._server.server_address[1], path)
+
+    def respond(self, path, *responses):
+        with self._lock:
+            self._responses[path] = list(responses)
+
+    def paths(self):
+        return [path for path, _, _ in self.requests]
+
+    def handle(self, handler):
+        with self._lock:
+            self.requests.append((handler.path, dict(handler.headers), handler.client_address[1]))
+            responses = self._responses.get(handler.path, [(404, {}, b"")])
+            response = responses.pop(0) if len(responses) > 1 else responses[0]
+        if callable(response):
+            response = response(handler.headers)
+        status, headers, body = response
+
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        if "Content-Length" not in headers:
+            handler.send_header("Content-Length", str(len(body)))
+        else:
+            # A body shorter than its Content-Length ends with the connection.
+            handler.close_connection = True
+        handler.end_headers()
+        handler.wfile.write(body)